@@ -1,12 +1,25 @@
 import json
 import boto3
 import base64
+import gzip
+import io
+import re
 import os
+import queue
+import threading
 import uuid
 import hashlib
+import hmac
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote_plus
 from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from botocore.exceptions import ClientError
 
 # Google Calendar API用のインポート（オプション）
 # 注意: Lambda Layerまたはrequirements.txtにgoogle-api-python-clientを追加する必要があります
@@ -18,6 +31,24 @@ except ImportError:
     GOOGLE_CALENDAR_AVAILABLE = False
     print("Warning: Google Calendar API libraries not available. Calendar integration will be disabled.")
 
+# 画像処理用のインポート（オプション）
+# 注意: Lambda Layer（scripts/create_pillow_layer.sh）でPillowを追加する必要があります
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    print("Warning: Pillow not available. Image thumbnails/WebP derivatives will be disabled.")
+
+# 勤怠の一括再計算用のインポート（オプション）
+# 注意: Lambda Layer（scripts/create_numpy_layer.sh）でNumPyを追加する必要があります
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("Warning: NumPy not available. Attendance recompute will run record by record.")
+
 # ID生成ヘルパー関数をインポート
 def extract_number_from_id(id_str, prefix):
     """IDから数値部分を抽出"""
@@ -33,83 +64,125 @@ def extract_number_from_id(id_str, prefix):
     return 0
 
 def get_max_id_number(table, prefix):
-    """テーブル内の最大ID番号を取得"""
+    """
+    テーブル内の最大ID番号を取得（全ページを読む）
+    スキャンに失敗した場合は例外をそのまま送出する（0 を返すとカウンターが 0 で初期化され、既存IDを上書きするため）
+    """
+    max_num = 0
+    for item in parallel_scan(table, {'ProjectionExpression': 'id'}):
+        num = extract_number_from_id(item.get('id', ''), prefix)
+        if num > max_num:
+            max_num = num
+    return max_num
+
+# ID採番カウンター
+# - counters テーブルの current_value を ADD で原子的に加算して採番する（スキャン不要・競合なし）
+# - カウンターが未作成の場合のみ、既存データの最大値をスキャンして初期値とする（初回のみ）
+#   スキャンに失敗した場合は初期化せずに採番を失敗させる（誤った初期値は既存IDの上書きにつながる）
+# - ID_BLOCK_SIZE > 1 の場合はコンテナごとに番号をまとめて予約し、書き込み回数を減らす
+#   （この場合、IDはコンテナ間で連番にならないが重複はしない）
+# - スキャン方式へのフォールバックは counters テーブルが存在しない場合のみ
+#   （スロットリング等で採番済み・予約済みの番号を再度払い出さないため）
+# - 採番したIDのアイテムは put_item_with_new_id で attribute_not_exists(id) 条件付きで書き込む
+ID_BLOCK_SIZE = max(1, int(os.environ.get('ID_BLOCK_SIZE', '1')))
+_reserved_id_blocks = {}
+
+def seed_counter(counter_id, initial_value):
+    """カウンターが未作成の場合のみ初期値を書き込む（既に存在する場合は何もしない）"""
     try:
-        response = table.scan(ProjectionExpression='id')
-        max_num = 0
-        for item in response.get('Items', []):
-            num = extract_number_from_id(item.get('id', ''), prefix)
-            if num > max_num:
-                max_num = num
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(
-                ProjectionExpression='id',
-                ExclusiveStartKey=response['LastEvaluatedKey']
+        COUNTERS_TABLE.put_item(
+            Item={
+                'counter_id': counter_id,
+                'current_value': initial_value,
+                'created_at': datetime.utcnow().isoformat() + 'Z'
+            },
+            ConditionExpression='attribute_not_exists(counter_id)'
+        )
+    except COUNTERS_TABLE.meta.client.exceptions.ConditionalCheckFailedException:
+        # 他のリクエストが先に初期化した
+        pass
+
+def allocate_counter_range(counter_id, count=1, seed_fn=None):
+    """
+    カウンターを count だけ原子的に進め、確保した番号の範囲 (first, last) を返す
+    seed_fn: カウンター未作成時に初期値（現在の最大番号）を返す関数
+    """
+    for _ in range(2):
+        try:
+            response = COUNTERS_TABLE.update_item(
+                Key={'counter_id': counter_id},
+                UpdateExpression='ADD current_value :n SET updated_at = :now',
+                ConditionExpression='attribute_exists(counter_id)',
+                ExpressionAttributeValues={
+                    ':n': count,
+                    ':now': datetime.utcnow().isoformat() + 'Z'
+                },
+                ReturnValues='UPDATED_NEW'
             )
-            for item in response.get('Items', []):
-                num = extract_number_from_id(item.get('id', ''), prefix)
-                if num > max_num:
-                    max_num = num
-        return max_num
-    except Exception as e:
-        print(f"Error getting max ID: {str(e)}")
-        return 0
+            last = int(response['Attributes']['current_value'])
+            return last - count + 1, last
+        except COUNTERS_TABLE.meta.client.exceptions.ConditionalCheckFailedException:
+            seed_counter(counter_id, seed_fn() if seed_fn else 0)
+    raise Exception(f'Failed to allocate counter: {counter_id}')
+
+def allocate_next_number(counter_id, seed_fn=None, block_size=1):
+    """
+    次の番号を1つ取得
+    block_size > 1 の場合はコンテナ内に予約済みの番号があればDynamoDBにアクセスせずに返す
+    """
+    block = _reserved_id_blocks.get(counter_id)
+    if block and block[0] <= block[1]:
+        number = block[0]
+        block[0] += 1
+        return number
+    first, last = allocate_counter_range(counter_id, block_size, seed_fn)
+    if last > first:
+        _reserved_id_blocks[counter_id] = [first + 1, last]
+    return first
+
+def _is_missing_table_error(error):
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') == 'ResourceNotFoundException'
 
 def generate_next_id(table, prefix):
     """次のIDを生成（5桁形式）"""
-    max_num = get_max_id_number(table, prefix)
-    next_num = max_num + 1
+    try:
+        next_num = allocate_next_number(
+            f"{table.name}#{prefix}",
+            seed_fn=lambda: get_max_id_number(table, prefix),
+            block_size=ID_BLOCK_SIZE
+        )
+    except ClientError as e:
+        # counters テーブルが未作成の環境では従来のスキャン方式で採番
+        if not _is_missing_table_error(e):
+            raise
+        print(f"Warning: counters table not found, falling back to scan: {str(e)}")
+        next_num = get_max_id_number(table, prefix) + 1
     return f"{prefix}{str(next_num).zfill(5)}"
 
 def get_max_sequence_for_date(table, date_prefix):
     """
-    指定日付の最大連番を取得（スケジュールID用）
+    指定日付の最大連番を取得（スケジュールID用、全ページを読む）
     形式: SCH-YYYYMMDD-NNN から NNN を抽出
+    スキャンに失敗した場合は例外をそのまま送出する（get_max_id_number と同じ理由）
     """
     prefix = f"SCH-{date_prefix}-"
+    scan_kwargs = {
+        'FilterExpression': Attr('id').begins_with(prefix),
+        'ProjectionExpression': 'id'
+    }
     
-    try:
-        # その日付のIDを持つスケジュールをスキャン
-        response = table.scan(
-            FilterExpression=Attr('id').begins_with(prefix),
-            ProjectionExpression='id'
-        )
-        
-        max_seq = 0
-        for item in response.get('Items', []):
-            schedule_id = item.get('id', '')
-            # SCH-YYYYMMDD-NNN から NNN を抽出
-            if schedule_id.startswith(prefix):
-                seq_str = schedule_id[len(prefix):]
-                try:
-                    seq = int(seq_str)
-                    if seq > max_seq:
-                        max_seq = seq
-                except:
-                    pass
-        
-        # ページネーション対応
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(
-                FilterExpression=Attr('id').begins_with(prefix),
-                ProjectionExpression='id',
-                ExclusiveStartKey=response['LastEvaluatedKey']
-            )
-            for item in response.get('Items', []):
-                schedule_id = item.get('id', '')
-                if schedule_id.startswith(prefix):
-                    seq_str = schedule_id[len(prefix):]
-                    try:
-                        seq = int(seq_str)
-                        if seq > max_seq:
-                            max_seq = seq
-                    except:
-                        pass
-        
-        return max_seq
-    except Exception as e:
-        print(f"Error getting max sequence for date {date_prefix}: {str(e)}")
-        return 0
+    max_seq = 0
+    for item in parallel_scan(table, scan_kwargs):
+        schedule_id = item.get('id', '')
+        # SCH-YYYYMMDD-NNN から NNN を抽出
+        if schedule_id.startswith(prefix):
+            try:
+                seq = int(schedule_id[len(prefix):])
+            except ValueError:
+                continue
+            if seq > max_seq:
+                max_seq = seq
+    return max_seq
 
 def generate_schedule_id(date_str, table):
     """
@@ -127,15 +200,41 @@ def generate_schedule_id(date_str, table):
     else:
         date_prefix = datetime.now().strftime('%Y%m%d')
     
-    # その日の最大連番を取得
-    max_seq = get_max_sequence_for_date(table, date_prefix)
-    next_seq = max_seq + 1
+    # その日の連番をカウンターから取得（日付ごとのカウンター）
+    try:
+        next_seq = allocate_next_number(
+            f"{table.name}#SCH-{date_prefix}",
+            seed_fn=lambda: get_max_sequence_for_date(table, date_prefix)
+        )
+    except ClientError as e:
+        # counters テーブルが未作成の環境では従来のスキャン方式で採番
+        if not _is_missing_table_error(e):
+            raise
+        print(f"Warning: counters table not found, falling back to scan: {str(e)}")
+        next_seq = get_max_sequence_for_date(table, date_prefix) + 1
     
     # 3桁の連番にゼロパディング
     seq_str = str(next_seq).zfill(3)
     
     return f"SCH-{date_prefix}-{seq_str}"
 
+def put_item_with_new_id(table, item, generate_id, max_retries=5):
+    """
+    採番したIDのアイテムを attribute_not_exists(id) 条件付きで書き込む（既存アイテムを上書きしない）
+    IDが既に使われていた場合は generate_id で採番し直して再試行する
+    戻り値: 書き込んだアイテムのID
+    """
+    for _ in range(max_retries):
+        try:
+            table.put_item(Item=item, ConditionExpression='attribute_not_exists(id)')
+            return item['id']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            print(f"Warning: ID {item['id']} already exists in {table.name}, allocating another")
+            item['id'] = generate_id()
+    raise Exception(f'IDの採番に失敗しました（最大リトライ回数に達しました）: {table.name}')
+
 def validate_worker_email(email):
     """
     従業員のメールアドレスをバリデーション
@@ -718,7 +817,8 @@ def sync_google_calendar_event_to_schedule(event_data):
             }
         else:
             # 新規スケジュールを作成
-            if not schedule_id:
+            schedule_id_generated = not schedule_id
+            if schedule_id_generated:
                 # スケジュールIDがなければ生成
                 schedule_id = generate_schedule_id(scheduled_date, SCHEDULES_TABLE)
             
@@ -741,7 +841,12 @@ def sync_google_calendar_event_to_schedule(event_data):
                 'google_calendar_event_id': event_id
             }
             
-            SCHEDULES_TABLE.put_item(Item=schedule_item)
+            if schedule_id_generated:
+                schedule_id = put_item_with_new_id(
+                    SCHEDULES_TABLE, schedule_item, lambda: generate_schedule_id(scheduled_date, SCHEDULES_TABLE)
+                )
+            else:
+                SCHEDULES_TABLE.put_item(Item=schedule_item)
             
             return {
                 'success': True,
@@ -770,6 +875,7 @@ s3_client = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
 ANNOUNCEMENTS_TABLE = dynamodb.Table('business-announcements')
 ANNOUNCEMENT_READS_TABLE = dynamodb.Table('business-announcement-reads')
+ANNOUNCEMENT_INBOX_TABLE = dynamodb.Table('announcement-inbox')
 REPORTS_TABLE = dynamodb.Table('staff-reports')
 CLEANING_LOGS_TABLE = dynamodb.Table('cleaning-logs')
 NFC_TAGS_TABLE = dynamodb.Table('nfc-tags')
@@ -782,11 +888,17 @@ STORES_TABLE = dynamodb.Table('misesapo-stores')
 ATTENDANCE_TABLE = dynamodb.Table('attendance')
 ATTENDANCE_ERRORS_TABLE = dynamodb.Table('attendance-errors')
 ATTENDANCE_REQUESTS_TABLE = dynamodb.Table('attendance-requests')
+ATTENDANCE_SUMMARIES_TABLE = dynamodb.Table('attendance-monthly-summaries')
 HOLIDAYS_TABLE = dynamodb.Table('holidays')
 INVENTORY_ITEMS_TABLE = dynamodb.Table('inventory-items')
 INVENTORY_TRANSACTIONS_TABLE = dynamodb.Table('inventory-transactions')
+INVENTORY_ROLLUPS_TABLE = dynamodb.Table('inventory-rollups')
 DAILY_REPORTS_TABLE = dynamodb.Table('daily-reports')
 TODOS_TABLE = dynamodb.Table('todos')
+COUNTERS_TABLE = dynamodb.Table('counters')
+REPORT_IMAGES_TABLE = dynamodb.Table('report-images')
+REPORT_IMAGE_HASHES_TABLE = dynamodb.Table('report-image-hashes')
+PHOTO_BLOBS_TABLE = dynamodb.Table('photo-blobs')
 
 # 環境変数から設定を取得
 S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME', 'misesapo-cleaning-manual-images')
@@ -808,6 +920,81 @@ DATA_KEY = 'cleaning-manual/data.json'
 DRAFT_KEY = 'cleaning-manual/draft.json'
 SERVICES_KEY = 'services/service_items.json'
 WIKI_KEY = 'wiki/wiki_entries.json'
+TRAINING_VIDEOS_KEY = 'training-videos/data.json'
+
+# S3上のJSONドキュメント（マニュアル・WIKI・サービス・研修動画）のコンテナ内キャッシュ
+# - パース済みデータ・シリアライズ済みレスポンスボディ・ETagをS3キーごとに保持
+# - TTL経過後は IfNoneMatch 付きGETで再検証し、変更がなければ本文を再取得しない
+# - 同一コンテナでの保存時はキャッシュを書き込み内容で更新する
+S3_DOCUMENT_CACHE_TTL = int(os.environ.get('S3_DOCUMENT_CACHE_TTL', '60'))
+_s3_document_cache = {}
+
+def _is_s3_not_modified(error):
+    code = str(error.response.get('Error', {}).get('Code', ''))
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return code in ('304', 'NotModified') or status == 304
+
+def get_s3_json_document(s3_key):
+    """
+    S3上のJSONドキュメントをキャッシュ経由で取得
+    戻り値: {'data': パース済みデータ, 'body': シリアライズ済みJSON, 'etag': ETag}
+    ドキュメントが存在しない場合は s3_client.exceptions.NoSuchKey を送出
+    注意: data はキャッシュと共有されるため、呼び出し側で変更しないこと
+    """
+    now = time.time()
+    entry = _s3_document_cache.get(s3_key)
+    if entry and now - entry['checked_at'] < S3_DOCUMENT_CACHE_TTL:
+        return entry
+
+    params = {'Bucket': S3_BUCKET_NAME, 'Key': s3_key}
+    if entry and entry.get('etag'):
+        params['IfNoneMatch'] = entry['etag']
+    try:
+        response = s3_client.get_object(**params)
+    except s3_client.exceptions.NoSuchKey:
+        _s3_document_cache.pop(s3_key, None)
+        raise
+    except ClientError as e:
+        if entry and _is_s3_not_modified(e):
+            # 変更なし: 本文を再取得せずに有効期限だけ延長
+            entry['checked_at'] = now
+            return entry
+        raise
+
+    data = json.loads(response['Body'].read().decode('utf-8'))
+    entry = {
+        'data': data,
+        'body': json.dumps(data, ensure_ascii=False),
+        'etag': response.get('ETag'),
+        'checked_at': now
+    }
+    _s3_document_cache[s3_key] = entry
+    return entry
+
+def put_s3_json_document(s3_key, data):
+    """
+    JSONドキュメントをS3に保存し、コンテナ内キャッシュを保存内容で更新
+    """
+    response = s3_client.put_object(
+        Bucket=S3_BUCKET_NAME,
+        Key=s3_key,
+        Body=json.dumps(data, ensure_ascii=False, indent=2),
+        ContentType='application/json'
+    )
+    _s3_document_cache[s3_key] = {
+        'data': data,
+        'body': json.dumps(data, ensure_ascii=False),
+        'etag': response.get('ETag'),
+        'checked_at': time.time()
+    }
+    return response
+
+def invalidate_s3_json_document(s3_key=None):
+    """コンテナ内キャッシュを破棄（s3_key省略時は全件）"""
+    if s3_key is None:
+        _s3_document_cache.clear()
+    else:
+        _s3_document_cache.pop(s3_key, None)
 
 def resolve_cors_origin(event_headers: dict) -> str:
     if "*" in ALLOWED_ORIGINS:
@@ -817,16 +1004,905 @@ def resolve_cors_origin(event_headers: dict) -> str:
         return origin
     return ALLOWED_ORIGINS[0] if ALLOWED_ORIGINS else "*"
 
+def get_request_header(event, name):
+    """リクエストヘッダーを大文字小文字を区別せずに取得"""
+    event_headers = event.get('headers') or {}
+    lower_name = name.lower()
+    for key, value in event_headers.items():
+        if key.lower() == lower_name:
+            return value
+    return None
+
+def compute_body_etag(body):
+    """レスポンスボディから強いETagを計算"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return '"' + hashlib.sha256(body or b'').hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match ヘッダーの値がETagに一致するか（弱い比較）"""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    normalized = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == normalized:
+            return True
+    return False
+
+def apply_conditional_get(event, response):
+    """
+    GETレスポンスにETagを付与し、If-None-Match が一致すれば 304 Not Modified を返す
+    - ハンドラが ETag ヘッダー（S3オブジェクトのETagなど）を設定済みならそれを使用
+    - 未設定ならレスポンスボディのハッシュから計算
+    """
+    if not response or response.get('statusCode') != 200:
+        return response
+    response_headers = dict(response.get('headers') or {})
+    etag = response_headers.get('ETag') or compute_body_etag(response.get('body', ''))
+    response_headers['ETag'] = etag
+    # キャッシュは保持してよいが、使用前に必ず再検証させる
+    response_headers['Cache-Control'] = 'no-cache'
+    if etag_matches(get_request_header(event, 'If-None-Match'), etag):
+        return {
+            'statusCode': 304,
+            'headers': response_headers,
+            'body': ''
+        }
+    return {**response, 'headers': response_headers}
+
+
+# ==================== レスポンスエンコーダー ====================
+# - json_default / dumps_json: Decimal を文字列ではなく数値（int/float）としてシリアライズ
+#   既存のAPIは従来どおり json.dumps(..., default=str)（Decimal は文字列）のまま。数値で返すのは
+#   数値を前提に作った新しいAPI（勤怠の月次集計・再計算、入出庫の集計）のみ
+# - finalize_response: 全レスポンス共通の後処理
+#   - Accept-Encoding: gzip のクライアントには gzip 圧縮して返す（RESPONSE_GZIP_ENABLED=true の場合のみ）
+#     ※ API Gatewayでバイナリメディアタイプ（*/*）の設定が必要なためデフォルトは無効
+#   - 本文が大きすぎる場合、クエリパラメータ spill=1 を指定したリクエストに限り本文をS3に退避し、
+#     署名付きURL（download_url）を 200 で返す（303 のリダイレクトは Authorization ヘッダー付きの
+#     クロスオリジン fetch では追従できないため使わない）
+#   - spill=1 がない場合、Lambdaのレスポンス上限を超える本文は 413 を返す（page_size / page_token で分割して取得する）
+#     ※ api-responses/ にはS3ライフサイクルルールで短期の有効期限を設定しておくこと
+RESPONSE_GZIP_ENABLED = os.environ.get('RESPONSE_GZIP_ENABLED', 'false').lower() == 'true'
+RESPONSE_GZIP_MIN_BYTES = int(os.environ.get('RESPONSE_GZIP_MIN_BYTES', '1024'))
+RESPONSE_SPILL_THRESHOLD_BYTES = int(os.environ.get('RESPONSE_SPILL_THRESHOLD_BYTES', str(5 * 1024 * 1024)))
+# Lambdaの同期呼び出しのレスポンス上限（6MB）からヘッダー等の分を差し引いた値
+RESPONSE_MAX_BYTES = int(os.environ.get('RESPONSE_MAX_BYTES', str(6 * 1024 * 1024 - 64 * 1024)))
+RESPONSE_SPILL_PREFIX = 'api-responses/'
+RESPONSE_SPILL_URL_EXPIRES = 300
+
+def json_default(obj):
+    """json.dumps の default: Decimal は整数ならint、小数ならfloatに変換"""
+    if isinstance(obj, Decimal):
+        if not obj.is_finite():
+            return str(obj)
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+def dumps_json(data):
+    """レスポンスボディ用のJSONシリアライズ（Decimalは数値として出力）"""
+    return json.dumps(data, ensure_ascii=False, default=json_default)
+
+def accepts_gzip(event):
+    accept_encoding = get_request_header(event, 'Accept-Encoding') or ''
+    return 'gzip' in accept_encoding.lower()
+
+def spill_response_to_s3(response, body_bytes):
+    """大きすぎるレスポンス本文をS3に退避し、署名付きURLを返す"""
+    s3_key = f"{RESPONSE_SPILL_PREFIX}{datetime.utcnow().strftime('%Y/%m/%d')}/{uuid.uuid4()}.json"
+    response_headers = dict(response.get('headers') or {})
+    s3_client.put_object(
+        Bucket=S3_BUCKET_NAME,
+        Key=s3_key,
+        Body=body_bytes,
+        ContentType=response_headers.get('Content-Type', 'application/json')
+    )
+    download_url = s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': S3_BUCKET_NAME, 'Key': s3_key},
+        ExpiresIn=RESPONSE_SPILL_URL_EXPIRES
+    )
+    print(f"INFO: response body ({len(body_bytes)} bytes) spilled to s3://{S3_BUCKET_NAME}/{s3_key}")
+    response_headers['Content-Type'] = 'application/json'
+    response_headers.pop('Content-Encoding', None)
+    response_headers.pop('ETag', None)
+    return {
+        'statusCode': 200,
+        'headers': response_headers,
+        'body': json.dumps({
+            'spilled': True,
+            'download_url': download_url,
+            'expires_in': RESPONSE_SPILL_URL_EXPIRES,
+            'size': len(body_bytes)
+        }, ensure_ascii=False)
+    }
+
+def finalize_response(event, response):
+    """レスポンスの圧縮・サイズ上限対応"""
+    body = response.get('body') if isinstance(response, dict) else None
+    if not body or not isinstance(body, str) or response.get('isBase64Encoded'):
+        return response
+    body_bytes = body.encode('utf-8')
+
+    query_params = event.get('queryStringParameters') or {}
+    if len(body_bytes) > RESPONSE_SPILL_THRESHOLD_BYTES and query_params.get('spill') in ('1', 'true'):
+        return spill_response_to_s3(response, body_bytes)
+    if len(body_bytes) > RESPONSE_MAX_BYTES:
+        print(f"Warning: response body ({len(body_bytes)} bytes) exceeds the Lambda payload limit")
+        return {
+            'statusCode': 413,
+            'headers': {k: v for k, v in (response.get('headers') or {}).items() if k not in ('ETag', 'Content-Encoding')},
+            'body': json.dumps({
+                'error': 'レスポンスが大きすぎます。page_size / page_token で分割するか spill=1 を指定してください',
+                'code': 'RESPONSE_TOO_LARGE',
+                'size': len(body_bytes)
+            }, ensure_ascii=False)
+        }
+
+    if RESPONSE_GZIP_ENABLED and len(body_bytes) >= RESPONSE_GZIP_MIN_BYTES and accepts_gzip(event):
+        response_headers = dict(response.get('headers') or {})
+        response_headers['Content-Encoding'] = 'gzip'
+        response_headers['Vary'] = 'Accept-Encoding'
+        return {
+            **response,
+            'headers': response_headers,
+            'body': base64.b64encode(gzip.compress(body_bytes)).decode('ascii'),
+            'isBase64Encoded': True
+        }
+    return response
+
+# ==================== スキーマレジストリ ====================
+# テーブルごとのGSIメタデータ（ハッシュキー・レンジキー）をコンテナごとに一度だけ読み込んで保持する
+# - SCHEMA_REGISTRY_SOURCE=config（デフォルト）: 下記の宣言 + 環境変数 TABLE_INDEXES_JSON の上書きを使用
+# - SCHEMA_REGISTRY_SOURCE=describe: テーブルごとに初回のみ describe_table で実際のGSIを取得
+# リクエストごとに describe_table（レート制限のあるコントロールプレーンAPI）を呼ばないこと
+TABLE_INDEXES = {
+    'schedules': [
+        {'name': 'status-index', 'hash': 'status', 'range': 'date'},
+        {'name': 'assigned_to-index', 'hash': 'assigned_to', 'range': 'date'},
+        {'name': 'date-index', 'hash': 'date', 'range': 'created_at'},
+    ],
+    'estimates': [
+        {'name': 'store_id-created_at-index', 'hash': 'store_id', 'range': 'created_at'},
+        {'name': 'status-created_at-index', 'hash': 'status', 'range': 'created_at'},
+        {'name': 'schedule_id-index', 'hash': 'schedule_id', 'range': None},
+    ],
+    'misesapo-clients': [
+        {'name': 'firebase_uid-index', 'hash': 'firebase_uid', 'range': None},
+        {'name': 'email-index', 'hash': 'email', 'range': None},
+        {'name': 'status-index', 'hash': 'status', 'range': None},
+    ],
+    'misesapo-stores': [
+        {'name': 'brand_id-index', 'hash': 'brand_id', 'range': None},
+        {'name': 'client_id-index', 'hash': 'client_id', 'range': None},
+    ],
+    'misesapo-brands': [
+        {'name': 'client_id-index', 'hash': 'client_id', 'range': None},
+    ],
+    'todos': [
+        {'name': 'staff_id-created_at-index', 'hash': 'staff_id', 'range': 'created_at'},
+    ],
+    'daily-reports': [
+        {'name': 'staff_id-date-index', 'hash': 'staff_id', 'range': 'date'},
+    ],
+    'cleaning-logs': [
+        {'name': 'user_id-timestamp-index', 'hash': 'user_id', 'range': 'timestamp'},
+        {'name': 'facility_id-timestamp-index', 'hash': 'facility_id', 'range': 'timestamp'},
+    ],
+    'attendance': [
+        {'name': 'staff_id-date-index', 'hash': 'staff_id', 'range': 'date'},
+    ],
+    'attendance-monthly-summaries': [
+        {'name': 'month-staff_id-index', 'hash': 'month', 'range': 'staff_id'},
+    ],
+    'inventory-transactions': [
+        {'name': 'staff_id-created_at-index', 'hash': 'staff_id', 'range': 'created_at'},
+        {'name': 'product_id-created_at-index', 'hash': 'product_id', 'range': 'created_at'},
+        {'name': 'type-created_at-index', 'hash': 'type', 'range': 'created_at'},
+    ],
+    'staff-reports': [
+        {'name': 'status-created_at-index', 'hash': 'status', 'range': 'created_at'},
+        {'name': 'staff_id-created_at-index', 'hash': 'staff_id', 'range': 'created_at'},
+        {'name': 'store_id-created_at-index', 'hash': 'store_id', 'range': 'created_at'},
+    ],
+    'report-images': [
+        {'name': 'cleaning_date-catalog_key-index', 'hash': 'cleaning_date', 'range': 'catalog_key'},
+    ],
+    'announcement-inbox': [
+        {'name': 'staff_id-created_at-index', 'hash': 'staff_id', 'range': 'created_at'},  # LSI
+        {'name': 'announcement_id-staff_id-index', 'hash': 'announcement_id', 'range': 'staff_id'},
+    ],
+}
+SCHEMA_REGISTRY_SOURCE = os.environ.get('SCHEMA_REGISTRY_SOURCE', 'config')
+_schema_registry = {}
+_schema_registry_stats = {'loads': 0, 'fallbacks': {}}
+
+def _load_configured_indexes():
+    indexes = dict(TABLE_INDEXES)
+    override = os.environ.get('TABLE_INDEXES_JSON')
+    if override:
+        try:
+            indexes.update(json.loads(override))
+        except Exception as e:
+            print(f"Warning: invalid TABLE_INDEXES_JSON, ignored: {str(e)}")
+    return indexes
+
+def _describe_table_indexes(table_name):
+    response = dynamodb.meta.client.describe_table(TableName=table_name)
+    indexes = []
+    table = response.get('Table', {})
+    # GSIに加えてLSI（ハッシュキーはテーブルと共通）も対象にする
+    for index in table.get('GlobalSecondaryIndexes', []) + table.get('LocalSecondaryIndexes', []):
+        key_schema = {key['KeyType']: key['AttributeName'] for key in index.get('KeySchema', [])}
+        indexes.append({'name': index['IndexName'], 'hash': key_schema.get('HASH'), 'range': key_schema.get('RANGE')})
+    return indexes
+
+def get_table_indexes(table_name):
+    """テーブルのGSI一覧を取得（コンテナ内で初回のみ読み込み）"""
+    if table_name not in _schema_registry:
+        indexes = None
+        if SCHEMA_REGISTRY_SOURCE == 'describe':
+            try:
+                indexes = _describe_table_indexes(table_name)
+            except Exception as e:
+                print(f"Warning: describe_table failed for {table_name}, using configured indexes: {str(e)}")
+        if indexes is None:
+            indexes = _load_configured_indexes().get(table_name, [])
+        _schema_registry[table_name] = {index['name']: index for index in indexes}
+        _schema_registry_stats['loads'] += 1
+    return list(_schema_registry[table_name].values())
+
+def has_table_index(table_name, index_name):
+    """テーブルに指定したGSIがあるか"""
+    get_table_indexes(table_name)
+    return index_name in _schema_registry[table_name]
+
+def record_index_fallback(table_name, index_name, reason=''):
+    """
+    GSIが使えずスキャンにフォールバックしたことを記録
+    以後そのコンテナではこのインデックスを使わない（refresh_schema_registry で再読み込み可能）
+    """
+    key = f"{table_name}/{index_name}"
+    _schema_registry_stats['fallbacks'][key] = _schema_registry_stats['fallbacks'].get(key, 0) + 1
+    print(f"Warning: index {key} is not available, falling back to scan (count={_schema_registry_stats['fallbacks'][key]}): {reason}")
+    get_table_indexes(table_name)
+    _schema_registry[table_name].pop(index_name, None)
+
+def refresh_schema_registry(table_name=None):
+    """GSIメタデータを破棄し、次回アクセス時に再読み込みさせる（table_name省略時は全テーブル）"""
+    if table_name is None:
+        _schema_registry.clear()
+    else:
+        _schema_registry.pop(table_name, None)
+
+def get_schema_registry_stats():
+    """読み込み回数とフォールバック回数を取得"""
+    return {
+        'loads': _schema_registry_stats['loads'],
+        'fallbacks': dict(_schema_registry_stats['fallbacks'])
+    }
+
+# ==================== クエリプランナー ====================
+# 一覧APIのクエリパラメータ（等価条件・範囲条件）から、scan ではなく GSI への query を選ぶ
+# - スキーマレジストリのインデックス（ハッシュキー・レンジキー）から候補を選ぶ
+# - ハッシュキーが等価条件に含まれるインデックスのうち、レンジキーも使えるものを優先する
+# - キー条件にならなかった条件は FilterExpression に回す
+# - インデックスが実テーブルに存在しない場合は、以後そのコンテナではスキャンにフォールバック
+
+def _range_condition(builder, attr, low, high):
+    """範囲条件を Key / Attr の条件式に変換"""
+    if low and high:
+        return builder(attr).between(low, high)
+    if low:
+        return builder(attr).gte(low)
+    return builder(attr).lte(high)
+
+def plan_list_query(table_name, equals=None, ranges=None):
+    """
+    一覧取得の実行計画を作成
+    equals: {属性名: 値} の等価条件（値がNone/空文字の条件は無視）
+    ranges: {属性名: (下限, 上限)} の範囲条件（片側None可）
+    戻り値: {'operation': 'query'|'scan', 'index', 'key_condition', 'filter', 'description', ...}
+    """
+    equals = {k: v for k, v in (equals or {}).items() if v is not None and v != ''}
+    ranges = {k: v for k, v in (ranges or {}).items() if v and (v[0] or v[1])}
+
+    best_index = None
+    best_score = 0
+    for index in get_table_indexes(table_name):
+        if index['hash'] not in equals:
+            continue
+        range_key = index.get('range')
+        score = 2 if range_key and (range_key in equals or range_key in ranges) else 1
+        if score > best_score:
+            best_index, best_score = index, score
+
+    key_condition = None
+    used = set()
+    if best_index:
+        key_condition = Key(best_index['hash']).eq(equals[best_index['hash']])
+        used.add(best_index['hash'])
+        range_key = best_index.get('range')
+        if range_key in equals:
+            key_condition = key_condition & Key(range_key).eq(equals[range_key])
+            used.add(range_key)
+        elif range_key in ranges:
+            key_condition = key_condition & _range_condition(Key, range_key, *ranges[range_key])
+            used.add(range_key)
+
+    filters = [Attr(attr).eq(value) for attr, value in equals.items() if attr not in used]
+    filters += [_range_condition(Attr, attr, *bounds) for attr, bounds in ranges.items() if attr not in used]
+    filter_expr = None
+    for condition in filters:
+        filter_expr = condition if filter_expr is None else filter_expr & condition
+
+    return {
+        'table': table_name,
+        'operation': 'query' if best_index else 'scan',
+        'index': best_index['name'] if best_index else None,
+        'key_condition': key_condition,
+        'filter': filter_expr,
+        'equals': equals,
+        'ranges': ranges,
+        'description': f"query:{best_index['name']}" if best_index else 'scan'
+    }
+
+def _is_missing_index_error(error):
+    error_info = error.response.get('Error', {})
+    return error_info.get('Code') == 'ValidationException' and 'index' in error_info.get('Message', '').lower()
+
+def execute_list_plan(table, plan, limit=None, descending=False):
+    """
+    実行計画に従って全ページを読み、条件に一致するアイテムを返す
+    limit: 指定した件数に達した時点で読み取りを打ち切る（DynamoDBのLimitは評価件数のため使わない）
+    descending: query時にレンジキーの降順で取得
+    戻り値: (items, 実際に使用した計画)
+    """
+    kwargs = {}
+    if plan['operation'] == 'query':
+        kwargs['IndexName'] = plan['index']
+        kwargs['KeyConditionExpression'] = plan['key_condition']
+        kwargs['ScanIndexForward'] = not descending
+    if plan['filter'] is not None:
+        kwargs['FilterExpression'] = plan['filter']
+
+    items = []
+    while True:
+        try:
+            if plan['operation'] == 'query':
+                response = table.query(**kwargs)
+            else:
+                response = table.scan(**kwargs)
+        except ClientError as e:
+            if plan['operation'] == 'query' and _is_missing_index_error(e):
+                # インデックス未作成: このコンテナでは以後使わずに再計画
+                record_index_fallback(plan['table'], plan['index'], str(e))
+                fallback = plan_list_query(plan['table'], plan['equals'], plan['ranges'])
+                return execute_list_plan(table, fallback, limit, descending)
+            raise
+        items.extend(response.get('Items', []))
+        if limit and len(items) >= limit:
+            items = items[:limit]
+            break
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return items, plan
+
+def with_query_plan_header(headers, plan):
+    """使用した実行計画をデバッグ用ヘッダーとして付与"""
+    return {**headers, 'X-Query-Plan': plan['description']}
+
+# ==================== ページネーション ====================
+# 一覧APIの共通ページング
+# - 継続トークンは LastEvaluatedKey を署名付きでエンコードした不透明な文字列（next_page_token）
+# - トークンは発行時の検索条件（実行計画）に紐付けており、別の条件での再利用や改ざんは 400 になる
+# - 1ページの件数は page_size で指定し、MAX_PAGE_SIZE で上限を設ける
+# - 従来の limit は既存の画面が limit=1000 等で全件を取得しているため、LIST_MAX_ITEMS まで指定どおりに返す
+# - page_size / page_token を指定しない一覧も LIST_MAX_ITEMS 件で読み取りを打ち切り、続きは継続トークンで返す
+#   （1回のリクエストでテーブル全体をメモリに読み込まない）
+# - GSIのレンジキーで query した場合はページをまたいでも並び順が一貫する（スキャン時はページ内のみ）
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '200'))
+LIST_MAX_ITEMS = int(os.environ.get('LIST_MAX_ITEMS', '5000'))
+# 環境変数で十分に長いランダム値を設定すること（未設定の場合は継続トークンを発行・検証しない）
+PAGINATION_TOKEN_SECRET = os.environ.get('PAGINATION_TOKEN_SECRET', '')
+# 既定値の秘密鍵では誰でもトークンを偽造できるため、未設定の場合は起動時に一度だけ警告してページングを無効にする
+# （一覧は1ページ目のみを返し、受け取ったトークンは 400 で拒否する）
+PAGE_TOKENS_ENABLED = bool(PAGINATION_TOKEN_SECRET)
+if not PAGE_TOKENS_ENABLED:
+    print("Warning: PAGINATION_TOKEN_SECRET is not configured; page tokens are disabled and list APIs return only the first page")
+_type_serializer = TypeSerializer()
+_type_deserializer = TypeDeserializer()
+
+def parse_page_size(query_params, default=DEFAULT_PAGE_SIZE):
+    """
+    クエリパラメータから1ページの件数を取得
+    page_size は 1〜MAX_PAGE_SIZE、従来の limit は 1〜LIST_MAX_ITEMS（既存の画面の limit=1000 を切り詰めない）
+    """
+    if query_params.get('page_size'):
+        value, max_size = query_params.get('page_size'), MAX_PAGE_SIZE
+    else:
+        value, max_size = query_params.get('limit'), LIST_MAX_ITEMS
+    try:
+        page_size = int(value) if value else default
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, max_size))
+
+def _page_token_scope(plan):
+    conditions = json.dumps({'equals': plan['equals'], 'ranges': plan['ranges']}, sort_keys=True, default=str)
+    return f"{plan['table']}|{plan['description']}|{conditions}"
+
+def _sign_page_token(payload, scope):
+    message = scope.encode('utf-8') + b'|' + payload
+    return hmac.new(PAGINATION_TOKEN_SECRET.encode('utf-8'), message, hashlib.sha256).digest()[:16]
+
+def encode_page_token(last_evaluated_key, plan):
+    """LastEvaluatedKey を署名付きの継続トークンに変換（続きがない場合はNone）"""
+    if not last_evaluated_key:
+        return None
+    if not PAGE_TOKENS_ENABLED:
+        print(f"Warning: {plan['table']} list has more items but page tokens are disabled; returning the first page only")
+        return None
+    serialized = {k: _type_serializer.serialize(v) for k, v in last_evaluated_key.items()}
+    payload = json.dumps(serialized, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    signature = _sign_page_token(payload, _page_token_scope(plan))
+    return (base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=') + '.' +
+            base64.urlsafe_b64encode(signature).decode('ascii').rstrip('='))
+
+def decode_page_token(token, plan):
+    """継続トークンを検証して ExclusiveStartKey に戻す（不正な場合・ページングが無効な場合は ValueError）"""
+    if not PAGE_TOKENS_ENABLED:
+        raise ValueError('Page tokens are disabled')
+    try:
+        payload_part, signature_part = token.split('.', 1)
+        payload = base64.urlsafe_b64decode(payload_part + '=' * (-len(payload_part) % 4))
+        signature = base64.urlsafe_b64decode(signature_part + '=' * (-len(signature_part) % 4))
+    except Exception:
+        raise ValueError('Invalid page token')
+    if not hmac.compare_digest(signature, _sign_page_token(payload, _page_token_scope(plan))):
+        raise ValueError('Invalid page token')
+    try:
+        serialized = json.loads(payload.decode('utf-8'))
+        return {k: _type_deserializer.deserialize(v) for k, v in serialized.items()}
+    except Exception:
+        raise ValueError('Invalid page token')
+
+def execute_list_page(table, plan, page_size, page_token=None, descending=False):
+    """
+    実行計画に従って1ページ分（最大 page_size 件）を取得
+    FilterExpression で除外される分を考慮し、件数に達するか末尾に到達するまで読み進める
+    戻り値: (items, next_page_token, 実際に使用した計画)
+    """
+    kwargs = {}
+    if plan['operation'] == 'query':
+        kwargs['IndexName'] = plan['index']
+        kwargs['KeyConditionExpression'] = plan['key_condition']
+        kwargs['ScanIndexForward'] = not descending
+    if plan['filter'] is not None:
+        kwargs['FilterExpression'] = plan['filter']
+    if page_token:
+        kwargs['ExclusiveStartKey'] = decode_page_token(page_token, plan)
+
+    items = []
+    last_evaluated_key = None
+    while len(items) < page_size:
+        # 残り件数だけ評価させることで、LastEvaluatedKey がページ境界と一致する
+        kwargs['Limit'] = page_size - len(items)
+        try:
+            if plan['operation'] == 'query':
+                response = table.query(**kwargs)
+            else:
+                response = table.scan(**kwargs)
+        except ClientError as e:
+            if plan['operation'] == 'query' and _is_missing_index_error(e) and not page_token:
+                record_index_fallback(plan['table'], plan['index'], str(e))
+                fallback = plan_list_query(plan['table'], plan['equals'], plan['ranges'])
+                return execute_list_page(table, fallback, page_size, None, descending)
+            raise
+        items.extend(response.get('Items', []))
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        kwargs['ExclusiveStartKey'] = last_evaluated_key
+    return items, encode_page_token(last_evaluated_key, plan), plan
+
+def execute_list_request(table, plan, query_params, descending=False):
+    """
+    page_size / page_token が指定されていれば1ページ分、指定がなければ最大 LIST_MAX_ITEMS 件を取得
+    （LIST_MAX_ITEMS を超える場合は打ち切り、続きの継続トークンを返す）
+    戻り値: (items, next_page_token, 実際に使用した計画)
+    """
+    if 'page_size' in query_params or 'page_token' in query_params:
+        return execute_list_page(table, plan, parse_page_size(query_params), query_params.get('page_token'), descending)
+    items, next_page_token, plan = execute_list_page(table, plan, LIST_MAX_ITEMS, None, descending)
+    if next_page_token:
+        print(f"Warning: {plan['table']} list truncated at {LIST_MAX_ITEMS} items; returning next_page_token")
+    return items, next_page_token, plan
+
+def with_page_token_header(headers, next_page_token):
+    """継続トークンをヘッダーに付与（配列を返すAPI用）"""
+    if not next_page_token:
+        return headers
+    return {**headers, 'X-Next-Page-Token': next_page_token}
+
+def invalid_page_token_response(headers):
+    return {
+        'statusCode': 400,
+        'headers': headers,
+        'body': json.dumps({'error': 'Invalid page token'}, ensure_ascii=False)
+    }
+
+# ==================== 並列スキャン ====================
+# テーブル全件を対象にした一括処理（全削除・最大ID・移行スクリプト等）のためのスキャン
+# - Segment / TotalSegments でテーブルを分割し、セグメントごとのスレッドで並列に読む
+# - 読んだページは上限付きのキューを通して呼び出し側に渡す（呼び出し側が遅い場合、キューが埋まると読み取りを待つ）
+# - on_item を指定すると、アイテムごとの処理（削除・エクスポート等）をセグメントのスレッドで実行し、その戻り値を返す
+# - checkpoint（dict）を渡すと、呼び出し側が処理し終えたページまでのセグメントごとの位置を記録する
+#   dump_scan_checkpoint で保存し、load_scan_checkpoint で読み込んで渡せば続きから再開できる
+#   （中断時に処理中だったページは再開後にもう一度処理されるため、処理は冪等にしておくこと）
+PARALLEL_SCAN_SEGMENTS = max(1, int(os.environ.get('PARALLEL_SCAN_SEGMENTS', '8')))
+PARALLEL_SCAN_QUEUE_PAGES = max(1, int(os.environ.get('PARALLEL_SCAN_QUEUE_PAGES', '16')))
+
+def parallel_scan(table, scan_kwargs=None, total_segments=None, on_item=None, checkpoint=None,
+                  on_progress=None, max_queued_pages=None):
+    """
+    テーブルを並列にスキャンし、アイテム（on_item 指定時はその戻り値）を順不同で返すジェネレーター
+    scan_kwargs: FilterExpression / ProjectionExpression 等の scan の引数
+    on_progress: ページを処理し終えるたびに {'pages', 'items', 'segments_done', 'total_segments'} で呼ばれる
+    """
+    if checkpoint is not None and checkpoint.get('total_segments'):
+        # 再開時はセグメント数を変えない（位置はセグメント数に依存する）
+        total_segments = checkpoint['total_segments']
+    total_segments = max(1, total_segments or PARALLEL_SCAN_SEGMENTS)
+    positions = {}
+    if checkpoint is not None:
+        checkpoint['total_segments'] = total_segments
+        positions = checkpoint.setdefault('segments', {})
+    pending = [segment for segment in range(total_segments) if not positions.get(str(segment), {}).get('done')]
+    stats = {'pages': 0, 'items': 0, 'segments_done': total_segments - len(pending), 'total_segments': total_segments}
+    if not pending:
+        return
+
+    pages = queue.Queue(maxsize=max_queued_pages or PARALLEL_SCAN_QUEUE_PAGES)
+    stop = threading.Event()
+
+    def put(entry):
+        # 呼び出し側が処理を打ち切った場合は待ち続けない
+        while not stop.is_set():
+            try:
+                pages.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_segment(segment):
+        kwargs = {**(scan_kwargs or {}), 'Segment': segment, 'TotalSegments': total_segments}
+        start_key = positions.get(str(segment), {}).get('key')
+        if start_key:
+            kwargs['ExclusiveStartKey'] = start_key
+        try:
+            while not stop.is_set():
+                response = table.scan(**kwargs)
+                items = response.get('Items', [])
+                if on_item:
+                    items = [on_item(item) for item in items]
+                last_key = response.get('LastEvaluatedKey')
+                if not put((segment, items, last_key, None)) or not last_key:
+                    return
+                kwargs['ExclusiveStartKey'] = last_key
+        except Exception as e:
+            put((segment, [], None, e))
+
+    executor = ThreadPoolExecutor(max_workers=len(pending))
+    try:
+        for segment in pending:
+            executor.submit(scan_segment, segment)
+        remaining = len(pending)
+        while remaining:
+            segment, items, last_key, error = pages.get()
+            if error:
+                raise error
+            for item in items:
+                yield item
+            positions[str(segment)] = {'key': last_key} if last_key else {'done': True}
+            if not last_key:
+                remaining -= 1
+                stats['segments_done'] += 1
+            stats['pages'] += 1
+            stats['items'] += len(items)
+            if on_progress:
+                on_progress(dict(stats))
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+def dump_scan_checkpoint(checkpoint):
+    """並列スキャンのチェックポイントをJSON文字列に変換（位置は DynamoDB JSON で保存）"""
+    segments = {}
+    for segment, position in checkpoint.get('segments', {}).items():
+        if position.get('key'):
+            position = {'key': {k: _type_serializer.serialize(v) for k, v in position['key'].items()}}
+        segments[segment] = position
+    return json.dumps({'total_segments': checkpoint.get('total_segments'), 'segments': segments}, sort_keys=True)
+
+def load_scan_checkpoint(text):
+    """dump_scan_checkpoint で保存したチェックポイントを読み込む"""
+    data = json.loads(text)
+    for position in data.get('segments', {}).values():
+        if position.get('key'):
+            position['key'] = {k: _type_deserializer.deserialize(v) for k, v in position['key'].items()}
+    return data
+
+# ルーティングテーブル
+# - (メソッド, パス, ハンドラ) の一覧をコールドスタート時に一度だけトライ木へコンパイルする
+# - パス中の {name} はパラメータとして取り出し、ハンドラに params['name'] で渡す
+# - メソッドに '*' を指定すると全メソッドにマッチする
+# - ハンドラの呼び出し形式: handler(event, headers, params)
+def _gone_google_calendar(event, headers, params):
+    # Google Calendar連携は廃止（今後はシステム内スケジュールのみ）
+    return {
+        'statusCode': 410,
+        'headers': headers,
+        'body': json.dumps({
+            'success': False,
+            'error': 'gone',
+            'message': 'Google Calendar integration is disabled (project policy).'
+        }, ensure_ascii=False)
+    }
+
+def _inventory_item_detail_not_implemented(event, headers, params):
+    # 商品詳細取得（実装は後で追加）
+    return {
+        'statusCode': 404,
+        'headers': headers,
+        'body': json.dumps({'error': 'Not implemented'}, ensure_ascii=False)
+    }
+
+ROUTES = [
+    # 画像アップロード
+    ('*', '/upload', lambda event, headers, params: handle_image_upload(event, headers)),
+    # 清掃マニュアル
+    ('GET', '/cleaning-manual', lambda event, headers, params: apply_conditional_get(event, get_cleaning_manual_data(headers, False))),
+    ('PUT', '/cleaning-manual', lambda event, headers, params: save_cleaning_manual_data(event, headers, False)),
+    ('POST', '/cleaning-manual', lambda event, headers, params: save_cleaning_manual_data(event, headers, False)),
+    ('GET', '/cleaning-manual/draft', lambda event, headers, params: apply_conditional_get(event, get_cleaning_manual_data(headers, True))),
+    ('PUT', '/cleaning-manual/draft', lambda event, headers, params: save_cleaning_manual_data(event, headers, True)),
+    ('POST', '/cleaning-manual/draft', lambda event, headers, params: save_cleaning_manual_data(event, headers, True)),
+    # サービス
+    ('GET', '/services', lambda event, headers, params: apply_conditional_get(event, get_services(headers))),
+    ('POST', '/services', lambda event, headers, params: create_service(event, headers)),
+    ('GET', '/services/{service_id}', lambda event, headers, params: apply_conditional_get(event, get_service_detail(params['service_id'], headers))),
+    ('PUT', '/services/{service_id}', lambda event, headers, params: update_service(params['service_id'], event, headers)),
+    ('DELETE', '/services/{service_id}', lambda event, headers, params: delete_service(params['service_id'], headers)),
+    # 研修動画
+    ('GET', '/training-videos', lambda event, headers, params: apply_conditional_get(event, get_training_videos_data(headers))),
+    ('PUT', '/training-videos', lambda event, headers, params: save_training_videos_data(event, headers)),
+    ('POST', '/training-videos', lambda event, headers, params: save_training_videos_data(event, headers)),
+    # お知らせ
+    ('GET', '/announcements', lambda event, headers, params: get_announcements(headers)),
+    ('POST', '/announcements', lambda event, headers, params: create_announcement(event, headers)),
+    ('PUT', '/announcements', lambda event, headers, params: create_announcement(event, headers)),
+    # WIKI
+    ('GET', '/wiki', lambda event, headers, params: apply_conditional_get(event, get_wiki_data(headers))),
+    ('PUT', '/wiki', lambda event, headers, params: save_wiki_data(event, headers)),
+    ('POST', '/wiki', lambda event, headers, params: save_wiki_data(event, headers)),
+    # レポート
+    ('GET', '/staff/reports', lambda event, headers, params: get_reports(event, headers)),
+    ('POST', '/staff/reports', lambda event, headers, params: create_report(event, headers)),
+    ('PUT', '/staff/reports', lambda event, headers, params: update_report(event, headers)),
+    ('GET', '/staff/reports/{report_id}', lambda event, headers, params: get_report_detail(params['report_id'], event, headers)),
+    ('PUT', '/staff/reports/{report_id}', lambda event, headers, params: update_report_by_id(params['report_id'], event, headers)),
+    ('DELETE', '/staff/reports/{report_id}', lambda event, headers, params: delete_report(params['report_id'], event, headers)),
+    ('GET', '/staff/reports/{report_id}/feedback', lambda event, headers, params: get_report_feedback(params['report_id'], event, headers)),
+    # 公開レポート（認証不要）
+    ('GET', '/public/reports/{report_id}', lambda event, headers, params: get_public_report(params['report_id'], headers)),
+    ('POST', '/public/reports/{report_id}/feedback', lambda event, headers, params: save_report_feedback(params['report_id'], event, headers)),
+    # レポート用画像
+    ('POST', '/staff/report-images', lambda event, headers, params: upload_report_image(event, headers)),
+    ('GET', '/staff/report-images', lambda event, headers, params: get_report_images(event, headers)),
+    ('POST', '/staff/report-images/upload-sessions', lambda event, headers, params: create_report_image_upload_session(event, headers)),
+    ('POST', '/staff/report-images/upload-sessions/complete', lambda event, headers, params: complete_report_image_upload_session(event, headers)),
+    # 在庫管理
+    ('GET', '/staff/inventory/items', lambda event, headers, params: get_inventory_items(event, headers)),
+    ('GET', '/staff/inventory/low-stock', lambda event, headers, params: get_inventory_low_stock(event, headers)),
+    ('POST', '/staff/inventory/items', lambda event, headers, params: create_inventory_item(event, headers)),
+    ('GET', '/staff/inventory/items/{product_id}', _inventory_item_detail_not_implemented),
+    ('PUT', '/staff/inventory/items/{product_id}', lambda event, headers, params: update_inventory_item(params['product_id'], event, headers)),
+    ('POST', '/staff/inventory/out', lambda event, headers, params: process_inventory_transaction(event, headers, 'out')),
+    ('POST', '/staff/inventory/in', lambda event, headers, params: process_inventory_transaction(event, headers, 'in')),
+    ('GET', '/staff/inventory/transactions', lambda event, headers, params: get_inventory_transactions(event, headers)),
+    ('GET', '/admin/inventory/transactions', lambda event, headers, params: get_inventory_transactions(event, headers)),
+    ('GET', '/staff/inventory/rollups', lambda event, headers, params: get_inventory_rollups(event, headers)),
+    ('GET', '/admin/inventory/rollups', lambda event, headers, params: get_inventory_rollups(event, headers)),
+    # NFCタグ打刻
+    ('POST', '/staff/nfc/clock-in', lambda event, headers, params: handle_nfc_clock_in(event, headers)),
+    ('GET', '/staff/nfc/clock-in', lambda event, headers, params: get_nfc_clock_in_logs(event, headers)),
+    ('GET', '/staff/nfc/tag', lambda event, headers, params: get_nfc_tag_info(event, headers)),
+    # 業務連絡
+    ('GET', '/staff/announcements', lambda event, headers, params: get_staff_announcements(event, headers)),
+    ('POST', '/staff/announcements/{announcement_id}/read', lambda event, headers, params: mark_announcement_read(params['announcement_id'], event, headers)),
+    ('GET', '/admin/announcements', lambda event, headers, params: get_admin_announcements(event, headers)),
+    ('POST', '/admin/announcements', lambda event, headers, params: create_announcement(event, headers)),
+    ('GET', '/admin/announcements/{announcement_id}', lambda event, headers, params: get_announcement_detail(params['announcement_id'], event, headers)),
+    ('GET', '/admin/announcements/{announcement_id}/reads', lambda event, headers, params: get_announcement_reads(params['announcement_id'], event, headers)),
+    ('PUT', '/admin/announcements/{announcement_id}', lambda event, headers, params: update_announcement(params['announcement_id'], event, headers)),
+    ('DELETE', '/admin/announcements/{announcement_id}', lambda event, headers, params: delete_announcement(params['announcement_id'], event, headers)),
+    # 管理ダッシュボード
+    ('GET', '/admin/dashboard/stats', lambda event, headers, params: get_dashboard_stats(headers)),
+    # 出退勤エラーログ
+    ('GET', '/attendance/errors', lambda event, headers, params: get_attendance_errors(event, headers)),
+    ('PUT', '/attendance/errors/{error_id}/resolve', lambda event, headers, params: resolve_attendance_error(params['error_id'], headers)),
+    # 出退勤修正申請
+    ('GET', '/attendance/requests', lambda event, headers, params: get_attendance_requests(event, headers)),
+    ('POST', '/attendance/requests', lambda event, headers, params: create_attendance_request(event, headers)),
+    ('GET', '/attendance/requests/{request_id}', lambda event, headers, params: get_attendance_request_detail(params['request_id'], headers)),
+    ('PUT', '/attendance/requests/{request_id}', lambda event, headers, params: update_attendance_request(params['request_id'], event, headers)),
+    ('DELETE', '/attendance/requests/{request_id}', lambda event, headers, params: delete_attendance_request(params['request_id'], headers)),
+    # 出退勤記録
+    ('POST', '/admin/attendance/recompute', lambda event, headers, params: recompute_attendance(event, headers)),
+    ('GET', '/attendance/summaries', lambda event, headers, params: get_attendance_summaries(event, headers)),
+    ('GET', '/attendance', lambda event, headers, params: get_attendance(event, headers)),
+    ('POST', '/attendance', lambda event, headers, params: create_or_update_attendance(event, headers)),
+    ('GET', '/attendance/{attendance_id}', lambda event, headers, params: get_attendance_detail(params['attendance_id'], headers)),
+    ('PUT', '/attendance/{attendance_id}', lambda event, headers, params: create_or_update_attendance(event, headers)),
+    ('DELETE', '/attendance/{attendance_id}', lambda event, headers, params: delete_attendance(params['attendance_id'], headers)),
+    # 休日・祝日
+    ('GET', '/holidays', lambda event, headers, params: apply_conditional_get(event, get_holidays(event, headers))),
+    ('POST', '/holidays', lambda event, headers, params: create_holiday(event, headers)),
+    ('GET', '/holidays/{holiday_id}', lambda event, headers, params: get_holiday_detail(params['holiday_id'], headers)),
+    ('PUT', '/holidays/{holiday_id}', lambda event, headers, params: update_holiday(params['holiday_id'], event, headers)),
+    ('DELETE', '/holidays/{holiday_id}', lambda event, headers, params: delete_holiday(params['holiday_id'], headers)),
+    # 見積もり
+    ('GET', '/estimates', lambda event, headers, params: get_estimates(event, headers)),
+    ('POST', '/estimates', lambda event, headers, params: create_estimate(event, headers)),
+    ('GET', '/estimates/{estimate_id}', lambda event, headers, params: get_estimate_detail(params['estimate_id'], headers)),
+    ('PUT', '/estimates/{estimate_id}', lambda event, headers, params: update_estimate(params['estimate_id'], event, headers)),
+    ('DELETE', '/estimates/{estimate_id}', lambda event, headers, params: delete_estimate(params['estimate_id'], headers)),
+    # スケジュール
+    # 危険操作: スケジュールを全件削除（誤操作防止のため確認文字列必須）
+    ('POST', '/admin/schedules/clear', lambda event, headers, params: clear_all_schedules(event, headers)),
+    ('DELETE', '/admin/schedules/clear', lambda event, headers, params: clear_all_schedules(event, headers)),
+    ('GET', '/schedules', lambda event, headers, params: get_schedules(event, headers)),
+    ('POST', '/schedules', lambda event, headers, params: create_schedule(event, headers)),
+    ('GET', '/schedules/{schedule_id}', lambda event, headers, params: get_schedule_detail(params['schedule_id'], headers)),
+    ('PUT', '/schedules/{schedule_id}', lambda event, headers, params: update_schedule(params['schedule_id'], event, headers)),
+    ('DELETE', '/schedules/{schedule_id}', lambda event, headers, params: delete_schedule(params['schedule_id'], headers)),
+    # Google Calendar連携（廃止）
+    ('*', '/google-calendar/events', _gone_google_calendar),
+    ('*', '/google-calendar/events/{event_id}', _gone_google_calendar),
+    ('*', '/google-calendar/sync', _gone_google_calendar),
+    # 日報
+    ('GET', '/daily-reports', lambda event, headers, params: get_daily_reports(event, headers)),
+    ('POST', '/daily-reports', lambda event, headers, params: create_or_update_daily_report(event, headers)),
+    ('GET', '/daily-reports/{report_id}', lambda event, headers, params: get_daily_report_detail(params['report_id'], headers)),
+    ('PUT', '/daily-reports/{report_id}', lambda event, headers, params: create_or_update_daily_report(event, headers)),
+    ('DELETE', '/daily-reports/{report_id}', lambda event, headers, params: delete_daily_report(params['report_id'], headers)),
+    # TODO
+    ('GET', '/todos', lambda event, headers, params: get_todos(event, headers)),
+    ('POST', '/todos', lambda event, headers, params: create_todo(event, headers)),
+    ('GET', '/todos/{todo_id}', lambda event, headers, params: get_todo_detail(params['todo_id'], headers)),
+    ('PUT', '/todos/{todo_id}', lambda event, headers, params: update_todo(params['todo_id'], event, headers)),
+    ('DELETE', '/todos/{todo_id}', lambda event, headers, params: delete_todo(params['todo_id'], headers)),
+    # ユーザー（従業員）
+    ('GET', '/workers', lambda event, headers, params: apply_conditional_get(event, get_workers(event, headers))),
+    ('POST', '/workers', lambda event, headers, params: create_worker(event, headers)),
+    ('GET', '/workers/{worker_id}', lambda event, headers, params: get_worker_detail(params['worker_id'], headers)),
+    ('PUT', '/workers/{worker_id}', lambda event, headers, params: update_worker(params['worker_id'], event, headers)),
+    ('DELETE', '/workers/{worker_id}', lambda event, headers, params: delete_worker(params['worker_id'], headers)),
+    # クライアント（お客様）
+    ('GET', '/clients', lambda event, headers, params: get_clients(event, headers)),
+    ('POST', '/clients', lambda event, headers, params: create_client(event, headers)),
+    ('GET', '/clients/{client_id}', lambda event, headers, params: get_client_detail(params['client_id'], headers)),
+    ('PUT', '/clients/{client_id}', lambda event, headers, params: update_client(params['client_id'], event, headers)),
+    ('DELETE', '/clients/{client_id}', lambda event, headers, params: delete_client(params['client_id'], headers)),
+    # ブランド
+    ('GET', '/brands', lambda event, headers, params: get_brands(event, headers)),
+    ('POST', '/brands', lambda event, headers, params: create_brand(event, headers)),
+    ('GET', '/brands/{brand_id}', lambda event, headers, params: get_brand_detail(params['brand_id'], headers)),
+    ('PUT', '/brands/{brand_id}', lambda event, headers, params: update_brand(params['brand_id'], event, headers)),
+    ('DELETE', '/brands/{brand_id}', lambda event, headers, params: delete_brand(params['brand_id'], headers)),
+    # 店舗
+    ('GET', '/stores', lambda event, headers, params: get_stores(event, headers)),
+    ('POST', '/stores', lambda event, headers, params: create_store(event, headers)),
+    ('GET', '/stores/{store_id}', lambda event, headers, params: get_store_detail(params['store_id'], headers)),
+    ('PUT', '/stores/{store_id}', lambda event, headers, params: update_store(params['store_id'], event, headers)),
+    ('DELETE', '/stores/{store_id}', lambda event, headers, params: delete_store(params['store_id'], headers)),
+    # Cognitoユーザー作成（管理者のみ）
+    ('POST', '/admin/cognito/users', lambda event, headers, params: create_cognito_user(event, headers)),
+]
+
+def _new_route_node():
+    return {'static': {}, 'param': None, 'param_name': None, 'methods': {}}
+
+def build_route_trie(routes):
+    """
+    ルート定義からトライ木を構築
+    - 固定セグメントは辞書で子ノードを引き、{name} セグメントは1ノードに集約する
+    - 同一パス・同一メソッドの重複登録はエラー
+    """
+    root = _new_route_node()
+    for method, pattern, handler in routes:
+        node = root
+        for segment in pattern.strip('/').split('/'):
+            if not segment:
+                continue
+            if segment.startswith('{') and segment.endswith('}'):
+                name = segment[1:-1]
+                if node['param'] is None:
+                    node['param'] = _new_route_node()
+                    node['param_name'] = name
+                elif node['param_name'] != name:
+                    raise ValueError(f"Conflicting route parameter names at {pattern}: {node['param_name']} / {name}")
+                node = node['param']
+            else:
+                node = node['static'].setdefault(segment, _new_route_node())
+        if method in node['methods']:
+            raise ValueError(f"Duplicate route: {method} {pattern}")
+        node['methods'][method] = handler
+    return root
+
+def _match_route_node(node, segments, index, params):
+    if index == len(segments):
+        return node if node['methods'] else None
+    segment = segments[index]
+    # 固定セグメントを優先し、一致しなければパラメータとして試す
+    child = node['static'].get(segment)
+    if child is not None:
+        matched = _match_route_node(child, segments, index + 1, params)
+        if matched is not None:
+            return matched
+    if node['param'] is not None:
+        params[node['param_name']] = segment
+        matched = _match_route_node(node['param'], segments, index + 1, params)
+        if matched is not None:
+            return matched
+        params.pop(node['param_name'], None)
+    return None
+
+def match_route(normalized_path, method):
+    """
+    正規化済みパスとメソッドからハンドラを解決
+    戻り値: (handler, params, allowed_methods)
+    - パスが存在しない場合: (None, {}, [])
+    - パスは存在するがメソッドが未定義の場合: (None, params, 許可メソッド一覧)
+    """
+    segments = [s for s in normalized_path.split('/') if s]
+    params = {}
+    node = _match_route_node(ROUTE_TRIE, segments, 0, params)
+    if node is None:
+        return None, {}, []
+    handler = node['methods'].get(method) or node['methods'].get('*')
+    return handler, params, sorted(node['methods'].keys())
+
+# コールドスタート時に一度だけ構築
+ROUTE_TRIE = build_route_trie(ROUTES)
+
 
 def lambda_handler(event, context):
     """
     S3に画像をアップロード、または清掃マニュアルデータの読み書きを行うLambda関数
     """
+    # S3イベント通知（直接アップロードされた画像の派生ファイル生成）
+    records = event.get('Records') or []
+    if records and records[0].get('eventSource') == 'aws:s3':
+        return handle_s3_image_event(event)
+    
     # CORSヘッダー
     event_headers = event.get("headers") or {}
     headers = {
         'Access-Control-Allow-Origin': resolve_cors_origin(event_headers),
-        'Access-Control-Allow-Headers': 'Content-Type,Authorization,X-Amz-Date,X-Api-Key,X-Amz-Security-Token',
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization,X-Amz-Date,X-Api-Key,X-Amz-Security-Token,If-None-Match',
+        'Access-Control-Expose-Headers': 'ETag,X-Query-Plan,X-Next-Page-Token',
         'Access-Control-Allow-Methods': 'GET,PUT,POST,DELETE,OPTIONS',
         'Access-Control-Allow-Credentials': 'false',
         'Content-Type': 'application/json'
@@ -869,447 +1945,31 @@ def lambda_handler(event, context):
         normalized_path = '/' + normalized_path
     
     try:
-        # パスに応じて処理を分岐
-        if normalized_path == '/upload':
-            # 画像アップロード
-            return handle_image_upload(event, headers)
-        elif normalized_path == '/cleaning-manual':
-            # 清掃マニュアルデータの読み書き
-            if method == 'GET':
-                return get_cleaning_manual_data(headers, False)
-            elif method == 'PUT' or method == 'POST':
-                return save_cleaning_manual_data(event, headers, False)
-        elif normalized_path == '/cleaning-manual/draft':
-            # 下書きデータの読み書き
-            if method == 'GET':
-                return get_cleaning_manual_data(headers, True)
-            elif method == 'PUT' or method == 'POST':
-                return save_cleaning_manual_data(event, headers, True)
-        elif normalized_path == '/services':
-            # サービス一覧の取得・作成
-            if method == 'GET':
-                return get_services(headers)
-            elif method == 'POST':
-                return create_service(event, headers)
-        elif normalized_path.startswith('/services/'):
-            # サービス詳細の取得・更新・削除
-            service_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_service_detail(service_id, headers)
-            elif method == 'PUT':
-                return update_service(service_id, event, headers)
-            elif method == 'DELETE':
-                return delete_service(service_id, headers)
-        elif normalized_path == '/training-videos':
-            # 研修動画データの読み書き
-            if method == 'GET':
-                return get_training_videos_data(headers)
-            elif method == 'PUT' or method == 'POST':
-                return save_training_videos_data(event, headers)
-        elif normalized_path == '/announcements':
-            # お知らせデータの読み書き
-            if method == 'GET':
-                return get_announcements(headers)
-            elif method == 'POST' or method == 'PUT':
-                return create_announcement(event, headers)
-        elif normalized_path == '/staff/reports':
-            # レポートデータの読み書き
-            if method == 'GET':
-                return get_reports(event, headers)
-            elif method == 'POST':
-                return create_report(event, headers)
-            elif method == 'PUT':
-                return update_report(event, headers)
-        elif normalized_path.startswith('/staff/reports/'):
-            # レポート詳細の取得・更新・削除
-            parts = normalized_path.split('/')
-            if len(parts) >= 4 and parts[-1] == 'feedback':
-                # /staff/reports/{report_id}/feedback - フィードバック取得
-                report_id = parts[-2]
-                if method == 'GET':
-                    return get_report_feedback(report_id, event, headers)
-            else:
-                report_id = parts[-1]
-            if method == 'GET':
-                return get_report_detail(report_id, event, headers)
-            elif method == 'PUT':
-                return update_report_by_id(report_id, event, headers)
-            elif method == 'DELETE':
-                return delete_report(report_id, event, headers)
-        elif normalized_path.startswith('/public/reports/'):
-            # 公開レポート関連（認証不要）
-            parts = normalized_path.split('/')
-            print(f"[DEBUG] Public reports path parts: {parts}, method: {method}")
-            if len(parts) >= 4 and parts[-1] == 'feedback':
-                # /public/reports/{report_id}/feedback - フィードバック送信
-                report_id = parts[-2]
-                print(f"[DEBUG] Feedback endpoint, report_id: {report_id}, method: {method}")
-                if method == 'POST':
-                    return save_report_feedback(report_id, event, headers)
-                else:
-                    # メソッドが一致しない場合もCORSヘッダーを返す
-                    return {
-                        'statusCode': 405,
-                        'headers': headers,
-                        'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
-                    }
-            else:
-                # /public/reports/{report_id} - 公開レポート詳細の取得
-                report_id = parts[-1]
-                if method == 'GET':
-                    return get_public_report(report_id, headers)
-                else:
-                    return {
-                        'statusCode': 405,
-                        'headers': headers,
-                        'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
-                    }
-        elif normalized_path == '/staff/inventory/items':
-            # 在庫一覧の取得・商品登録
-            if method == 'GET':
-                return get_inventory_items(event, headers)
-            elif method == 'POST':
-                return create_inventory_item(event, headers)
-            else:
-                return {
-                    'statusCode': 405,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
-                }
-        elif normalized_path.startswith('/staff/inventory/items/'):
-            # 商品詳細の取得・更新・削除
-            product_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                # 商品詳細取得（実装は後で追加）
-                return {
-                    'statusCode': 404,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Not implemented'}, ensure_ascii=False)
-                }
-            elif method == 'PUT':
-                return update_inventory_item(product_id, event, headers)
-        elif normalized_path == '/staff/inventory/out':
-            # 出庫処理
-            if method == 'POST':
-                return process_inventory_transaction(event, headers, 'out')
-        elif normalized_path == '/staff/inventory/in':
-            # 入庫処理
-            if method == 'POST':
-                return process_inventory_transaction(event, headers, 'in')
-        elif normalized_path == '/staff/inventory/transactions' or normalized_path == '/admin/inventory/transactions':
-            # トランザクション履歴取得
-            if method == 'GET':
-                return get_inventory_transactions(event, headers)
-        elif normalized_path == '/staff/report-images':
-            # レポート用画像のアップロード・一覧取得
-            if method == 'POST':
-                return upload_report_image(event, headers)
-            elif method == 'GET':
-                return get_report_images(event, headers)
-        elif normalized_path == '/staff/announcements':
-            # 業務連絡一覧取得（清掃員向け）
-            if method == 'GET':
-                return get_staff_announcements(event, headers)
-        elif normalized_path == '/staff/nfc/clock-in':
-            # NFCタグ打刻
-            if method == 'POST':
-                return handle_nfc_clock_in(event, headers)
-            elif method == 'GET':
-                return get_nfc_clock_in_logs(event, headers)
-        elif normalized_path == '/staff/nfc/tag':
-            # NFCタグ情報取得
-            if method == 'GET':
-                return get_nfc_tag_info(event, headers)
-        elif normalized_path.startswith('/staff/announcements/') and normalized_path.endswith('/read'):
-            # 業務連絡の既読マーク
-            announcement_id = normalized_path.split('/')[-2]
-            if method == 'POST':
-                return mark_announcement_read(announcement_id, event, headers)
-        elif normalized_path == '/admin/announcements':
-            # 業務連絡一覧取得・作成（管理者向け）
-            if method == 'GET':
-                return get_admin_announcements(event, headers)
-            elif method == 'POST':
-                return create_announcement(event, headers)
-        elif normalized_path.startswith('/admin/announcements/'):
-            # 業務連絡詳細取得・更新・削除（管理者向け）
-            announcement_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_announcement_detail(announcement_id, event, headers)
-            elif method == 'PUT':
-                return update_announcement(announcement_id, event, headers)
-            elif method == 'DELETE':
-                return delete_announcement(announcement_id, event, headers)
-        elif normalized_path == '/admin/dashboard/stats':
-            # 管理ダッシュボードの統計データを取得
-            if method == 'GET':
-                return get_dashboard_stats(headers)
-        elif normalized_path == '/wiki':
-            # WIKIデータの読み書き
-            if method == 'GET':
-                return get_wiki_data(headers)
-            elif method == 'PUT' or method == 'POST':
-                return save_wiki_data(event, headers)
-        elif normalized_path == '/attendance/errors':
-            # 出退勤エラーログの取得
-            if method == 'GET':
-                return get_attendance_errors(event, headers)
-        elif normalized_path.startswith('/attendance/errors/') and normalized_path.endswith('/resolve'):
-            # 出退勤エラーログを解決済みにマーク
-            error_id = normalized_path.split('/')[-2]
-            if method == 'PUT':
-                return resolve_attendance_error(error_id, headers)
-        elif normalized_path == '/attendance/requests':
-            # 出退勤修正申請の取得・作成
-            if method == 'GET':
-                return get_attendance_requests(event, headers)
-            elif method == 'POST':
-                return create_attendance_request(event, headers)
-        elif normalized_path.startswith('/attendance/requests/'):
-            # 出退勤修正申請の詳細・更新・削除
-            request_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_attendance_request_detail(request_id, headers)
-            elif method == 'PUT':
-                return update_attendance_request(request_id, event, headers)
-            elif method == 'DELETE':
-                return delete_attendance_request(request_id, headers)
-        elif normalized_path == '/attendance':
-            # 出退勤記録の取得・作成・更新
-            if method == 'GET':
-                return get_attendance(event, headers)
-            elif method == 'POST':
-                return create_or_update_attendance(event, headers)
-        elif normalized_path.startswith('/attendance/'):
-            # 出退勤記録の詳細・更新・削除
-            attendance_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_attendance_detail(attendance_id, headers)
-            elif method == 'PUT':
-                return create_or_update_attendance(event, headers)
-            elif method == 'DELETE':
-                return delete_attendance(attendance_id, headers)
-        elif normalized_path == '/holidays':
-            # 休日・祝日の取得・作成
-            if method == 'GET':
-                return get_holidays(event, headers)
-            elif method == 'POST':
-                return create_holiday(event, headers)
-        elif normalized_path.startswith('/holidays/'):
-            # 休日・祝日の詳細・更新・削除
-            holiday_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_holiday_detail(holiday_id, headers)
-            elif method == 'PUT':
-                return update_holiday(holiday_id, event, headers)
-            elif method == 'DELETE':
-                return delete_holiday(holiday_id, headers)
-        elif normalized_path == '/estimates':
-            # 見積もりデータの読み書き
-            if method == 'GET':
-                return get_estimates(event, headers)
-            elif method == 'POST':
-                return create_estimate(event, headers)
-        elif normalized_path.startswith('/estimates/'):
-            # 見積もり詳細の取得・更新・削除
-            estimate_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_estimate_detail(estimate_id, headers)
-            elif method == 'PUT':
-                return update_estimate(estimate_id, event, headers)
-            elif method == 'DELETE':
-                return delete_estimate(estimate_id, headers)
-        elif normalized_path == '/admin/schedules/clear':
-            # 危険操作: スケジュールを全件削除（誤操作防止のため確認文字列必須）
-            # Googleカレンダーには一切触れない（システム側のみクリア）
-            if method in ['POST', 'DELETE']:
-                return clear_all_schedules(event, headers)
+        # ルーティングテーブルからハンドラを解決
+        handler, params, allowed_methods = match_route(normalized_path, method)
+        if handler is not None:
+            return finalize_response(event, handler(event, headers, params))
+        if allowed_methods:
+            # パスは存在するがメソッドが一致しない場合もCORSヘッダーを返す
             return {
                 'statusCode': 405,
-                'headers': headers,
+                'headers': {**headers, 'Allow': ','.join(m for m in allowed_methods if m != '*')},
                 'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
             }
-        elif normalized_path == '/schedules':
-            # スケジュールデータの読み書き
-            if method == 'GET':
-                return get_schedules(event, headers)
-            elif method == 'POST':
-                return create_schedule(event, headers)
-        elif normalized_path == '/google-calendar/events':
-            # Google Calendar連携は廃止（今後はシステム内スケジュールのみ）
-            return {
-                'statusCode': 410,
-                'headers': headers,
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'gone',
-                    'message': 'Google Calendar integration is disabled (project policy).'
-                }, ensure_ascii=False)
-            }
-        elif normalized_path == '/daily-reports':
-            # 日報の取得・作成
-            if method == 'GET':
-                return get_daily_reports(event, headers)
-            elif method == 'POST':
-                return create_or_update_daily_report(event, headers)
-        elif normalized_path.startswith('/daily-reports/'):
-            # 日報の詳細・更新・削除
-            report_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_daily_report_detail(report_id, headers)
-            elif method == 'PUT':
-                return create_or_update_daily_report(event, headers)
-            elif method == 'DELETE':
-                return delete_daily_report(report_id, headers)
-        elif normalized_path == '/todos':
-            # TODOの取得・作成
-            if method == 'GET':
-                return get_todos(event, headers)
-            elif method == 'POST':
-                return create_todo(event, headers)
-        elif normalized_path.startswith('/todos/'):
-            # TODOの詳細・更新・削除
-            todo_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_todo_detail(todo_id, headers)
-            elif method == 'PUT':
-                return update_todo(todo_id, event, headers)
-            elif method == 'DELETE':
-                return delete_todo(todo_id, headers)
-        elif normalized_path.startswith('/google-calendar/events/'):
-            # Google Calendar連携は廃止（今後はシステム内スケジュールのみ）
-            return {
-                'statusCode': 410,
-                'headers': headers,
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'gone',
-                    'message': 'Google Calendar integration is disabled (project policy).'
-                }, ensure_ascii=False)
-            }
-        elif normalized_path == '/google-calendar/sync':
-            # Google Calendar連携は廃止（今後はシステム内スケジュールのみ）
-            return {
-                'statusCode': 410,
-                'headers': headers,
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'gone',
-                    'message': 'Google Calendar integration is disabled (project policy).'
-                }, ensure_ascii=False)
-            }
-        elif normalized_path.startswith('/schedules/'):
-            # スケジュール詳細の取得・更新・削除
-            schedule_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_schedule_detail(schedule_id, headers)
-            elif method == 'PUT':
-                return update_schedule(schedule_id, event, headers)
-            elif method == 'DELETE':
-                return delete_schedule(schedule_id, headers)
-        elif normalized_path == '/workers':
-            # ユーザー（従業員）一覧の取得・作成
-            if method == 'GET':
-                return get_workers(event, headers)
-            elif method == 'POST':
-                return create_worker(event, headers)
-        elif normalized_path.startswith('/workers/'):
-            # ユーザー（従業員）詳細の取得・更新・削除
-            worker_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_worker_detail(worker_id, headers)
-            elif method == 'PUT':
-                return update_worker(worker_id, event, headers)
-            elif method == 'DELETE':
-                return delete_worker(worker_id, headers)
-        elif normalized_path == '/clients':
-            # クライアント（お客様）一覧の取得・作成
-            if method == 'GET':
-                return get_clients(event, headers)
-            elif method == 'POST':
-                return create_client(event, headers)
-        elif normalized_path.startswith('/clients/'):
-            # クライアント（お客様）詳細の取得・更新・削除
-            client_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_client_detail(client_id, headers)
-            elif method == 'PUT':
-                return update_client(client_id, event, headers)
-            elif method == 'DELETE':
-                return delete_client(client_id, headers)
-        elif normalized_path == '/brands':
-            # ブランド一覧の取得・作成
-            if method == 'GET':
-                return get_brands(event, headers)
-            elif method == 'POST':
-                return create_brand(event, headers)
-            else:
-                return {
-                    'statusCode': 405,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
-                }
-        elif normalized_path.startswith('/brands/'):
-            # ブランド詳細の取得・更新・削除
-            brand_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_brand_detail(brand_id, headers)
-            elif method == 'PUT':
-                return update_brand(brand_id, event, headers)
-            elif method == 'DELETE':
-                return delete_brand(brand_id, headers)
-            else:
-                return {
-                    'statusCode': 405,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
-                }
-        elif normalized_path == '/stores':
-            # 店舗一覧の取得・作成
-            if method == 'GET':
-                return get_stores(event, headers)
-            elif method == 'POST':
-                return create_store(event, headers)
-            else:
-                return {
-                    'statusCode': 405,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
-                }
-        elif normalized_path.startswith('/stores/'):
-            # 店舗詳細の取得・更新・削除
-            store_id = normalized_path.split('/')[-1]
-            if method == 'GET':
-                return get_store_detail(store_id, headers)
-            elif method == 'PUT':
-                return update_store(store_id, event, headers)
-            elif method == 'DELETE':
-                return delete_store(store_id, headers)
-            else:
-                return {
-                    'statusCode': 405,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
+        # デバッグ: パスが一致しなかった場合
+        print(f"DEBUG: Path not matched. normalized_path={normalized_path}, original_path={path}")
+        return {
+            'statusCode': 404,
+            'headers': headers,
+            'body': json.dumps({
+                'error': 'Not found',
+                'debug': {
+                    'path': path,
+                    'normalized_path': normalized_path,
+                    'method': method
                 }
-        elif normalized_path.startswith('/admin/cognito/users'):
-            # Cognitoユーザー作成（管理者のみ）
-            if method == 'POST':
-                return create_cognito_user(event, headers)
-        else:
-            # デバッグ: パスが一致しなかった場合
-            print(f"DEBUG: Path not matched. normalized_path={normalized_path}, original_path={path}")
-            return {
-                'statusCode': 404,
-                'headers': headers,
-                'body': json.dumps({
-                    'error': 'Not found',
-                    'debug': {
-                        'path': path,
-                        'normalized_path': normalized_path,
-                        'method': method
-                    }
-                })
-            }
+            })
+        }
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -1398,17 +2058,13 @@ def get_cleaning_manual_data(headers, is_draft=False):
     s3_key = DRAFT_KEY if is_draft else DATA_KEY
     
     try:
-        # S3からデータを取得
-        response = s3_client.get_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=s3_key
-        )
-        data = json.loads(response['Body'].read().decode('utf-8'))
+        # S3からデータを取得（コンテナ内キャッシュ経由）
+        document = get_s3_json_document(s3_key)
         
         return {
             'statusCode': 200,
-            'headers': headers,
-            'body': json.dumps(data)
+            'headers': {**headers, 'ETag': document['etag']} if document.get('etag') else headers,
+            'body': document['body']
         }
     except s3_client.exceptions.NoSuchKey:
         # ファイルが存在しない場合は初期データを返す
@@ -1451,12 +2107,7 @@ def save_cleaning_manual_data(event, headers, is_draft=False):
         data['updatedBy'] = data.get('updatedBy', 'unknown')
         
         # S3に保存
-        s3_client.put_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=s3_key,
-            Body=json.dumps(data, ensure_ascii=False, indent=2),
-            ContentType='application/json'
-        )
+        put_s3_json_document(s3_key, data)
         
         return {
             'statusCode': 200,
@@ -1487,17 +2138,13 @@ def get_wiki_data(headers):
     WIKIデータを取得
     """
     try:
-        # S3からデータを取得
-        response = s3_client.get_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=WIKI_KEY
-        )
-        data = json.loads(response['Body'].read().decode('utf-8'))
+        # S3からデータを取得（コンテナ内キャッシュ経由）
+        document = get_s3_json_document(WIKI_KEY)
         
         return {
             'statusCode': 200,
-            'headers': headers,
-            'body': json.dumps(data)
+            'headers': {**headers, 'ETag': document['etag']} if document.get('etag') else headers,
+            'body': document['body']
         }
     except s3_client.exceptions.NoSuchKey:
         # ファイルが存在しない場合は初期データを返す
@@ -1536,12 +2183,7 @@ def save_wiki_data(event, headers):
             data['updatedAt'] = datetime.now().isoformat()
         
         # S3に保存
-        s3_client.put_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=WIKI_KEY,
-            Body=json.dumps(data, ensure_ascii=False, indent=2),
-            ContentType='application/json'
-        )
+        put_s3_json_document(WIKI_KEY, data)
         
         return {
             'statusCode': 200,
@@ -1583,6 +2225,8 @@ def get_dashboard_stats(headers):
         
         # 承認待ちレポート数を取得（status='draft'のレポート）
         try:
+            if not has_table_index('staff-reports', 'status-created_at-index'):
+                raise Exception('status-created_at-index is not available')
             # status-created_at-indexを使用してdraftステータスのレポートを取得
             response = REPORTS_TABLE.query(
                 IndexName='status-created_at-index',
@@ -1592,6 +2236,9 @@ def get_dashboard_stats(headers):
             stats['pending_reports'] = response.get('Count', 0)
         except Exception as e:
             print(f"Error getting pending reports: {str(e)}")
+            # インデックスが存在しない場合のみ以後のクエリを止める（スロットリング等の一時的なエラーでは止めない）
+            if isinstance(e, ClientError) and _is_missing_index_error(e):
+                record_index_fallback('staff-reports', 'status-created_at-index', str(e))
             # GSIが存在しない場合はスキャンで取得
             try:
                 response = REPORTS_TABLE.scan(
@@ -1632,17 +2279,13 @@ def get_services(headers):
     サービス一覧を取得
     """
     try:
-        # S3からデータを取得
-        response = s3_client.get_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=SERVICES_KEY
-        )
-        data = json.loads(response['Body'].read().decode('utf-8'))
+        # S3からデータを取得（コンテナ内キャッシュ経由）
+        document = get_s3_json_document(SERVICES_KEY)
         
         return {
             'statusCode': 200,
-            'headers': headers,
-            'body': json.dumps(data, ensure_ascii=False)
+            'headers': {**headers, 'ETag': document['etag']} if document.get('etag') else headers,
+            'body': document['body']
         }
     except s3_client.exceptions.NoSuchKey:
         # ファイルが存在しない場合は空の配列を返す
@@ -1660,12 +2303,8 @@ def get_service_detail(service_id, headers):
     サービス詳細を取得
     """
     try:
-        # サービス一覧を取得
-        response = s3_client.get_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=SERVICES_KEY
-        )
-        services = json.loads(response['Body'].read().decode('utf-8'))
+        # サービス一覧を取得（コンテナ内キャッシュ経由）
+        services = get_s3_json_document(SERVICES_KEY)['data']
         
         # サービスIDで検索
         service = None
@@ -1732,12 +2371,7 @@ def create_service(event, headers):
         services.append(service_data)
         
         # S3に保存
-        s3_client.put_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=SERVICES_KEY,
-            Body=json.dumps(services, ensure_ascii=False, indent=2),
-            ContentType='application/json'
-        )
+        put_s3_json_document(SERVICES_KEY, services)
         
         return {
             'statusCode': 200,
@@ -1802,12 +2436,7 @@ def update_service(service_id, event, headers):
             }
         
         # S3に保存
-        s3_client.put_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=SERVICES_KEY,
-            Body=json.dumps(services, ensure_ascii=False, indent=2),
-            ContentType='application/json'
-        )
+        put_s3_json_document(SERVICES_KEY, services)
         
         return {
             'statusCode': 200,
@@ -1861,12 +2490,7 @@ def delete_service(service_id, headers):
             }
         
         # S3に保存
-        s3_client.put_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=SERVICES_KEY,
-            Body=json.dumps(services, ensure_ascii=False, indent=2),
-            ContentType='application/json'
-        )
+        put_s3_json_document(SERVICES_KEY, services)
         
         return {
             'statusCode': 200,
@@ -1892,18 +2516,13 @@ def get_training_videos_data(headers):
     研修動画データを取得
     """
     try:
-        # S3からデータを取得
-        response = s3_client.get_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=TRAINING_VIDEOS_KEY
-        )
-        
-        data = json.loads(response['Body'].read().decode('utf-8'))
+        # S3からデータを取得（コンテナ内キャッシュ経由）
+        document = get_s3_json_document(TRAINING_VIDEOS_KEY)
         
         return {
             'statusCode': 200,
-            'headers': headers,
-            'body': json.dumps(data, ensure_ascii=False)
+            'headers': {**headers, 'ETag': document['etag']} if document.get('etag') else headers,
+            'body': document['body']
         }
     except s3_client.exceptions.NoSuchKey:
         # ファイルが存在しない場合は空のデータを返す
@@ -1939,12 +2558,7 @@ def save_training_videos_data(event, headers):
         data['updatedBy'] = data.get('updatedBy', 'unknown')
         
         # S3に保存
-        s3_client.put_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=TRAINING_VIDEOS_KEY,
-            Body=json.dumps(data, ensure_ascii=False, indent=2),
-            ContentType='application/json'
-        )
+        put_s3_json_document(TRAINING_VIDEOS_KEY, data)
         
         return {
             'statusCode': 200,
@@ -2087,61 +2701,181 @@ def get_announcements(headers):
 # レポート機能
 # ============================================================================
 
+# ==================== IDトークン検証 ====================
+# - Cognito ID Token（RS256）の署名をJWKSで検証する
+# - JWKSはコンテナごとに1回だけ読み込む（COGNITO_JWKS_JSON 環境変数、またはデプロイパッケージ同梱の cognito_jwks.json）
+#   ※ 取得: python3 scripts/fetch_cognito_jwks.py > cognito_jwks.json（鍵ローテーション時は再取得して再デプロイ）
+# - 検証済みのクレームはトークンのハッシュをキーに exp までLRUキャッシュし、同じセッション内の再検証を省略する
+# - JWKSが読み込めない場合は従来のデコードのみ（署名検証なし）で動作する（REQUIRE_TOKEN_SIGNATURE=true で拒否）
+COGNITO_TOKEN_ISSUER = f"https://cognito-idp.ap-northeast-1.amazonaws.com/{COGNITO_USER_POOL_ID}"
+COGNITO_APP_CLIENT_ID = os.environ.get('COGNITO_APP_CLIENT_ID', '')
+COGNITO_JWKS_PATH = os.environ.get(
+    'COGNITO_JWKS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cognito_jwks.json')
+)
+REQUIRE_TOKEN_SIGNATURE = os.environ.get('REQUIRE_TOKEN_SIGNATURE', 'false').lower() == 'true'
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', '1024'))
+TOKEN_CLOCK_SKEW_SECONDS = 60
+
+# SHA-256 の DigestInfo プレフィックス（PKCS#1 v1.5）
+_SHA256_DIGEST_INFO_PREFIX = bytes.fromhex('3031300d060960864801650304020105000420')
+
+_jwks_keys = None  # kid -> (n, e)。None は未読み込み
+_verified_token_cache = OrderedDict()  # sha256(token) -> (exp, user_info)
+
+def _b64url_decode(data):
+    if isinstance(data, str):
+        data = data.encode('ascii')
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+def load_jwks():
+    """JWKSを読み込み、kid -> (n, e) の辞書を返す（コンテナごとに1回）"""
+    global _jwks_keys
+    if _jwks_keys is not None:
+        return _jwks_keys
+    keys = {}
+    try:
+        jwks_json = os.environ.get('COGNITO_JWKS_JSON')
+        if not jwks_json and os.path.exists(COGNITO_JWKS_PATH):
+            with open(COGNITO_JWKS_PATH, 'r', encoding='utf-8') as f:
+                jwks_json = f.read()
+        if jwks_json:
+            for jwk in json.loads(jwks_json).get('keys', []):
+                if jwk.get('kty') != 'RSA' or not jwk.get('kid'):
+                    continue
+                keys[jwk['kid']] = (
+                    int.from_bytes(_b64url_decode(jwk['n']), 'big'),
+                    int.from_bytes(_b64url_decode(jwk['e']), 'big')
+                )
+        if not keys:
+            print("WARNING: Cognito JWKS not configured; ID token signatures are not verified")
+    except Exception as e:
+        print(f"Error loading Cognito JWKS: {str(e)}")
+    _jwks_keys = keys
+    return _jwks_keys
+
+def rsa_verify_sha256(message, signature, n, e):
+    """RS256（RSASSA-PKCS1-v1_5 + SHA-256）の署名を検証"""
+    key_length = (n.bit_length() + 7) // 8
+    if len(signature) != key_length:
+        return False
+    s = int.from_bytes(signature, 'big')
+    if s >= n:
+        return False
+    encoded = pow(s, e, n).to_bytes(key_length, 'big')
+    digest_info = _SHA256_DIGEST_INFO_PREFIX + hashlib.sha256(message).digest()
+    padding_length = key_length - len(digest_info) - 3
+    if padding_length < 8:
+        return False
+    expected = b'\x00\x01' + b'\xff' * padding_length + b'\x00' + digest_info
+    return hmac.compare_digest(encoded, expected)
+
+def decode_verified_token(id_token):
+    """
+    署名・発行者・有効期限を検証してペイロードを返す（検証失敗時はNone）
+    JWKS未設定の場合は署名検証を行わずにペイロードを返す（REQUIRE_TOKEN_SIGNATURE=true の場合はNone）
+    """
+    parts = id_token.split('.')
+    if len(parts) != 3:
+        print(f"Invalid token format: expected 3 parts, got {len(parts)}")
+        return None
+    header = json.loads(_b64url_decode(parts[0]))
+    payload = json.loads(_b64url_decode(parts[1]))
+
+    keys = load_jwks()
+    if not keys:
+        if REQUIRE_TOKEN_SIGNATURE:
+            print("Token rejected: JWKS not configured and REQUIRE_TOKEN_SIGNATURE=true")
+            return None
+        return payload
+
+    if header.get('alg') != 'RS256':
+        print(f"Token rejected: unsupported alg {header.get('alg')}")
+        return None
+    key = keys.get(header.get('kid'))
+    if not key:
+        print(f"Token rejected: unknown kid {header.get('kid')}")
+        return None
+    signing_input = f"{parts[0]}.{parts[1]}".encode('ascii')
+    if not rsa_verify_sha256(signing_input, _b64url_decode(parts[2]), *key):
+        print("Token rejected: invalid signature")
+        return None
+    if payload.get('iss') != COGNITO_TOKEN_ISSUER:
+        print(f"Token rejected: unexpected issuer {payload.get('iss')}")
+        return None
+    if COGNITO_APP_CLIENT_ID and COGNITO_APP_CLIENT_ID not in (payload.get('aud'), payload.get('client_id')):
+        print("Token rejected: unexpected audience")
+        return None
+    exp = payload.get('exp')
+    if not isinstance(exp, (int, float)) or exp + TOKEN_CLOCK_SKEW_SECONDS < time.time():
+        print("Token rejected: expired")
+        return None
+    return payload
+
+def build_user_info(payload):
+    """トークンのクレームからユーザー情報を組み立てる"""
+    # ユーザー情報を取得
+    uid = payload.get('sub') or payload.get('cognito:username', '')
+    email = payload.get('email', '')
+    name = payload.get('name') or payload.get('given_name', '') or email.split('@')[0] if email else ''
+    
+    # ロールを取得（カスタムクレーム、グループ、またはデフォルト）
+    role = payload.get('custom:role') or payload.get('role')
+    
+    # Cognitoグループをチェック
+    groups = payload.get('cognito:groups', [])
+    if not role and groups:
+        if 'admin' in groups or 'ADMIN' in groups:
+            role = 'admin'
+        elif 'staff' in groups or 'STAFF' in groups:
+            role = 'cleaning'
+    
+    # デフォルトロール
+    if not role:
+        role = 'cleaning'
+    
+    return {
+        'uid': uid,
+        'cognito_sub': uid,
+        'email': email,
+        'name': name,
+        'role': role,
+        'verified': True
+    }
+
+def clear_verified_token_cache():
+    _verified_token_cache.clear()
+
 def verify_firebase_token(id_token):
     """
-    Cognito ID Tokenを検証（簡易版）
-    注意: 本番環境では、適切なJWT検証ライブラリを使用して署名検証を行うことを推奨
+    Cognito ID Tokenを検証し、ユーザー情報を返す（検証失敗時はNone）
+    検証済みトークンは exp までキャッシュから返す
     """
     if not id_token:
         return None
     
+    cache_key = hashlib.sha256(id_token.encode('utf-8')).digest()
+    cached = _verified_token_cache.get(cache_key)
+    if cached:
+        exp, user_info = cached
+        if exp + TOKEN_CLOCK_SKEW_SECONDS >= time.time():
+            _verified_token_cache.move_to_end(cache_key)
+            return dict(user_info)
+        del _verified_token_cache[cache_key]
+    
     try:
-        # JWTトークンをデコード（署名検証なしの簡易版）
-        # JWTは3つの部分（header.payload.signature）に分かれている
-        parts = id_token.split('.')
-        if len(parts) != 3:
-            print(f"Invalid token format: expected 3 parts, got {len(parts)}")
+        payload = decode_verified_token(id_token)
+        if payload is None:
             return None
-        
-        # ペイロード部分をデコード
-        payload_part = parts[1]
-        # Base64URLデコード（パディングを追加）
-        padding = 4 - len(payload_part) % 4
-        if padding != 4:
-            payload_part += '=' * padding
-        
-        import base64
-        payload_json = base64.urlsafe_b64decode(payload_part)
-        payload = json.loads(payload_json)
-        
-        # ユーザー情報を取得
-        uid = payload.get('sub') or payload.get('cognito:username', '')
-        email = payload.get('email', '')
-        name = payload.get('name') or payload.get('given_name', '') or email.split('@')[0] if email else ''
-        
-        # ロールを取得（カスタムクレーム、グループ、またはデフォルト）
-        role = payload.get('custom:role') or payload.get('role')
-        
-        # Cognitoグループをチェック
-        groups = payload.get('cognito:groups', [])
-        if not role and groups:
-            if 'admin' in groups or 'ADMIN' in groups:
-                role = 'admin'
-            elif 'staff' in groups or 'STAFF' in groups:
-                role = 'cleaning'
-        
-        # デフォルトロール
-        if not role:
-            role = 'cleaning'
-        
-        return {
-            'uid': uid,
-            'cognito_sub': uid,
-            'email': email,
-            'name': name,
-            'role': role,
-            'verified': True  # Cognitoトークンがデコードできた場合は認証済みとみなす
-        }
+        user_info = build_user_info(payload)
+        
+        # 署名検証済みのトークンのみキャッシュする
+        exp = payload.get('exp')
+        if _jwks_keys and isinstance(exp, (int, float)):
+            _verified_token_cache[cache_key] = (exp, user_info)
+            if len(_verified_token_cache) > TOKEN_CACHE_MAX_ENTRIES:
+                _verified_token_cache.popitem(last=False)
+        return dict(user_info)
     except Exception as e:
         print(f"Error verifying token: {str(e)}")
         # エラー時はNoneを返す（認証失敗）
@@ -2151,7 +2885,7 @@ def check_admin_permission(user_info):
     """
     管理者権限をチェック
     """
-    return user_info.get('role') == 'admin'
+    return bool(user_info) and user_info.get('role') == 'admin'
 
 def convert_to_s3_url(path):
     """
@@ -2172,38 +2906,600 @@ def convert_to_s3_url(path):
     # S3の完全URLを生成
     return f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{clean_path}"
 
+def decode_base64_image(base64_image):
+    """Base64画像をデコード（data:image/jpeg;base64, のプレフィックスを除去）"""
+    if ',' in base64_image:
+        base64_image = base64_image.split(',')[-1]
+    return base64.b64decode(base64_image)
+
+def put_photo_to_s3(image_data, s3_key):
+    """画像データをS3にアップロードして公開URLを返す"""
+    # S3にアップロード（ACLなし - バケットポリシーで公開設定）
+    s3_client.put_object(
+        Bucket=S3_BUCKET_NAME,
+        Key=s3_key,
+        Body=image_data,
+        ContentType='image/jpeg'
+    )
+    
+    # 公開URLを生成
+    return f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{s3_key}"
+
 def upload_photo_to_s3(base64_image, s3_key):
     """
     Base64エンコードされた画像をS3にアップロード
     """
     try:
-        # Base64をデコード（data:image/jpeg;base64, のプレフィックスを除去）
-        if ',' in base64_image:
-            base64_image = base64_image.split(',')[-1]
-        image_data = base64.b64decode(base64_image)
-        
-        # S3にアップロード（ACLなし - バケットポリシーで公開設定）
-        s3_client.put_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=s3_key,
-            Body=image_data,
-            ContentType='image/jpeg'
-        )
-        
-        # 公開URLを生成
-        photo_url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{s3_key}"
-        return photo_url
+        return put_photo_to_s3(decode_base64_image(base64_image), s3_key)
     except Exception as e:
         print(f"Error uploading photo to S3: {str(e)}")
         raise
 
-def upload_report_photo_with_metadata(base64_image, category, cleaning_date, staff_id=None, folder_name=None, image_hash=None):
-    """
-    レポート用画像を日付単位でS3に保存し、メタデータをDynamoDBに保存
-    
-    Args:
-        base64_image: Base64エンコードされた画像
-        category: 'before' または 'after'
+# ==================== 画像の派生ファイル（サムネイル・WebP） ====================
+# レポート写真のオリジナルの隣に、幅を固定したJPEG・WebPを生成する
+# - 例: before/2025/12/04/abc12345.jpg → before/2025/12/04/abc12345.w320.webp, abc12345.w320.jpg, ...
+# - EXIFの向きを画素に反映してから書き出し、EXIF等のメタデータは含めない
+# - オリジナルより大きい幅は生成しない（オリジナル幅で1つにまとめる）
+# - 生成結果 {'widths': [...], 'formats': [...]} を report-images の derivatives、
+#   レポートの photo_derivatives（オリジナルURL → 生成結果）に記録し、APIで srcset を返す
+# - 生成はリクエスト処理では行わず、S3イベント通知（ObjectCreated）で handle_s3_image_event が行う
+# - Pillow（Lambda Layer: scripts/create_pillow_layer.sh）がない環境では生成をスキップする
+IMAGE_DERIVATIVES_ENABLED = PIL_AVAILABLE and os.environ.get('IMAGE_DERIVATIVES_ENABLED', 'true').lower() == 'true'
+IMAGE_DERIVATIVE_WIDTHS = [int(w) for w in os.environ.get('IMAGE_DERIVATIVE_WIDTHS', '320,640,1280').split(',') if w.strip()]
+IMAGE_DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+IMAGE_DERIVATIVE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+_DERIVATIVE_KEY_PATTERN = re.compile(r'\.w\d+\.(webp|jpg)$')
+
+def derivative_s3_key(s3_key, width, extension):
+    """オリジナルのS3キーから派生ファイルのキーを生成"""
+    return f"{s3_key.rsplit('.', 1)[0]}.w{width}.{extension}"
+
+def is_derivative_s3_key(s3_key):
+    return bool(_DERIVATIVE_KEY_PATTERN.search(s3_key))
+
+def _to_rgb(image):
+    # 透過PNG等は白背景に合成（JPEGはアルファを持てないため）
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+def generate_image_derivatives(image_data, s3_key):
+    """
+    サムネイル・WebPを生成してS3にアップロード
+    戻り値: {'widths': [...], 'formats': [...]}（生成しなかった・失敗した場合はNone）
+    """
+    if not IMAGE_DERIVATIVES_ENABLED or is_derivative_s3_key(s3_key):
+        return None
+    try:
+        with Image.open(io.BytesIO(image_data)) as original:
+            image = _to_rgb(ImageOps.exif_transpose(original))
+        resample = getattr(Image, 'Resampling', Image).LANCZOS
+        widths = sorted({min(width, image.width) for width in IMAGE_DERIVATIVE_WIDTHS})
+        for width in widths:
+            if width == image.width:
+                resized = image
+            else:
+                resized = image.resize((width, max(1, round(image.height * width / image.width))), resample)
+            for extension, (image_format, content_type, options) in IMAGE_DERIVATIVE_FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, image_format, **options)
+                s3_client.put_object(
+                    Bucket=S3_BUCKET_NAME,
+                    Key=derivative_s3_key(s3_key, width, extension),
+                    Body=buffer.getvalue(),
+                    ContentType=content_type,
+                    CacheControl=IMAGE_DERIVATIVE_CACHE_CONTROL
+                )
+        return {'widths': widths, 'formats': list(IMAGE_DERIVATIVE_FORMATS)}
+    except Exception as e:
+        print(f"Warning: Could not generate image derivatives for {s3_key}: {str(e)}")
+        return None
+
+def build_image_srcsets(url, derivatives):
+    """
+    オリジナルURLと生成結果から srcset 用のURLセットを組み立てる
+    戻り値: {'src', 'thumbnail', 'widths', 'srcset': {'webp': '... 320w, ...', 'jpg': ...}}
+    """
+    widths = sorted(int(width) for width in (derivatives or {}).get('widths', []))
+    formats = list((derivatives or {}).get('formats', []))
+    if not widths or not formats:
+        return {'src': url}
+    base = url.rsplit('.', 1)[0]
+    thumbnail_format = 'webp' if 'webp' in formats else formats[0]
+    return {
+        'src': url,
+        'thumbnail': f"{base}.w{widths[0]}.{thumbnail_format}",
+        'widths': widths,
+        'srcset': {
+            extension: ', '.join(f"{base}.w{width}.{extension} {width}w" for width in widths)
+            for extension in formats
+        }
+    }
+
+def attach_photo_srcsets(report):
+    """レポートの photo_derivatives を photo_srcsets（オリジナルURL → URLセット）に置き換える"""
+    derivatives = report.pop('photo_derivatives', None) or {}
+    report['photo_srcsets'] = {url: build_image_srcsets(url, value) for url, value in derivatives.items()}
+    return report
+
+def handle_s3_image_event(event):
+    """
+    S3イベント通知（ObjectCreated）でアップロードされた画像の派生ファイルを生成
+    - before/・after/ 配下: report-images の derivatives を更新する
+      メタデータ登録（アップロード・セッション完了）前の場合はエラーにしてS3イベントの再試行に任せる
+    - photos/ 配下（レポート写真）: photo-blobs と参照元レポートの photo_derivatives を更新する
+    """
+    processed = 0
+    for record in event.get('Records', []):
+        s3_key = unquote_plus(record.get('s3', {}).get('object', {}).get('key', ''))
+        if is_derivative_s3_key(s3_key):
+            continue
+        if s3_key.startswith(PHOTO_BLOB_PREFIX):
+            if handle_photo_blob_created(s3_key):
+                processed += 1
+            continue
+        if not s3_key.startswith(('before/', 'after/')):
+            continue
+        image_data = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=s3_key)['Body'].read()
+        derivatives = generate_image_derivatives(image_data, s3_key)
+        if not derivatives:
+            continue
+        image_id = s3_key.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        REPORT_IMAGES_TABLE.update_item(
+            Key={'image_id': image_id},
+            UpdateExpression='SET derivatives = :d',
+            ConditionExpression='attribute_exists(image_id)',
+            ExpressionAttributeValues={':d': derivatives}
+        )
+        processed += 1
+    return {'processed': processed}
+
+# ==================== 写真のコンテンツアドレス保存 ====================
+# レポート写真は内容のSHA-256をキーに photos/{hash先頭2文字}/{hash}.jpg として1回だけ保存する
+# - photo-blobs テーブル（パーティションキー content_hash）の used_in_reports（文字列セット）で参照元レポートを管理
+#   ADD/DELETE はべき等なので、同じレポートを何度保存しても参照数は変わらない
+# - 既にアップロード済み（uploaded=true）の写真は再アップロードしない（別レポートへの添付・レポートの再保存）
+# - 参照がなくなった時刻を unreferenced_at に記録し（再参照時は削除）、scripts/gc_photo_blobs.py で猶予期間後に削除する
+# - photo-blobs テーブルが使えない場合は参照管理なしでアップロードする（同じキーへの上書きなので内容は変わらない）
+PHOTO_BLOB_PREFIX = 'photos/'
+_PHOTO_BLOB_KEY_PATTERN = re.compile(r'photos/[0-9a-f]{2}/([0-9a-f]{64})\.jpg$')
+
+def photo_blob_s3_key(content_hash):
+    return f"{PHOTO_BLOB_PREFIX}{content_hash[:2]}/{content_hash}.jpg"
+
+def photo_blob_hash_from_url(url):
+    """コンテンツアドレスの写真URLからハッシュを取り出す（それ以外のURLはNone）"""
+    if not isinstance(url, str):
+        return None
+    match = _PHOTO_BLOB_KEY_PATTERN.search(url)
+    return match.group(1) if match else None
+
+def register_photo_blob(content_hash, report_id):
+    """
+    写真の参照元にレポートを追加し、更新前のアイテムを返す（新規の場合は空）
+    uploaded が true なら既にS3に保存済み
+    """
+    response = PHOTO_BLOBS_TABLE.update_item(
+        Key={'content_hash': content_hash},
+        UpdateExpression='ADD used_in_reports :r SET s3_key = if_not_exists(s3_key, :k), created_at = if_not_exists(created_at, :now) REMOVE unreferenced_at',
+        ExpressionAttributeValues={
+            ':r': {report_id},
+            ':k': photo_blob_s3_key(content_hash),
+            ':now': datetime.utcnow().isoformat() + 'Z'
+        },
+        ReturnValues='ALL_OLD'
+    )
+    return response.get('Attributes') or {}
+
+def mark_photo_blob_uploaded(content_hash, size):
+    PHOTO_BLOBS_TABLE.update_item(
+        Key={'content_hash': content_hash},
+        UpdateExpression='SET uploaded = :t, size = :s',
+        ExpressionAttributeValues={':t': True, ':s': size}
+    )
+
+def handle_photo_blob_created(s3_key):
+    """
+    S3イベントで保存された写真の派生ファイルを生成し、photo-blobs と参照元レポートに記録する
+    - 派生ファイルが記録済みの場合は再生成せず、レポートへの反映だけを行う（再試行時）
+    - 参照元レポートがまだ保存されていない場合はエラーにしてS3イベントの再試行に任せる
+    戻り値: 派生ファイルを記録した場合True
+    """
+    match = _PHOTO_BLOB_KEY_PATTERN.fullmatch(s3_key)
+    if not match:
+        return False
+    content_hash = match.group(1)
+    blob = PHOTO_BLOBS_TABLE.get_item(Key={'content_hash': content_hash}).get('Item')
+    if not blob:
+        # photo-blobs で管理されていない写真（テーブルが使えなかった場合）は参照元がないため記録しない
+        print(f"Warning: Photo blob {content_hash[:16]}... is not registered, skipped derivatives")
+        return False
+    derivatives = blob.get('derivatives')
+    if not derivatives:
+        image_data = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=s3_key)['Body'].read()
+        derivatives = generate_image_derivatives(image_data, s3_key)
+        if not derivatives:
+            return False
+        PHOTO_BLOBS_TABLE.update_item(
+            Key={'content_hash': content_hash},
+            UpdateExpression='SET derivatives = :d',
+            ExpressionAttributeValues={':d': derivatives}
+        )
+    pending_reports = []
+    for report_id in blob.get('used_in_reports') or []:
+        report = get_report_by_id(report_id)
+        if not report:
+            pending_reports.append(report_id)
+            continue
+        # レポートが実際に参照しているURLに記録する（参照していなければ保存時の同期で参照元から外れる）
+        urls = sorted(url for url, url_hash in photo_blob_urls_in_report(report).items() if url_hash == content_hash)
+        if not urls:
+            continue
+        try:
+            REPORTS_TABLE.update_item(
+                Key=get_report_key(report),
+                UpdateExpression='SET ' + ', '.join(f'photo_derivatives.#u{i} = :d' for i in range(len(urls))),
+                ConditionExpression='attribute_exists(photo_derivatives)',
+                ExpressionAttributeNames={f'#u{i}': url for i, url in enumerate(urls)},
+                ExpressionAttributeValues={':d': derivatives}
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            print(f"Warning: Report {report_id} has no photo_derivatives, skipped {content_hash[:16]}...")
+    if pending_reports:
+        raise RuntimeError(f"Reports not saved yet for photo {content_hash[:16]}...: {', '.join(pending_reports)}")
+    return True
+
+def photo_blob_urls_in_report(report):
+    """レポート（work_items・画像セクション）が参照しているコンテンツアドレスの写真（URL -> ハッシュ）"""
+    urls = {}
+    photo_lists = [(item.get('photos') or {}) for item in report.get('work_items') or []]
+    photo_lists += [(section.get('photos') or {}) for section in report.get('sections') or [] if section.get('section_type') == 'image']
+    for photos in photo_lists:
+        for url in list(photos.get('before') or []) + list(photos.get('after') or []):
+            content_hash = photo_blob_hash_from_url(url)
+            if content_hash:
+                urls[url] = content_hash
+    return urls
+
+def photo_blob_hashes_in_report(report):
+    """レポート（work_items・画像セクション）が参照しているコンテンツアドレスの写真ハッシュ"""
+    return set(photo_blob_urls_in_report(report).values())
+
+def fill_report_photo_derivatives(report):
+    """
+    保存したレポートで photo_derivatives が未記録の写真に、photo-blobs の生成結果を反映する
+    レポートの保存（put_item）は読み込み時点の photo_derivatives で上書きするため、その間にS3イベントが
+    記録した分が消えることがある。保存後に photo-blobs を読み直し、不足しているURLのキーだけを SET する
+    （この読み込みより後に生成された分は、S3イベントが保存後のレポートに記録する）
+    """
+    recorded = report.get('photo_derivatives') or {}
+    missing = {url: content_hash for url, content_hash in photo_blob_urls_in_report(report).items() if url not in recorded}
+    if not missing:
+        return
+    try:
+        blobs = batch_get_items(PHOTO_BLOBS_TABLE, 'content_hash', list(set(missing.values())))
+        set_parts = []
+        names = {}
+        values = {}
+        for i, (url, content_hash) in enumerate(sorted(missing.items())):
+            derivatives = (blobs.get(content_hash) or {}).get('derivatives')
+            if derivatives:
+                names[f'#u{i}'] = url
+                values[f':d{i}'] = derivatives
+                set_parts.append(f'photo_derivatives.#u{i} = :d{i}')
+        if set_parts:
+            REPORTS_TABLE.update_item(
+                Key=get_report_key(report),
+                UpdateExpression='SET ' + ', '.join(set_parts),
+                ConditionExpression='attribute_exists(photo_derivatives)',
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+    except Exception as e:
+        print(f"Warning: Could not fill photo derivatives for report {report.get('report_id')}: {str(e)}")
+
+def sync_photo_blob_references(report_id, old_report, new_report, registered_hashes=()):
+    """
+    レポート保存・削除時に写真の参照元を同期する
+    - 新たに参照した写真（別レポートからのURLコピー等）に report_id を追加
+    - 参照しなくなった写真から report_id を削除し、参照元が空になったら unreferenced_at を記録
+    registered_hashes: アップロード時に登録済みのハッシュ（再登録しない。レポートに残らなかったものは削除）
+    """
+    old_hashes = photo_blob_hashes_in_report(old_report or {})
+    new_hashes = photo_blob_hashes_in_report(new_report or {})
+    for content_hash in new_hashes - old_hashes - set(registered_hashes):
+        try:
+            register_photo_blob(content_hash, report_id)
+        except Exception as e:
+            print(f"Warning: Could not add photo reference {content_hash[:16]}...: {str(e)}")
+    # アップロード失敗等でレポートに残らなかった写真の登録も外す
+    for content_hash in (old_hashes | set(registered_hashes)) - new_hashes:
+        try:
+            PHOTO_BLOBS_TABLE.update_item(
+                Key={'content_hash': content_hash},
+                UpdateExpression='DELETE used_in_reports :r',
+                ExpressionAttributeValues={':r': {report_id}}
+            )
+            mark_photo_blob_unreferenced(content_hash)
+        except Exception as e:
+            print(f"Warning: Could not remove photo reference {content_hash[:16]}...: {str(e)}")
+
+def mark_photo_blob_unreferenced(content_hash):
+    """参照元が空になった写真に unreferenced_at を記録（GCの猶予期間の起点。参照が残っている場合は何もしない）"""
+    try:
+        PHOTO_BLOBS_TABLE.update_item(
+            Key={'content_hash': content_hash},
+            UpdateExpression='SET unreferenced_at = if_not_exists(unreferenced_at, :now)',
+            ConditionExpression='attribute_exists(content_hash) AND attribute_not_exists(used_in_reports)',
+            ExpressionAttributeValues={':now': datetime.utcnow().isoformat() + 'Z'}
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+
+# ==================== 写真の並列アップロード ====================
+# レポート保存時のBase64写真を一括でS3にアップロードする
+# - 写真リストを先に走査してアップロード対象を集め（stage_*）、スレッドプールで並列にPutObjectしてから、
+#   元の並び順のままURLに置き換える（resolve_*）
+# - 失敗した写真はリストから除外し、{s3_key, error} としてレスポンスで返す
+# - S3クライアントのコネクションプール（デフォルト10）を超えないよう同時実行数を制限する
+PHOTO_UPLOAD_MAX_WORKERS = int(os.environ.get('PHOTO_UPLOAD_MAX_WORKERS', '8'))
+
+def upload_photos_concurrently(photos, report_id=None, max_workers=None):
+    """
+    Base64画像のリストを並列にコンテンツアドレスで保存
+    report_id を指定した場合は photo-blobs に参照を登録し、保存済みの写真はアップロードしない
+    派生ファイルはS3イベントで生成する（保存済みの写真は生成済みの derivatives を返す）
+    戻り値: 入力と同じ順序の [{'s3_key', 'url', 'error', 'derivatives', 'content_hash', 'reused'}]
+    """
+    def _upload(base64_image):
+        try:
+            image_data = decode_base64_image(base64_image)
+            content_hash = hashlib.sha256(image_data).hexdigest()
+        except Exception as e:
+            return {'s3_key': None, 'url': None, 'error': str(e), 'derivatives': None, 'content_hash': None, 'reused': False}
+        s3_key = photo_blob_s3_key(content_hash)
+        result = {'s3_key': s3_key, 'url': None, 'error': None, 'derivatives': None, 'content_hash': content_hash, 'reused': False}
+        existing = {}
+        if report_id:
+            try:
+                existing = register_photo_blob(content_hash, report_id)
+            except Exception as e:
+                print(f"Warning: Could not register photo blob {content_hash[:16]}...: {str(e)}")
+        if existing.get('uploaded'):
+            result.update(url=convert_to_s3_url(s3_key), derivatives=existing.get('derivatives'), reused=True)
+            return result
+        try:
+            result['url'] = put_photo_to_s3(image_data, s3_key)
+        except Exception as e:
+            result['error'] = str(e)
+            return result
+        if report_id:
+            try:
+                mark_photo_blob_uploaded(content_hash, len(image_data))
+            except Exception as e:
+                print(f"Warning: Could not mark photo blob uploaded {content_hash[:16]}...: {str(e)}")
+        return result
+
+    if not photos:
+        return []
+    workers = min(max_workers or PHOTO_UPLOAD_MAX_WORKERS, len(photos))
+    if workers <= 1:
+        return [_upload(photo) for photo in photos]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_upload, photos))
+
+def stage_photo_list(photos, uploads):
+    """
+    写真リスト（URL・相対パス・Base64の混在）からアップロード対象を集める
+    Base64画像は uploads に追加してそのインデックスを、それ以外は完全URLに変換して並び順どおりに返す
+    """
+    staged = []
+    for photo_data in photos:
+        if not photo_data or not isinstance(photo_data, str):
+            continue
+        if photo_data.startswith('data:image'):
+            uploads.append(photo_data)
+            staged.append(len(uploads) - 1)
+        else:
+            staged.append(convert_to_s3_url(photo_data))
+    return staged
+
+def stage_work_item_photos(work_items, uploads):
+    """work_items の写真を集める（戻り値: item_id -> {'before': [...], 'after': [...]}）"""
+    photo_urls = {}
+    for item in work_items:
+        photos = item.get('photos') or {}
+        photo_urls[item['item_id']] = {
+            'before': stage_photo_list(photos.get('before', []), uploads),
+            'after': stage_photo_list(photos.get('after', []), uploads)
+        }
+    return photo_urls
+
+def stage_section_photos(sections, uploads):
+    """画像セクションの写真を集める（画像以外のセクションはそのまま返す）"""
+    processed_sections = []
+    for section in sections:
+        if section.get('section_type') != 'image':
+            # コメントや作業内容セクションはそのまま追加
+            processed_sections.append(section)
+            continue
+        photos = section.get('photos') or {}
+        processed_sections.append({
+            'section_id': section.get('section_id', str(uuid.uuid4())),
+            'section_type': 'image',
+            'image_type': section.get('image_type', 'work'),
+            'photos': {
+                'before': stage_photo_list(photos.get('before', []), uploads),
+                'after': stage_photo_list(photos.get('after', []), uploads)
+            }
+        })
+    return processed_sections
+
+def resolve_photo_list(staged, results):
+    """アップロード結果でインデックスをURLに置き換える（失敗した写真は除外）"""
+    resolved = []
+    for photo in staged:
+        if isinstance(photo, int):
+            if results[photo]['url']:
+                resolved.append(results[photo]['url'])
+        else:
+            resolved.append(photo)
+    return resolved
+
+def upload_report_photos(report_id, work_items, sections):
+    """
+    レポートの work_items・sections のBase64写真を並列にアップロード
+    戻り値: (photo_urls, processed_sections, photo_upload_errors, photo_derivatives, registered_hashes)
+    photo_derivatives: 保存済みの写真のURL → 派生ファイルの生成結果（新規アップロード分はS3イベントで反映）
+    registered_hashes: photo-blobs に参照を登録した写真のハッシュ
+    """
+    uploads = []
+    photo_urls = stage_work_item_photos(work_items, uploads)
+    processed_sections = stage_section_photos(sections, uploads)
+    
+    results = upload_photos_concurrently(uploads, report_id)
+    photo_upload_errors = [
+        {'s3_key': result['s3_key'], 'error': result['error']}
+        for result in results if result['error']
+    ]
+    for error in photo_upload_errors:
+        print(f"Error uploading photo {error['s3_key']}: {error['error']}")
+    reused = sum(1 for result in results if result['reused'])
+    if reused:
+        print(f"[upload_report_photos] {reused}/{len(results)} photos already stored, skipped upload")
+    photo_derivatives = {result['url']: result['derivatives'] for result in results if result.get('derivatives')}
+    registered_hashes = {result['content_hash'] for result in results if result['content_hash']}
+    
+    for photos in photo_urls.values():
+        photos['before'] = resolve_photo_list(photos['before'], results)
+        photos['after'] = resolve_photo_list(photos['after'], results)
+    for section in processed_sections:
+        if section.get('section_type') == 'image':
+            section['photos']['before'] = resolve_photo_list(section['photos']['before'], results)
+            section['photos']['after'] = resolve_photo_list(section['photos']['after'], results)
+    return photo_urls, processed_sections, photo_upload_errors, photo_derivatives, registered_hashes
+
+def claim_report_image_hash(image_hash, metadata):
+    """
+    画像ハッシュを条件付き書き込みで確保する（重複チェックと確保を1回の書き込みで行う）
+    確保した時点ではアップロード前のため pending=True とし、アップロード後に mark_report_image_hash_uploaded で外す
+    
+    Returns:
+        (bool, dict | None): (確保できたか, アップロード済みの同じハッシュの画像のメタデータ)
+        他のリクエストが確保中（pending）の場合は (False, None) を返し、呼び出し側は重複扱いせずにアップロードする
+    """
+    claim = {
+        'image_hash': image_hash,
+        'image_id': metadata['image_id'],
+        'url': metadata['url'],
+        's3_key': metadata['s3_key'],
+        'category': metadata['category'],
+        'cleaning_date': metadata['cleaning_date'],
+        'uploaded_at': metadata['uploaded_at'],
+        'pending': True
+    }
+    if metadata.get('folder_name'):
+        claim['folder_name'] = metadata['folder_name']
+    try:
+        REPORT_IMAGE_HASHES_TABLE.put_item(
+            Item=claim,
+            ConditionExpression='attribute_not_exists(image_hash)'
+        )
+        return True, None
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+    existing = REPORT_IMAGE_HASHES_TABLE.get_item(Key={'image_hash': image_hash}, ConsistentRead=True).get('Item')
+    if not existing or existing.get('pending'):
+        # URLの画像がまだ存在しない（アップロード中・失敗して解放される可能性がある）
+        return False, None
+    return False, existing
+
+def mark_report_image_hash_uploaded(image_hash, image_id):
+    """確保したハッシュの画像がアップロード・登録済みになったことを記録（以後の重複チェックで返す）"""
+    try:
+        REPORT_IMAGE_HASHES_TABLE.update_item(
+            Key={'image_hash': image_hash},
+            UpdateExpression='REMOVE pending',
+            ConditionExpression=Attr('image_id').eq(image_id)
+        )
+    except Exception as e:
+        print(f"Warning: Could not mark image hash uploaded {image_hash[:16]}...: {str(e)}")
+
+def release_report_image_hash(image_hash, image_id):
+    """アップロード失敗時に確保したハッシュを解放する"""
+    try:
+        REPORT_IMAGE_HASHES_TABLE.delete_item(
+            Key={'image_hash': image_hash},
+            ConditionExpression=Attr('image_id').eq(image_id)
+        )
+    except Exception as e:
+        print(f"Warning: Could not release image hash {image_hash[:16]}...: {str(e)}")
+
+def build_report_image_s3_key(category, cleaning_date, image_id, folder_name=None, extension='jpg'):
+    """
+    レポート用画像のS3キーを生成（日付単位、フォルダ名がある場合は含める）
+    before/2025/12/04/abc12345.jpg または before/2025/12/04/フォルダ名/abc12345.jpg
+    """
+    year, month, day = cleaning_date.split('-')[:3]
+    if folder_name:
+        # フォルダ名を安全な文字列に変換（スラッシュやスペースをアンダースコアに）
+        safe_folder_name = folder_name.replace('/', '_').replace(' ', '_')
+        return f"{category}/{year}/{month}/{day}/{safe_folder_name}/{image_id}.{extension}"
+    return f"{category}/{year}/{month}/{day}/{image_id}.{extension}"
+
+def build_report_image_metadata(image_id, s3_key, category, cleaning_date, staff_id=None, folder_name=None, image_hash=None):
+    """report-images に保存するメタデータを生成"""
+    metadata = {
+        'image_id': image_id,
+        'url': f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{s3_key}",
+        's3_key': s3_key,
+        'category': category,
+        'cleaning_date': cleaning_date,
+        'staff_id': staff_id or 'unknown',
+        'uploaded_at': datetime.now(timezone(timedelta(hours=9))).isoformat(),
+        'used_in_reports': []  # このカラムに使用されたレポートIDを追加
+    }
+    if image_hash:
+        metadata['image_hash'] = image_hash
+    # フォルダ名がある場合はメタデータに追加
+    if folder_name:
+        metadata['folder_name'] = folder_name
+    metadata['catalog_key'] = build_report_image_catalog_key(category, folder_name, metadata['uploaded_at'])
+    return metadata
+
+def report_image_result(image, duplicate=False):
+    """画像メタデータ（またはハッシュ確保アイテム）からAPIの返却値を生成"""
+    result = {
+        'image_id': image.get('image_id'),
+        'url': image.get('url'),
+        'category': image.get('category'),
+        'date': image.get('cleaning_date')
+    }
+    if image.get('folder_name'):
+        result['folder_name'] = image['folder_name']
+    if image.get('derivatives'):
+        result['srcset'] = build_image_srcsets(image.get('url'), image['derivatives'])
+    if duplicate:
+        result['duplicate'] = True
+    return result
+
+def upload_report_photo_with_metadata(base64_image, category, cleaning_date, staff_id=None, folder_name=None, image_hash=None):
+    """
+    レポート用画像を日付単位でS3に保存し、メタデータをDynamoDBに保存
+    
+    Args:
+        base64_image: Base64エンコードされた画像
+        category: 'before' または 'after'
         cleaning_date: 清掃日 (YYYY-MM-DD形式)
         staff_id: 清掃員ID（オプション）
         folder_name: フォルダ名（オプション）
@@ -2211,6 +3507,7 @@ def upload_report_photo_with_metadata(base64_image, category, cleaning_date, sta
     
     Returns:
         dict: { image_id, url, category, date, folder_name }
+        同じハッシュの画像が既にある場合は既存画像の情報に duplicate: True を付けて返す
     """
     try:
         # 画像データをデコード
@@ -2222,94 +3519,86 @@ def upload_report_photo_with_metadata(base64_image, category, cleaning_date, sta
         if not image_hash:
             image_hash = hashlib.sha256(image_data).hexdigest()
         
-        # 重複チェック：同じハッシュ値の画像が既に存在するか確認
-        report_images_table = dynamodb.Table('report-images')
-        try:
-            response = report_images_table.scan(
-                FilterExpression=Attr('image_hash').eq(image_hash)
-            )
-            existing_images = response.get('Items', [])
-            
-            if existing_images:
-                # 既存の画像が見つかった場合、エラーを返す
-                existing_image = existing_images[0]
-                raise ValueError(f'この画像は既にアップロードされています（画像ID: {existing_image.get("image_id", "unknown")}）')
-        except Exception as e:
-            # 重複エラーの場合はそのまま再スロー
-            if '既にアップロードされています' in str(e):
-                raise
-            # その他のエラー（テーブルが存在しない、属性がないなど）は無視して続行
-            print(f"Warning: Could not check for duplicates: {str(e)}")
-        
         # 画像IDを生成（ユニークなUUID）
         image_id = str(uuid.uuid4())[:8]
+        s3_key = build_report_image_s3_key(category, cleaning_date, image_id, folder_name)
+        metadata = build_report_image_metadata(image_id, s3_key, category, cleaning_date, staff_id, folder_name, image_hash)
         
-        # 日付をパース
-        date_parts = cleaning_date.split('-')
-        year = date_parts[0]
-        month = date_parts[1]
-        day = date_parts[2]
-        
-        # S3キーを生成（フォルダ名がある場合は含める）
-        # before/2025/12/04/abc12345.jpg または
-        # before/2025/12/04/フォルダ名/abc12345.jpg
-        if folder_name:
-            # フォルダ名を安全な文字列に変換（スラッシュやスペースをアンダースコアに）
-            safe_folder_name = folder_name.replace('/', '_').replace(' ', '_')
-            s3_key = f"{category}/{year}/{month}/{day}/{safe_folder_name}/{image_id}.jpg"
-        else:
-            s3_key = f"{category}/{year}/{month}/{day}/{image_id}.jpg"
-        
-        # S3にアップロード
-        s3_client.put_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=s3_key,
-            Body=image_data,
-            ContentType='image/jpeg'
-        )
-        
-        # 公開URLを生成
-        photo_url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{s3_key}"
-        
-        # メタデータをDynamoDBに保存
-        metadata = {
-            'image_id': image_id,
-            'url': photo_url,
-            's3_key': s3_key,
-            'category': category,
-            'cleaning_date': cleaning_date,
-            'staff_id': staff_id or 'unknown',
-            'uploaded_at': datetime.now(timezone(timedelta(hours=9))).isoformat(),
-            'used_in_reports': [],  # このカラムに使用されたレポートIDを追加
-            'image_hash': image_hash  # ハッシュ値を保存
-        }
-        
-        # フォルダ名がある場合はメタデータに追加
-        if folder_name:
-            metadata['folder_name'] = folder_name
+        # 重複チェック：ハッシュを条件付き書き込みで確保（既にあれば既存画像を返す）
+        hash_claimed = False
+        try:
+            hash_claimed, existing_image = claim_report_image_hash(image_hash, metadata)
+            if existing_image:
+                print(f"[upload_report_photo] Duplicate of {existing_image.get('image_id', 'unknown')} (hash: {image_hash[:16]}...)")
+                return report_image_result(existing_image, duplicate=True)
+        except Exception as e:
+            # ハッシュテーブルが存在しない場合などは重複チェックなしで続行
+            print(f"Warning: Could not check for duplicates: {str(e)}")
         
-        report_images_table.put_item(Item=metadata)
+        try:
+            # S3にアップロード（サムネイル・WebPはS3イベントで生成）
+            put_photo_to_s3(image_data, s3_key)
+            
+            # メタデータをDynamoDBに保存
+            REPORT_IMAGES_TABLE.put_item(Item=metadata)
+        except Exception:
+            if hash_claimed:
+                release_report_image_hash(image_hash, image_id)
+            raise
+        if hash_claimed:
+            mark_report_image_hash_uploaded(image_hash, image_id)
         
         print(f"[upload_report_photo] Saved: {s3_key} (hash: {image_hash[:16]}...)")
-        
-        result = {
-            'image_id': image_id,
-            'url': photo_url,
-            'category': category,
-            'date': cleaning_date
-        }
-        
-        if folder_name:
-            result['folder_name'] = folder_name
-        
-        return result
-    except ValueError as e:
-        # 重複エラーはそのまま再スロー
-        raise
+        return report_image_result(metadata)
     except Exception as e:
         print(f"Error uploading report photo: {str(e)}")
         raise
 
+# 画像カタログ（report-images の cleaning_date-catalog_key-index）
+# - パーティションキー: cleaning_date、ソートキー: catalog_key = "{category}#{folder_name}#{uploaded_at}"
+# - 日付・日付+カテゴリ・日付+カテゴリ+フォルダの絞り込みが1回のクエリ（begins_with）で済み、フォルダ内はアップロード順に並ぶ
+# - インデックス未作成の場合はスキャンにフォールバック
+REPORT_IMAGE_CATALOG_INDEX = 'cleaning_date-catalog_key-index'
+
+def _escape_catalog_component(value):
+    # 区切り文字 # を含むフォルダ名で前方一致が誤マッチしないようにエスケープ
+    return (value or '').replace('%', '%25').replace('#', '%23')
+
+def build_report_image_catalog_prefix(category=None, folder_name=None):
+    """catalog_key の前方一致条件（category 未指定時は None）"""
+    if not category:
+        return None
+    if folder_name:
+        return f"{category}#{_escape_catalog_component(folder_name)}#"
+    return f"{category}#"
+
+def build_report_image_catalog_key(category, folder_name, uploaded_at):
+    """画像メタデータの catalog_key を生成"""
+    return f"{category}#{_escape_catalog_component(folder_name)}#{uploaded_at}"
+
+def plan_report_image_catalog_query(cleaning_date, category=None, folder_name=None):
+    """日付・カテゴリ・フォルダでの画像検索の実行計画を作成"""
+    equals = {'cleaning_date': cleaning_date, 'category': category, 'folder_name': folder_name}
+    if not has_table_index('report-images', REPORT_IMAGE_CATALOG_INDEX):
+        return plan_list_query('report-images', equals)
+    
+    key_condition = Key('cleaning_date').eq(cleaning_date)
+    prefix = build_report_image_catalog_prefix(category, folder_name)
+    if prefix:
+        key_condition = key_condition & Key('catalog_key').begins_with(prefix)
+    # カテゴリなしでフォルダのみ指定された場合はフィルタで絞り込む
+    filter_expr = Attr('folder_name').eq(folder_name) if folder_name and not category else None
+    return {
+        'table': 'report-images',
+        'operation': 'query',
+        'index': REPORT_IMAGE_CATALOG_INDEX,
+        'key_condition': key_condition,
+        'filter': filter_expr,
+        'equals': {k: v for k, v in equals.items() if v},
+        'ranges': {},
+        'description': f"query:{REPORT_IMAGE_CATALOG_INDEX}"
+    }
+
 def get_report_images_by_date(cleaning_date, category=None, folder_name=None):
     """
     日付で画像を取得
@@ -2323,20 +3612,8 @@ def get_report_images_by_date(cleaning_date, category=None, folder_name=None):
         list: 画像メタデータのリスト
     """
     try:
-        report_images_table = dynamodb.Table('report-images')
-        
-        # フィルタ式を構築
-        filter_expr = Attr('cleaning_date').eq(cleaning_date)
-        
-        if category:
-            filter_expr = filter_expr & Attr('category').eq(category)
-        
-        if folder_name:
-            filter_expr = filter_expr & Attr('folder_name').eq(folder_name)
-        
-        response = report_images_table.scan(FilterExpression=filter_expr)
-        
-        images = response.get('Items', [])
+        plan = plan_report_image_catalog_query(cleaning_date, category, folder_name)
+        images, _ = execute_list_plan(REPORT_IMAGES_TABLE, plan, descending=True)
         
         # uploaded_atでソート（新しい順）
         images.sort(key=lambda x: x.get('uploaded_at', ''), reverse=True)
@@ -2346,6 +3623,341 @@ def get_report_images_by_date(cleaning_date, category=None, folder_name=None):
         print(f"Error getting report images: {str(e)}")
         return []
 
+# ==================== 画像の直接アップロード（アップロードセッション） ====================
+# 画像本体をLambdaを経由させず、クライアントから署名付きPOSTでS3に直接アップロードする
+# 1. POST /staff/report-images/upload-sessions
+#    ファイルごとに report-images と同じ "{category}/YYYY/MM/DD/[フォルダ/]{image_id}.jpg" のキーで署名付きPOSTを発行
+#    image_hash が既に登録済みのファイルはアップロード不要として既存画像を返す
+# 2. クライアントが各URLに multipart/form-data でPOST（サイズ上限・Content-Typeはポリシーで制限）
+# 3. POST /staff/report-images/upload-sessions/complete
+#    アップロード済みのオブジェクトを確認し、ハッシュを確保してメタデータをまとめて書き込む
+# セッションはDynamoDBに保存せず、署名付きトークン（session_token）で受け渡す
+# S3キーはトークンに含めず、完了時にセッションの category/日付/フォルダ/image_id から再生成する
+# image_hash（画像のSHA-256）は署名付きPOSTの x-amz-checksum-sha256 でS3に検証させ、
+# 完了時にオブジェクトのチェックサムと一致した場合のみハッシュを確保する
+UPLOAD_SESSION_SECRET = os.environ.get('UPLOAD_SESSION_SECRET', '')
+UPLOAD_SESSION_EXPIRES = int(os.environ.get('UPLOAD_SESSION_EXPIRES', '900'))
+UPLOAD_SESSION_MAX_FILES = int(os.environ.get('UPLOAD_SESSION_MAX_FILES', '50'))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(15 * 1024 * 1024)))
+UPLOAD_CONTENT_TYPES = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp'}
+
+IMAGE_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+UPLOAD_IMAGE_ID_PATTERN = re.compile(r'^[0-9a-f]{8}$')
+
+def _sign_upload_session(payload):
+    if not UPLOAD_SESSION_SECRET:
+        # 秘密鍵が未設定のままではセッションを偽造できるため、未設定の場合は失敗させる
+        raise RuntimeError('UPLOAD_SESSION_SECRET is not configured')
+    return hmac.new(UPLOAD_SESSION_SECRET.encode('utf-8'), payload, hashlib.sha256).digest()[:16]
+
+def encode_upload_session(session):
+    payload = json.dumps(session, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    signature = _sign_upload_session(payload)
+    return (base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=') + '.' +
+            base64.urlsafe_b64encode(signature).decode('ascii').rstrip('='))
+
+def decode_upload_session(token):
+    """セッショントークンを検証して内容を返す（不正・期限切れの場合は ValueError）"""
+    try:
+        payload_part, signature_part = token.split('.', 1)
+        payload = _b64url_decode(payload_part)
+        signature = _b64url_decode(signature_part)
+    except Exception:
+        raise ValueError('Invalid session token')
+    if not hmac.compare_digest(signature, _sign_upload_session(payload)):
+        raise ValueError('Invalid session token')
+    session = json.loads(payload.decode('utf-8'))
+    if session.get('exp', 0) < time.time():
+        raise ValueError('Session expired')
+    return session
+
+def find_report_image_by_hash(image_hash):
+    """
+    アップロード済みの画像ハッシュを検索（テーブル未作成などのエラー時はNone）
+    他のリクエストが確保中（pending）のハッシュは、画像がまだ存在しない・解放される可能性があるため重複として返さない
+    """
+    try:
+        existing = REPORT_IMAGE_HASHES_TABLE.get_item(Key={'image_hash': image_hash}, ConsistentRead=True).get('Item')
+        return None if not existing or existing.get('pending') else existing
+    except Exception as e:
+        print(f"Warning: Could not look up image hash: {str(e)}")
+        return None
+
+def _get_authenticated_staff(event):
+    auth_header = event.get('headers', {}).get('Authorization') or event.get('headers', {}).get('authorization', '')
+    id_token = auth_header.replace('Bearer ', '') if auth_header else ''
+    user_info = verify_firebase_token(id_token)
+    if not user_info or not user_info.get('verified'):
+        return None
+    return user_info
+
+def create_report_image_upload_session(event, headers):
+    """
+    レポート用画像のアップロードセッションを作成（署名付きPOSTを発行）
+    
+    Request Body:
+        - category: 'before' または 'after'
+        - cleaning_date: 清掃日 (YYYY-MM-DD形式、省略時は今日)
+        - folder_name: フォルダ名（オプション）
+        - files: [{ image_hash（オプション、画像のSHA-256の16進文字列）, content_type（デフォルト image/jpeg） }]
+    
+    image_hash を指定したファイルは、署名付きPOSTのフィールド（x-amz-checksum-*）をそのまま送信すること
+    （S3が内容のSHA-256を検証し、一致しない場合はアップロードを拒否する）
+    """
+    try:
+        user_info = _get_authenticated_staff(event)
+        if not user_info:
+            return {
+                'statusCode': 401,
+                'headers': headers,
+                'body': json.dumps({'error': 'Unauthorized'}, ensure_ascii=False)
+            }
+        
+        body = json.loads(event.get('body') or '{}')
+        category = body.get('category')
+        cleaning_date = body.get('cleaning_date') or datetime.now(timezone(timedelta(hours=9))).strftime('%Y-%m-%d')
+        folder_name = (body.get('folder_name') or '').strip() or None
+        files = body.get('files') or []
+        
+        # バリデーション
+        error = None
+        if category not in ['before', 'after']:
+            error = 'categoryは"before"または"after"を指定してください'
+        elif folder_name and len(folder_name) > 50:
+            error = 'フォルダ名は50文字以内で指定してください'
+        elif not files or len(files) > UPLOAD_SESSION_MAX_FILES:
+            error = f'filesには1〜{UPLOAD_SESSION_MAX_FILES}件を指定してください'
+        else:
+            try:
+                datetime.strptime(cleaning_date, '%Y-%m-%d')
+            except ValueError:
+                error = 'cleaning_dateはYYYY-MM-DD形式で指定してください'
+        if not error:
+            for file_info in files:
+                if file_info.get('content_type', 'image/jpeg') not in UPLOAD_CONTENT_TYPES:
+                    error = f"content_typeは {', '.join(UPLOAD_CONTENT_TYPES)} のいずれかを指定してください"
+                    break
+                if file_info.get('image_hash') and not IMAGE_HASH_PATTERN.match(str(file_info['image_hash'])):
+                    error = 'image_hashはSHA-256の16進文字列（小文字64桁）で指定してください'
+                    break
+        if error:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': error}, ensure_ascii=False)
+            }
+        
+        staff_id = body.get('staff_id') or user_info.get('uid') or 'unknown'
+        session_files = []
+        response_files = []
+        for index, file_info in enumerate(files):
+            image_hash = file_info.get('image_hash')
+            existing_image = find_report_image_by_hash(image_hash) if image_hash else None
+            if existing_image:
+                # 同じ画像が登録済み: アップロード不要
+                response_files.append({'index': index, 'image': report_image_result(existing_image, duplicate=True)})
+                continue
+            
+            content_type = file_info.get('content_type', 'image/jpeg')
+            image_id = str(uuid.uuid4())[:8]
+            s3_key = build_report_image_s3_key(category, cleaning_date, image_id, folder_name, UPLOAD_CONTENT_TYPES[content_type])
+            fields = {'Content-Type': content_type}
+            if image_hash:
+                # S3にSHA-256を検証させる（ハッシュと異なる内容はアップロードできない）
+                fields['x-amz-checksum-algorithm'] = 'SHA256'
+                fields['x-amz-checksum-sha256'] = image_hash_checksum(image_hash)
+            upload = s3_client.generate_presigned_post(
+                Bucket=S3_BUCKET_NAME,
+                Key=s3_key,
+                Fields=fields,
+                Conditions=[{name: value} for name, value in fields.items()] + [
+                    ['content-length-range', 1, UPLOAD_MAX_BYTES]
+                ],
+                ExpiresIn=UPLOAD_SESSION_EXPIRES
+            )
+            session_files.append({'image_id': image_id, 'content_type': content_type, 'image_hash': image_hash})
+            response_files.append({
+                'index': index,
+                'image_id': image_id,
+                'upload': {'url': upload['url'], 'fields': upload['fields']}
+            })
+        
+        session = {
+            'sid': str(uuid.uuid4()),
+            'uid': user_info.get('uid'),
+            'staff_id': staff_id,
+            'category': category,
+            'cleaning_date': cleaning_date,
+            'folder_name': folder_name,
+            'files': session_files,
+            'exp': int(time.time()) + UPLOAD_SESSION_EXPIRES
+        }
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'session_token': encode_upload_session(session),
+                'expires_in': UPLOAD_SESSION_EXPIRES,
+                'max_bytes': UPLOAD_MAX_BYTES,
+                'files': response_files
+            }, ensure_ascii=False)
+        }
+    except Exception as e:
+        print(f"Error creating upload session: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
+        }
+
+def image_hash_checksum(image_hash):
+    """16進のSHA-256をS3のチェックサム形式（Base64）に変換"""
+    return base64.b64encode(bytes.fromhex(image_hash)).decode('ascii')
+
+def upload_session_s3_key(session, file_info):
+    """
+    セッションが発行したS3キーを再生成（セッションの内容が不正な場合はNone）
+    クライアントやトークン内のキーは使わず、常に category/日付/フォルダ/image_id から組み立てる
+    """
+    if session.get('category') not in ['before', 'after']:
+        return None
+    if not UPLOAD_IMAGE_ID_PATTERN.match(str(file_info.get('image_id', ''))):
+        return None
+    extension = UPLOAD_CONTENT_TYPES.get(file_info.get('content_type'))
+    if not extension:
+        return None
+    try:
+        datetime.strptime(session.get('cleaning_date', ''), '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+    return build_report_image_s3_key(
+        session['category'], session['cleaning_date'], file_info['image_id'], session.get('folder_name'), extension
+    )
+
+def _head_uploaded_object(s3_key):
+    try:
+        return s3_client.head_object(Bucket=S3_BUCKET_NAME, Key=s3_key, ChecksumMode='ENABLED')
+    except ClientError as e:
+        if str(e.response.get('Error', {}).get('Code')) in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+def complete_report_image_upload_session(event, headers):
+    """
+    アップロードセッションを完了し、アップロード済み画像のメタデータをまとめて登録
+    
+    Request Body:
+        - session_token: セッション作成時に返したトークン
+        - image_ids: 完了させる画像ID（オプション、省略時はセッション内の全画像）
+    """
+    try:
+        user_info = _get_authenticated_staff(event)
+        if not user_info:
+            return {
+                'statusCode': 401,
+                'headers': headers,
+                'body': json.dumps({'error': 'Unauthorized'}, ensure_ascii=False)
+            }
+        
+        body = json.loads(event.get('body') or '{}')
+        try:
+            session = decode_upload_session(body.get('session_token') or '')
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False)
+            }
+        if session.get('uid') != user_info.get('uid'):
+            return {
+                'statusCode': 403,
+                'headers': headers,
+                'body': json.dumps({'error': 'Forbidden'}, ensure_ascii=False)
+            }
+        
+        requested_ids = body.get('image_ids')
+        images = []
+        errors = []
+        files = []
+        for file_info in session.get('files', []):
+            if requested_ids is not None and file_info.get('image_id') not in requested_ids:
+                continue
+            s3_key = upload_session_s3_key(session, file_info)
+            if not s3_key:
+                errors.append({'image_id': file_info.get('image_id'), 'error': 'invalid_file'})
+                continue
+            files.append((file_info, s3_key))
+        
+        # アップロード済みか確認（HEADを並列実行）
+        with ThreadPoolExecutor(max_workers=max(1, min(PHOTO_UPLOAD_MAX_WORKERS, len(files)))) as executor:
+            heads = list(executor.map(lambda f: _head_uploaded_object(f[1]), files))
+        
+        new_items = []
+        claimed_hashes = []
+        for (file_info, s3_key), head in zip(files, heads):
+            if head is None:
+                errors.append({'image_id': file_info['image_id'], 'error': 'not_uploaded'})
+                continue
+            image_hash = file_info.get('image_hash')
+            if image_hash and head.get('ChecksumSHA256') != image_hash_checksum(image_hash):
+                # S3で検証されていないハッシュは他の画像の重複判定に使われるため、確保も保存もしない
+                print(f"Warning: Checksum of {s3_key} does not match image_hash, registering without hash")
+                image_hash = None
+            metadata = build_report_image_metadata(
+                file_info['image_id'], s3_key, session['category'], session['cleaning_date'],
+                session['staff_id'], session.get('folder_name'), image_hash
+            )
+            metadata['content_type'] = head.get('ContentType', 'image/jpeg')
+            metadata['size'] = head.get('ContentLength', 0)
+            
+            if image_hash:
+                try:
+                    hash_claimed, existing_image = claim_report_image_hash(image_hash, metadata)
+                    if hash_claimed:
+                        claimed_hashes.append((image_hash, file_info['image_id']))
+                except Exception as e:
+                    print(f"Warning: Could not check for duplicates: {str(e)}")
+                    existing_image = None
+                if existing_image and existing_image.get('image_id') != file_info['image_id']:
+                    # セッション作成後に同じ画像が登録された: このセッションが発行したキーのアップロード分のみ削除して既存画像を返す
+                    if existing_image.get('s3_key') != s3_key:
+                        s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
+                    images.append(report_image_result(existing_image, duplicate=True))
+                    continue
+            new_items.append(metadata)
+            images.append(report_image_result(metadata))
+        
+        # メタデータをまとめて書き込み（失敗した場合は確保したハッシュを解放する）
+        try:
+            with REPORT_IMAGES_TABLE.batch_writer() as batch:
+                for metadata in new_items:
+                    batch.put_item(Item=metadata)
+        except Exception:
+            for image_hash, image_id in claimed_hashes:
+                release_report_image_hash(image_hash, image_id)
+            raise
+        for image_hash, image_id in claimed_hashes:
+            mark_report_image_hash_uploaded(image_hash, image_id)
+        print(f"[upload_session] {session['sid']}: registered={len(new_items)} errors={len(errors)}")
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'success': not errors,
+                'images': images,
+                'errors': errors
+            }, ensure_ascii=False, default=str)
+        }
+    except Exception as e:
+        print(f"Error completing upload session: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
+        }
+
 def upload_report_image(event, headers):
     """
     レポート用画像をアップロード（清掃員用API）
@@ -2406,15 +4018,16 @@ def upload_report_image(event, headers):
             'headers': headers,
             'body': json.dumps({
                 'success': True,
+                'duplicate': result.get('duplicate', False),
                 'image': result
             }, ensure_ascii=False)
         }
         
     except ValueError as e:
-        # 重複エラー
+        # 画像データ・日付の形式エラー
         error_message = str(e)
         return {
-            'statusCode': 409,  # Conflict
+            'statusCode': 400,
             'headers': headers,
             'body': json.dumps({'error': error_message}, ensure_ascii=False)
         }
@@ -2582,49 +4195,36 @@ def get_nfc_clock_in_logs(event, headers):
         if limit < 1:
             limit = 100
         
-        # フィルタ式を構築
-        filter_expressions = []
-        
-        if user_id:
-            filter_expressions.append(Attr('user_id').eq(user_id))
-        if facility_id:
-            filter_expressions.append(Attr('facility_id').eq(facility_id))
-        if location_id:
-            filter_expressions.append(Attr('location_id').eq(location_id))
-        if start_date:
-            filter_expressions.append(Attr('timestamp').gte(start_date))
-        if end_date:
-            filter_expressions.append(Attr('timestamp').lte(end_date))
-        
-        # スキャンまたはクエリを実行
-        if filter_expressions:
-            # フィルタがある場合はスキャン
-            filter_expr = filter_expressions[0]
-            for expr in filter_expressions[1:]:
-                filter_expr = filter_expr & expr
-            
-            response = CLEANING_LOGS_TABLE.scan(
-                FilterExpression=filter_expr,
-                Limit=limit
+        # クエリプランナーでGSIを選択（該当インデックスがなければスキャン）
+        plan = plan_list_query(
+            'cleaning-logs',
+            {
+                'user_id': user_id,
+                'facility_id': facility_id,
+                'location_id': location_id
+            },
+            {'timestamp': (start_date, end_date)}
+        )
+        try:
+            logs, next_page_token, plan = execute_list_page(
+                CLEANING_LOGS_TABLE, plan, limit, params.get('page_token'), descending=True
             )
-        else:
-            # フィルタがない場合は全件スキャン（リミット付き）
-            response = CLEANING_LOGS_TABLE.scan(Limit=limit)
-        
-        logs = response.get('Items', [])
+        except ValueError:
+            return invalid_page_token_response(headers)
         
         # timestampでソート（新しい順）
         logs.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
         
-        print(f"[NFC Clock-in Logs] Retrieved {len(logs)} logs")
+        print(f"[NFC Clock-in Logs] Retrieved {len(logs)} logs ({plan['description']})")
         
         return {
             'statusCode': 200,
-            'headers': headers,
+            'headers': with_query_plan_header(headers, plan),
             'body': json.dumps({
                 'status': 'success',
                 'count': len(logs),
-                'logs': logs
+                'logs': logs,
+                'next_page_token': next_page_token
             }, ensure_ascii=False, default=str)
         }
         
@@ -2776,8 +4376,21 @@ def get_report_images(event, headers):
         if folder_name and not folder_name.strip():
             folder_name = None
         
-        # 画像を取得
-        images = get_report_images_by_date(cleaning_date, category, folder_name)
+        # 画像を取得（page_size / page_token 指定時はカタログ順でページング）
+        if 'page_size' in params or 'page_token' in params:
+            plan = plan_report_image_catalog_query(cleaning_date, category, folder_name)
+            try:
+                images, next_page_token, plan = execute_list_page(
+                    REPORT_IMAGES_TABLE, plan, parse_page_size(params), params.get('page_token'), descending=True
+                )
+            except ValueError:
+                return invalid_page_token_response(headers)
+        else:
+            images = get_report_images_by_date(cleaning_date, category, folder_name)
+            next_page_token = None
+        for image in images:
+            if image.get('derivatives'):
+                image['srcset'] = build_image_srcsets(image.get('url'), image['derivatives'])
         
         return {
             'statusCode': 200,
@@ -2787,7 +4400,8 @@ def get_report_images(event, headers):
                 'category': category,
                 'folder_name': folder_name,
                 'images': images,
-                'count': len(images)
+                'count': len(images),
+                'next_page_token': next_page_token
             }, ensure_ascii=False, default=str)
         }
         
@@ -2803,6 +4417,9 @@ def create_report(event, headers):
     """
     レポートを作成（管理者・清掃員どちらも可能）
     """
+    report_id = None
+    registered_hashes = ()
+    report_saved = False
     try:
         # Firebase ID Tokenを取得
         auth_header = event.get('headers', {}).get('Authorization') or event.get('headers', {}).get('authorization', '')
@@ -2810,7 +4427,7 @@ def create_report(event, headers):
         
         # トークンを検証（清掃員もレポート作成可能）
         user_info = verify_firebase_token(id_token)
-        if not user_info.get('verified'):
+        if not user_info or not user_info.get('verified'):
             # トークンがない場合でも、開発環境では許可（後で削除可能）
             if not id_token or id_token == 'dev-token':
                 user_info = {
@@ -2841,122 +4458,15 @@ def create_report(event, headers):
         report_id = str(uuid.uuid4())
         now = datetime.utcnow().isoformat() + 'Z'
         
-        # 写真をS3にアップロード
-        photo_urls = {}
+        # 写真をS3にアップロード（work_items・sectionsのBase64画像を並列アップロード）
         print(f"[DEBUG] work_items count: {len(body_json.get('work_items', []))}")
-        for item in body_json.get('work_items', []):
-            item_id = item['item_id']
-            print(f"[DEBUG] Processing item: {item_id}")
-            print(f"[DEBUG] Item photos: {item.get('photos', {})}")
-            photo_urls[item_id] = {
-                'before': [],
-                'after': []
-            }
-            
-            # 作業前の写真
-            before_photos = item.get('photos', {}).get('before', [])
-            print(f"[DEBUG] Before photos count: {len(before_photos)}")
-            base64_counter_before = 0
-            for photo_data in before_photos:
-                if photo_data:
-                    print(f"[DEBUG] Processing before photo: {photo_data[:100] if len(str(photo_data)) > 100 else photo_data}")
-                    # Base64画像の場合はS3にアップロード
-                    if isinstance(photo_data, str) and photo_data.startswith('data:image'):
-                        base64_counter_before += 1
-                        photo_key = f"reports/{report_id}/{item_id}-before-{base64_counter_before}.jpg"
-                    try:
-                        photo_url = upload_photo_to_s3(photo_data, photo_key)
-                        photo_urls[item_id]['before'].append(photo_url)
-                        print(f"[DEBUG] Uploaded to S3: {photo_url}")
-                    except Exception as e:
-                        print(f"Error uploading before photo: {str(e)}")
-                    else:
-                        # 既に完全URLの場合はそのまま使用、そうでなければ変換
-                        if isinstance(photo_data, str) and (photo_data.startswith('http://') or photo_data.startswith('https://')):
-                            s3_url = photo_data
-                        else:
-                            s3_url = convert_to_s3_url(photo_data)
-                        photo_urls[item_id]['before'].append(s3_url)
-                        print(f"[DEBUG] Using S3 URL: {s3_url}")
-            
-            # 作業後の写真
-            base64_counter_after = 0
-            for photo_data in item.get('photos', {}).get('after', []):
-                if photo_data:
-                    print(f"[DEBUG] Processing after photo: {photo_data[:100] if len(str(photo_data)) > 100 else photo_data}")
-                    # Base64画像の場合はS3にアップロード
-                    if isinstance(photo_data, str) and photo_data.startswith('data:image'):
-                        base64_counter_after += 1
-                        photo_key = f"reports/{report_id}/{item_id}-after-{base64_counter_after}.jpg"
-                    try:
-                        photo_url = upload_photo_to_s3(photo_data, photo_key)
-                        photo_urls[item_id]['after'].append(photo_url)
-                        print(f"[DEBUG] Uploaded to S3: {photo_url}")
-                    except Exception as e:
-                        print(f"Error uploading after photo: {str(e)}")
-                    else:
-                        # 既に完全URLの場合はそのまま使用、そうでなければ変換
-                        if isinstance(photo_data, str) and (photo_data.startswith('http://') or photo_data.startswith('https://')):
-                            s3_url = photo_data
-                        else:
-                            s3_url = convert_to_s3_url(photo_data)
-                        photo_urls[item_id]['after'].append(s3_url)
-                        print(f"[DEBUG] Using S3 URL: {s3_url}")
+        photo_urls, processed_sections, photo_upload_errors, photo_derivatives, registered_hashes = upload_report_photos(
+            report_id, body_json.get('work_items', []), body_json.get('sections', [])
+        )
         
         # staff_idが指定されていない場合は、created_byを使用
         staff_id = body_json.get('staff_id') or user_info.get('uid', 'admin-uid')
         
-        # sectionsの画像をS3にアップロード
-        sections = body_json.get('sections', [])
-        processed_sections = []
-        for section in sections:
-            if section.get('section_type') == 'image':
-                section_id = section.get('section_id', str(uuid.uuid4()))
-                processed_section = {
-                    'section_id': section_id,
-                    'section_type': 'image',
-                    'image_type': section.get('image_type', 'work'),
-                    'photos': {
-                        'before': [],
-                        'after': []
-                    }
-                }
-                
-                # 作業前の写真
-                base64_counter = 0
-                for photo_data in section.get('photos', {}).get('before', []):
-                    if photo_data:
-                        if isinstance(photo_data, str) and photo_data.startswith('data:image'):
-                            base64_counter += 1
-                            photo_key = f"reports/{report_id}/section-{section_id}-before-{base64_counter}.jpg"
-                            try:
-                                photo_url = upload_photo_to_s3(photo_data, photo_key)
-                                processed_section['photos']['before'].append(photo_url)
-                            except Exception as e:
-                                print(f"Error uploading section before photo: {str(e)}")
-                        elif isinstance(photo_data, str) and (photo_data.startswith('http://') or photo_data.startswith('https://')):
-                            processed_section['photos']['before'].append(photo_data)
-                
-                # 作業後の写真
-                base64_counter = 0
-                for photo_data in section.get('photos', {}).get('after', []):
-                    if photo_data:
-                        if isinstance(photo_data, str) and photo_data.startswith('data:image'):
-                            base64_counter += 1
-                            photo_key = f"reports/{report_id}/section-{section_id}-after-{base64_counter}.jpg"
-                            try:
-                                photo_url = upload_photo_to_s3(photo_data, photo_key)
-                                processed_section['photos']['after'].append(photo_url)
-                            except Exception as e:
-                                print(f"Error uploading section after photo: {str(e)}")
-                        elif isinstance(photo_data, str) and (photo_data.startswith('http://') or photo_data.startswith('https://')):
-                            processed_section['photos']['after'].append(photo_data)
-                
-                processed_sections.append(processed_section)
-            else:
-                # コメントや作業内容セクションはそのまま追加
-                processed_sections.append(section)
-        
         # DynamoDBに保存するアイテムを作成
         report_item = {
             'report_id': report_id,
@@ -2983,7 +4493,8 @@ def create_report(event, headers):
                 'commented_at': None,
                 'commented_by': None
             },
-            'ttl': int((datetime.utcnow().timestamp() + (365 * 5 * 24 * 60 * 60)))  # 5年後
+            'ttl': int((datetime.utcnow().timestamp() + (365 * 5 * 24 * 60 * 60))),  # 5年後
+            'photo_derivatives': photo_derivatives
         }
         
         # 写真URLをwork_itemsに反映
@@ -3001,6 +4512,9 @@ def create_report(event, headers):
         
         # DynamoDBに保存
         REPORTS_TABLE.put_item(Item=report_item)
+        report_saved = True
+        sync_photo_blob_references(report_id, None, report_item, registered_hashes)
+        fill_report_photo_derivatives(report_item)
         
         return {
             'statusCode': 200,
@@ -3008,13 +4522,17 @@ def create_report(event, headers):
             'body': json.dumps({
                 'status': 'success',
                 'message': 'レポートを作成しました',
-                'report_id': report_id
+                'report_id': report_id,
+                'photo_upload_errors': photo_upload_errors
             }, ensure_ascii=False)
         }
     except Exception as e:
         print(f"Error creating report: {str(e)}")
         import traceback
         print(f"Traceback: {traceback.format_exc()}")
+        if registered_hashes and not report_saved:
+            # 保存されなかったレポートの参照を外す（残るとS3イベントが再試行を続け、GCの対象にもならない）
+            sync_photo_blob_references(report_id, None, None, registered_hashes)
         return {
             'statusCode': 500,
             'headers': headers,
@@ -3035,7 +4553,7 @@ def get_reports(event, headers):
         
         # トークンを検証
         user_info = verify_firebase_token(id_token)
-        if not user_info.get('verified'):
+        if not user_info or not user_info.get('verified'):
             return {
                 'statusCode': 401,
                 'headers': headers,
@@ -3044,7 +4562,8 @@ def get_reports(event, headers):
         
         # クエリパラメータを取得
         query_params = event.get('queryStringParameters') or {}
-        limit = int(query_params.get('limit', 50))
+        limit = parse_page_size(query_params, 50)
+        page_token = query_params.get('page_token')
         status_filter = query_params.get('status')
         staff_id_filter = query_params.get('staff_id')
         
@@ -3052,46 +4571,32 @@ def get_reports(event, headers):
         is_admin = user_info.get('role') == 'admin'
         user_uid = user_info.get('uid')
         
-        # フィルター条件を構築
-        filter_expressions = []
-        
-        # ステータスフィルター
-        if status_filter:
-            filter_expressions.append(Attr('status').eq(status_filter))
-        
-        # スケジュールIDフィルター
-        schedule_id_filter = query_params.get('schedule_id')
-        if schedule_id_filter:
-            filter_expressions.append(Attr('schedule_id').eq(schedule_id_filter))
-        
         # 清掃員の場合は自分のレポートのみ
         if not is_admin and user_uid:
-            filter_expressions.append(Attr('staff_id').eq(user_uid))
-        elif staff_id_filter:
-            filter_expressions.append(Attr('staff_id').eq(staff_id_filter))
-        
-        # スキャン実行
-        if filter_expressions:
-            from functools import reduce
-            filter_expr = reduce(lambda x, y: x & y, filter_expressions)
-            response = REPORTS_TABLE.scan(
-                FilterExpression=filter_expr,
-                Limit=limit
-            )
-        else:
-            response = REPORTS_TABLE.scan(Limit=limit)
-        
-        items = response.get('Items', [])
+            staff_id_filter = user_uid
+        
+        # クエリプランナーでGSIを選択（created_atの降順でページング）
+        plan = plan_list_query('staff-reports', {
+            'status': status_filter,
+            'schedule_id': query_params.get('schedule_id'),
+            'staff_id': staff_id_filter
+        })
+        try:
+            items, next_page_token, plan = execute_list_page(REPORTS_TABLE, plan, limit, page_token, descending=True)
+        except ValueError:
+            return invalid_page_token_response(headers)
         
         # 日付でソート（降順）
         items.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        for item in items:
+            attach_photo_srcsets(item)
         
         return {
             'statusCode': 200,
-            'headers': headers,
+            'headers': with_query_plan_header(headers, plan),
             'body': json.dumps({
                 'items': items,
-                'last_key': response.get('LastEvaluatedKey'),
+                'next_page_token': next_page_token,
                 'count': len(items)
             }, ensure_ascii=False, default=str)
         }
@@ -3108,34 +4613,44 @@ def get_reports(event, headers):
             }, ensure_ascii=False)
         }
 
+# ==================== レポートリポジトリ ====================
+# staff-reports は report_id をパーティションキー、created_at をソートキーとするテーブル
+# （ソートキーなしのスキーマにも対応するため、ソートキー名は環境変数で上書き可能・空文字でなし）
+# report_id での検索はパーティションキーに対するクエリ1回で完結し、テーブルサイズに依存しない
+# 旧実装のスキャン検索は scripts/benchmark_report_lookup.py に移行確認用として残している
+REPORTS_TABLE_SORT_KEY = os.environ.get('REPORTS_TABLE_SORT_KEY', 'created_at')
+
+def get_report_by_id(report_id):
+    """
+    report_id でレポートを1件取得（見つからない場合はNone）
+    同一report_idに複数のアイテムがある場合はソートキーが最新のものを返す
+    """
+    if not report_id:
+        return None
+    response = REPORTS_TABLE.query(
+        KeyConditionExpression=Key('report_id').eq(report_id),
+        ScanIndexForward=False,
+        Limit=1
+    )
+    items = response.get('Items', [])
+    return items[0] if items else None
+
+def get_report_key(report):
+    """レポートアイテムからテーブルのキー（ソートキーを含む）を組み立てる"""
+    key = {'report_id': report['report_id']}
+    if REPORTS_TABLE_SORT_KEY and REPORTS_TABLE_SORT_KEY in report:
+        key[REPORTS_TABLE_SORT_KEY] = report[REPORTS_TABLE_SORT_KEY]
+    return key
+
 def get_public_report(report_id, headers):
     """
     公開レポート詳細を取得（認証不要）
     """
     try:
-        # DynamoDBからレポートを取得（スキャンを使用）
-        items = []
-        last_evaluated_key = None
+        # DynamoDBからレポートを取得（report_idのキー検索）
+        report = get_report_by_id(report_id)
         
-        while True:
-            scan_kwargs = {
-                'FilterExpression': Attr('report_id').eq(report_id),
-                'Limit': 10
-            }
-            if last_evaluated_key:
-                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
-            
-            response = REPORTS_TABLE.scan(**scan_kwargs)
-            items.extend(response.get('Items', []))
-            
-            if items:
-                break
-            
-            last_evaluated_key = response.get('LastEvaluatedKey')
-            if not last_evaluated_key:
-                break
-        
-        if not items:
+        if not report:
             return {
                 'statusCode': 404,
                 'headers': headers,
@@ -3143,7 +4658,6 @@ def get_public_report(report_id, headers):
             }
         
         # 公開用にセンシティブな情報を除外
-        report = items[0]
         public_report = {
             'report_id': report.get('report_id'),
             'brand_name': report.get('brand_name'),  # ブランド名
@@ -3154,8 +4668,10 @@ def get_public_report(report_id, headers):
             'cleaning_end_time': report.get('cleaning_end_time'),
             'work_items': report.get('work_items', []),
             'sections': report.get('sections', []),  # 画像・コメント・作業内容セクション
-            'satisfaction': report.get('satisfaction', {})
+            'satisfaction': report.get('satisfaction', {}),
+            'photo_derivatives': report.get('photo_derivatives')
         }
+        attach_photo_srcsets(public_report)
         
         return {
             'statusCode': 200,
@@ -3185,64 +4701,29 @@ def get_report_detail(report_id, event, headers):
         
         # トークンを検証
         user_info = verify_firebase_token(id_token)
-        if not user_info.get('verified'):
+        if not user_info or not user_info.get('verified'):
             return {
                 'statusCode': 401,
                 'headers': headers,
-                'body': json.dumps({'error': 'Unauthorized'}, ensure_ascii=False)
-            }
-        
-        # DynamoDBからレポートを取得（スキャンを使用）
-        # 注意: テーブルにソートキー（created_at）がある場合、スキャンを使用
-        # または、テーブルスキーマを変更してreport_idのみをパーティションキーにする
-        # スキャン操作ではFilterExpressionにAttrを使用
-        print(f"DEBUG: Getting report with ID: {report_id}")
-        try:
-            # ページネーションに対応してスキャンを実行
-            items = []
-            last_evaluated_key = None
-            
-            while True:
-                scan_kwargs = {
-                    'FilterExpression': Attr('report_id').eq(report_id),
-                    'Limit': 10
-                }
-                if last_evaluated_key:
-                    scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
-                
-                response = REPORTS_TABLE.scan(**scan_kwargs)
-                print(f"DEBUG: Scan response: Items={len(response.get('Items', []))}, ScannedCount={response.get('ScannedCount', 0)}")
-                
-                items.extend(response.get('Items', []))
-                
-                # 見つかったら終了
-                if items:
-                    break
-                
-                # ページネーションが続くか確認
-                last_evaluated_key = response.get('LastEvaluatedKey')
-                if not last_evaluated_key:
-                    break
-            
-            print(f"DEBUG: Total items found: {len(items)}")
-        except Exception as e:
-            print(f"DEBUG: Scan error: {str(e)}")
-            import traceback
-            print(f"DEBUG: Traceback: {traceback.format_exc()}")
-            raise
+                'body': json.dumps({'error': 'Unauthorized'}, ensure_ascii=False)
+            }
         
-        if not items:
+        # DynamoDBからレポートを取得（report_idのキー検索）
+        report = get_report_by_id(report_id)
+        
+        if not report:
             print(f"DEBUG: No items found for report_id: {report_id}")
             return {
                 'statusCode': 404,
                 'headers': headers,
                 'body': json.dumps({'error': 'Report not found'}, ensure_ascii=False)
             }
+        attach_photo_srcsets(report)
         
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': json.dumps(items[0], ensure_ascii=False, default=str)
+            'body': json.dumps(report, ensure_ascii=False, default=str)
         }
     except Exception as e:
         print(f"Error getting report detail: {str(e)}")
@@ -3268,7 +4749,7 @@ def update_report(event, headers):
         
         # トークンを検証
         user_info = verify_firebase_token(id_token)
-        if not user_info.get('verified'):
+        if not user_info or not user_info.get('verified'):
             return {
                 'statusCode': 401,
                 'headers': headers,
@@ -3302,76 +4783,18 @@ def update_report(event, headers):
                 'body': json.dumps({'error': 'report_id is required'}, ensure_ascii=False)
             }
         
-        # 既存のレポートを取得（スキャンを使用、ページネーションに対応）
-        items = []
-        last_evaluated_key = None
-        
-        while True:
-            scan_kwargs = {
-                'FilterExpression': Attr('report_id').eq(report_id),
-                'Limit': 10
-            }
-            if last_evaluated_key:
-                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
-            
-            existing_response = REPORTS_TABLE.scan(**scan_kwargs)
-            items.extend(existing_response.get('Items', []))
-            
-            # 見つかったら終了
-            if items:
-                break
-            
-            # ページネーションが続くか確認
-            last_evaluated_key = existing_response.get('LastEvaluatedKey')
-            if not last_evaluated_key:
-                break
+        # 既存のレポートを取得（report_idのキー検索）
+        existing_item = get_report_by_id(report_id)
         
-        if not items:
+        if not existing_item:
             return {
                 'statusCode': 404,
                 'headers': headers,
                 'body': json.dumps({'error': 'Report not found'}, ensure_ascii=False)
             }
         
-        existing_item = items[0]
-        
-        # 写真をS3にアップロード（新しいBase64画像がある場合）
-        photo_urls = {}
-        for item in body_json.get('work_items', []):
-            item_id = item['item_id']
-            photo_urls[item_id] = {
-                'before': [],
-                'after': []
-            }
-            
-            # 既存の写真URLを保持（Base64でないもの）
-            existing_photos = item.get('photos', {})
-            for photo_url in existing_photos.get('before', []):
-                if not photo_url.startswith('data:image'):
-                    photo_urls[item_id]['before'].append(photo_url)
-            
-            for photo_url in existing_photos.get('after', []):
-                if not photo_url.startswith('data:image'):
-                    photo_urls[item_id]['after'].append(photo_url)
-            
-            # 新しいBase64画像をアップロード
-            for idx, photo_data in enumerate(item.get('photos', {}).get('before', [])):
-                if isinstance(photo_data, str) and photo_data.startswith('data:image'):
-                    photo_key = f"reports/{report_id}/{item_id}-before-{len(photo_urls[item_id]['before'])+1}.jpg"
-                    try:
-                        photo_url = upload_photo_to_s3(photo_data, photo_key)
-                        photo_urls[item_id]['before'].append(photo_url)
-                    except Exception as e:
-                        print(f"Error uploading before photo: {str(e)}")
-            
-            for idx, photo_data in enumerate(item.get('photos', {}).get('after', [])):
-                if isinstance(photo_data, str) and photo_data.startswith('data:image'):
-                    photo_key = f"reports/{report_id}/{item_id}-after-{len(photo_urls[item_id]['after'])+1}.jpg"
-                    try:
-                        photo_url = upload_photo_to_s3(photo_data, photo_key)
-                        photo_urls[item_id]['after'].append(photo_url)
-                    except Exception as e:
-                        print(f"Error uploading after photo: {str(e)}")
+        # 写真をS3にアップロード（新しいBase64画像を並列アップロード）
+        photo_urls, _, photo_upload_errors, photo_derivatives, registered_hashes = upload_report_photos(report_id, body_json.get('work_items', []), [])
         
         # staff_idの処理（空文字列の場合は既存の値を使用、それもなければNone）
         # DynamoDBのセカンダリインデックスキーには空文字列を設定できないため
@@ -3401,7 +4824,8 @@ def update_report(event, headers):
             'work_items': body_json.get('work_items', existing_item['work_items']),
             'location': body_json.get('location', existing_item.get('location')),
             'satisfaction': body_json.get('satisfaction', existing_item.get('satisfaction', {})),
-            'ttl': existing_item.get('ttl')
+            'ttl': existing_item.get('ttl'),
+            'photo_derivatives': {**existing_item.get('photo_derivatives', {}), **photo_derivatives}
         }
         
         # staff_idがNoneの場合は、DynamoDBアイテムから削除（インデックスキーとして使用できないため）
@@ -3416,6 +4840,8 @@ def update_report(event, headers):
         
         # DynamoDBに保存
         REPORTS_TABLE.put_item(Item=updated_item)
+        sync_photo_blob_references(report_id, existing_item, updated_item, registered_hashes)
+        fill_report_photo_derivatives(updated_item)
         
         return {
             'statusCode': 200,
@@ -3423,7 +4849,8 @@ def update_report(event, headers):
             'body': json.dumps({
                 'status': 'success',
                 'message': 'レポートを更新しました',
-                'report_id': report_id
+                'report_id': report_id,
+                'photo_upload_errors': photo_upload_errors
             }, ensure_ascii=False)
         }
     except Exception as e:
@@ -3451,7 +4878,7 @@ def update_report_by_id(report_id, event, headers):
         
         # トークンを検証
         user_info = verify_firebase_token(id_token)
-        if not user_info.get('verified'):
+        if not user_info or not user_info.get('verified'):
             return {
                 'statusCode': 401,
                 'headers': headers,
@@ -3472,76 +4899,22 @@ def update_report_by_id(report_id, event, headers):
         else:
             body_json = json.loads(body.decode('utf-8'))
         
-        # 既存のレポートを取得（スキャンを使用、ページネーションに対応）
-        items = []
-        last_evaluated_key = None
-        
-        while True:
-            scan_kwargs = {
-                'FilterExpression': Attr('report_id').eq(report_id),
-                'Limit': 10
-            }
-            if last_evaluated_key:
-                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
-            
-            existing_response = REPORTS_TABLE.scan(**scan_kwargs)
-            items.extend(existing_response.get('Items', []))
-            
-            # 見つかったら終了
-            if items:
-                break
-            
-            # ページネーションが続くか確認
-            last_evaluated_key = existing_response.get('LastEvaluatedKey')
-            if not last_evaluated_key:
-                break
+        # 既存のレポートを取得（report_idのキー検索）
+        existing_item = get_report_by_id(report_id)
         
-        if not items:
+        if not existing_item:
             return {
                 'statusCode': 404,
                 'headers': headers,
                 'body': json.dumps({'error': 'Report not found'}, ensure_ascii=False)
             }
         
-        existing_item = items[0]
-        
-        # 写真をS3にアップロード（新しいBase64画像がある場合）
-        photo_urls = {}
-        for item in body_json.get('work_items', []):
-            item_id = item['item_id']
-            photo_urls[item_id] = {
-                'before': [],
-                'after': []
-            }
-            
-            # 既存の写真URLを保持（Base64でないもの）
-            existing_photos = item.get('photos', {})
-            for photo_url in existing_photos.get('before', []):
-                if not photo_url.startswith('data:image'):
-                    photo_urls[item_id]['before'].append(photo_url)
-            
-            for photo_url in existing_photos.get('after', []):
-                if not photo_url.startswith('data:image'):
-                    photo_urls[item_id]['after'].append(photo_url)
-            
-            # 新しいBase64画像をアップロード
-            for idx, photo_data in enumerate(item.get('photos', {}).get('before', [])):
-                if isinstance(photo_data, str) and photo_data.startswith('data:image'):
-                    photo_key = f"reports/{report_id}/{item_id}-before-{len(photo_urls[item_id]['before'])+1}.jpg"
-                    try:
-                        photo_url = upload_photo_to_s3(photo_data, photo_key)
-                        photo_urls[item_id]['before'].append(photo_url)
-                    except Exception as e:
-                        print(f"Error uploading before photo: {str(e)}")
-            
-            for idx, photo_data in enumerate(item.get('photos', {}).get('after', [])):
-                if isinstance(photo_data, str) and photo_data.startswith('data:image'):
-                    photo_key = f"reports/{report_id}/{item_id}-after-{len(photo_urls[item_id]['after'])+1}.jpg"
-                    try:
-                        photo_url = upload_photo_to_s3(photo_data, photo_key)
-                        photo_urls[item_id]['after'].append(photo_url)
-                    except Exception as e:
-                        print(f"Error uploading after photo: {str(e)}")
+        # 写真をS3にアップロード（work_items・sectionsの新しいBase64画像を並列アップロード）
+        photo_urls, processed_sections, photo_upload_errors, photo_derivatives, registered_hashes = upload_report_photos(
+            report_id,
+            body_json.get('work_items', []),
+            body_json.get('sections', existing_item.get('sections', []))
+        )
         
         # staff_idの処理（空文字列の場合は既存の値を使用、それもなければNone）
         # DynamoDBのセカンダリインデックスキーには空文字列を設定できないため
@@ -3551,57 +4924,6 @@ def update_report_by_id(report_id, event, headers):
         if staff_id_value == '' or staff_id_value is None:
             staff_id_value = None
         
-        # sectionsの画像をS3にアップロード
-        sections = body_json.get('sections', existing_item.get('sections', []))
-        processed_sections = []
-        for section in sections:
-            if section.get('section_type') == 'image':
-                section_id = section.get('section_id', str(uuid.uuid4()))
-                processed_section = {
-                    'section_id': section_id,
-                    'section_type': 'image',
-                    'image_type': section.get('image_type', 'work'),
-                    'photos': {
-                        'before': [],
-                        'after': []
-                    }
-                }
-                
-                # 作業前の写真
-                base64_counter = 0
-                for photo_data in section.get('photos', {}).get('before', []):
-                    if photo_data:
-                        if isinstance(photo_data, str) and photo_data.startswith('data:image'):
-                            base64_counter += 1
-                            photo_key = f"reports/{report_id}/section-{section_id}-before-{base64_counter}.jpg"
-                            try:
-                                photo_url = upload_photo_to_s3(photo_data, photo_key)
-                                processed_section['photos']['before'].append(photo_url)
-                            except Exception as e:
-                                print(f"Error uploading section before photo: {str(e)}")
-                        elif isinstance(photo_data, str) and (photo_data.startswith('http://') or photo_data.startswith('https://')):
-                            processed_section['photos']['before'].append(photo_data)
-                
-                # 作業後の写真
-                base64_counter = 0
-                for photo_data in section.get('photos', {}).get('after', []):
-                    if photo_data:
-                        if isinstance(photo_data, str) and photo_data.startswith('data:image'):
-                            base64_counter += 1
-                            photo_key = f"reports/{report_id}/section-{section_id}-after-{base64_counter}.jpg"
-                            try:
-                                photo_url = upload_photo_to_s3(photo_data, photo_key)
-                                processed_section['photos']['after'].append(photo_url)
-                            except Exception as e:
-                                print(f"Error uploading section after photo: {str(e)}")
-                        elif isinstance(photo_data, str) and (photo_data.startswith('http://') or photo_data.startswith('https://')):
-                            processed_section['photos']['after'].append(photo_data)
-                
-                processed_sections.append(processed_section)
-            else:
-                # コメントや作業内容セクションはそのまま追加
-                processed_sections.append(section)
-        
         # ステータスを取得
         old_status = existing_item.get('status', 'published')
         new_status = body_json.get('status', old_status)
@@ -3633,7 +4955,8 @@ def update_report_by_id(report_id, event, headers):
             'sections': processed_sections,
             'location': body_json.get('location', existing_item.get('location')),
             'satisfaction': body_json.get('satisfaction', existing_item.get('satisfaction', {})),
-            'ttl': existing_item.get('ttl')
+            'ttl': existing_item.get('ttl'),
+            'photo_derivatives': {**existing_item.get('photo_derivatives', {}), **photo_derivatives}
         }
         
         # 再提出フラグを設定
@@ -3676,6 +4999,8 @@ def update_report_by_id(report_id, event, headers):
         
         # DynamoDBに保存
         REPORTS_TABLE.put_item(Item=updated_item)
+        sync_photo_blob_references(report_id, existing_item, updated_item, registered_hashes)
+        fill_report_photo_derivatives(updated_item)
         
         return {
             'statusCode': 200,
@@ -3683,7 +5008,8 @@ def update_report_by_id(report_id, event, headers):
             'body': json.dumps({
                 'status': 'success',
                 'message': 'レポートを更新しました',
-                'report_id': report_id
+                'report_id': report_id,
+                'photo_upload_errors': photo_upload_errors
             }, ensure_ascii=False)
         }
     except Exception as e:
@@ -3710,7 +5036,7 @@ def delete_report(report_id, event, headers):
         
         # トークンを検証
         user_info = verify_firebase_token(id_token)
-        if not user_info.get('verified'):
+        if not user_info or not user_info.get('verified'):
             return {
                 'statusCode': 401,
                 'headers': headers,
@@ -3725,54 +5051,20 @@ def delete_report(report_id, event, headers):
                 'body': json.dumps({'error': 'Forbidden: Admin access required'}, ensure_ascii=False)
             }
         
-        # DynamoDBから削除
-        # 注意: テーブルにソートキー（created_at）がある場合、まずアイテムを取得してから削除
-        # または、テーブルスキーマを変更してreport_idのみをパーティションキーにする
-        # まず、レポートを取得してcreated_atを取得（ページネーションに対応）
-        items = []
-        last_evaluated_key = None
-        
-        while True:
-            scan_kwargs = {
-                'FilterExpression': Attr('report_id').eq(report_id),
-                'Limit': 10
-            }
-            if last_evaluated_key:
-                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
-            
-            response = REPORTS_TABLE.scan(**scan_kwargs)
-            items.extend(response.get('Items', []))
-            
-            # 見つかったら終了
-            if items:
-                break
-            
-            # ページネーションが続くか確認
-            last_evaluated_key = response.get('LastEvaluatedKey')
-            if not last_evaluated_key:
-                break
+        # DynamoDBから削除（キー検索でソートキーを含むキーを特定してから削除）
+        item = get_report_by_id(report_id)
         
-        if not items:
+        if not item:
             return {
                 'statusCode': 404,
                 'headers': headers,
                 'body': json.dumps({'error': 'Report not found'}, ensure_ascii=False)
             }
         
-        item = items[0]
-        # ソートキーがある場合、パーティションキーとソートキーの両方を指定
-        if 'created_at' in item:
-            REPORTS_TABLE.delete_item(
-                Key={
-                    'report_id': report_id,
-                    'created_at': item['created_at']
-                }
-            )
-        else:
-            # ソートキーがない場合
-            REPORTS_TABLE.delete_item(Key={'report_id': report_id})
+        REPORTS_TABLE.delete_item(Key=get_report_key(item))
         
-        # TODO: S3の写真も削除する（オプション）
+        # 写真の参照を外す（参照がなくなった写真は scripts/gc_photo_blobs.py で削除）
+        sync_photo_blob_references(report_id, item, None)
         
         return {
             'statusCode': 200,
@@ -4008,31 +5300,21 @@ def get_schedules(event, headers):
         date = query_params.get('date')
         assigned_to = query_params.get('assigned_to')
         
-        # スキャンまたはクエリを実行
-        if status:
-            # ステータスでフィルタ（GSIを使用する場合）
-            response = SCHEDULES_TABLE.scan(
-                FilterExpression=Attr('status').eq(status)
-            )
-        elif date:
-            # 日付でフィルタ
-            response = SCHEDULES_TABLE.scan(
-                FilterExpression=Attr('date').eq(date)
-            )
-        elif assigned_to:
-            # 担当者でフィルタ（GSIを使用する場合）
-            response = SCHEDULES_TABLE.scan(
-                FilterExpression=Attr('assigned_to').eq(assigned_to)
-            )
-        else:
-            # 全件取得
-            response = SCHEDULES_TABLE.scan()
-        
-        schedules = response.get('Items', [])
+        # クエリプランナーでGSIを選択（該当インデックスがなければスキャン）
+        plan = plan_list_query('schedules', {
+            'status': status,
+            'date': date,
+            'assigned_to': assigned_to
+        })
+        try:
+            schedules, next_page_token, plan = execute_list_request(SCHEDULES_TABLE, plan, query_params)
+        except ValueError:
+            return invalid_page_token_response(headers)
         
+        # レスポンスは従来どおり配列のため、継続トークンはヘッダーで返す
         return {
             'statusCode': 200,
-            'headers': headers,
+            'headers': with_page_token_header(with_query_plan_header(headers, plan), next_page_token),
             'body': json.dumps(schedules, ensure_ascii=False, default=str)
         }
     except Exception as e:
@@ -4427,19 +5709,11 @@ def clear_all_schedules(event, headers):
             }
 
         deleted = 0
-        scan_kwargs = {'ProjectionExpression': 'id'}
-        response = SCHEDULES_TABLE.scan(**scan_kwargs)
         with SCHEDULES_TABLE.batch_writer() as batch:
-            for item in response.get('Items', []):
+            for item in parallel_scan(SCHEDULES_TABLE, {'ProjectionExpression': 'id'}):
                 if item.get('id'):
                     batch.delete_item(Key={'id': item['id']})
                     deleted += 1
-            while 'LastEvaluatedKey' in response:
-                response = SCHEDULES_TABLE.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
-                for item in response.get('Items', []):
-                    if item.get('id'):
-                        batch.delete_item(Key={'id': item['id']})
-                        deleted += 1
 
         return {
             'statusCode': 200,
@@ -4548,35 +5822,25 @@ def get_estimates(event, headers):
         status = query_params.get('status')
         schedule_id = query_params.get('schedule_id')
         
-        # スキャンまたはクエリを実行
-        if store_id:
-            # 店舗IDでフィルタ
-            response = ESTIMATES_TABLE.scan(
-                FilterExpression=Attr('store_id').eq(store_id)
-            )
-        elif status:
-            # ステータスでフィルタ
-            response = ESTIMATES_TABLE.scan(
-                FilterExpression=Attr('status').eq(status)
-            )
-        elif schedule_id:
-            # スケジュールIDでフィルタ
-            response = ESTIMATES_TABLE.scan(
-                FilterExpression=Attr('schedule_id').eq(schedule_id)
-            )
-        else:
-            # 全件取得
-            response = ESTIMATES_TABLE.scan()
-        
-        estimates = response.get('Items', [])
+        # クエリプランナーでGSIを選択（該当インデックスがなければスキャン）
+        plan = plan_list_query('estimates', {
+            'store_id': store_id,
+            'status': status,
+            'schedule_id': schedule_id
+        })
+        try:
+            estimates, next_page_token, plan = execute_list_request(ESTIMATES_TABLE, plan, query_params)
+        except ValueError:
+            return invalid_page_token_response(headers)
         
         return {
             'statusCode': 200,
-            'headers': headers,
+            'headers': with_query_plan_header(headers, plan),
             'body': json.dumps({
                 'status': 'success',
                 'estimates': estimates,
-                'count': len(estimates)
+                'count': len(estimates),
+                'next_page_token': next_page_token
             }, ensure_ascii=False, default=str)
         }
     except Exception as e:
@@ -4867,35 +6131,25 @@ def get_clients(event, headers):
         firebase_uid = query_params.get('firebase_uid')
         status = query_params.get('status')
         
-        # スキャンまたはクエリを実行
-        if firebase_uid:
-            # Firebase UIDでフィルタ（クライアントログイン用）
-            response = CLIENTS_TABLE.scan(
-                FilterExpression=Attr('firebase_uid').eq(firebase_uid)
-            )
-        elif email:
-            # メールアドレスでフィルタ
-            response = CLIENTS_TABLE.scan(
-                FilterExpression=Attr('email').eq(email)
-            )
-        elif status:
-            # ステータスでフィルタ
-            response = CLIENTS_TABLE.scan(
-                FilterExpression=Attr('status').eq(status)
-            )
-        else:
-            # 全件取得
-            response = CLIENTS_TABLE.scan()
-        
-        clients = response.get('Items', [])
+        # クエリプランナーでGSIを選択（該当インデックスがなければスキャン）
+        plan = plan_list_query('misesapo-clients', {
+            'firebase_uid': firebase_uid,
+            'email': email,
+            'status': status
+        })
+        try:
+            clients, next_page_token, plan = execute_list_request(CLIENTS_TABLE, plan, query_params)
+        except ValueError:
+            return invalid_page_token_response(headers)
         
         # レスポンス形式を統一（items配列で返す）
         return {
             'statusCode': 200,
-            'headers': headers,
+            'headers': with_query_plan_header(headers, plan),
             'body': json.dumps({
                 'items': clients,
-                'count': len(clients)
+                'count': len(clients),
+                'next_page_token': next_page_token
             }, ensure_ascii=False, default=str)
         }
     except Exception as e:
@@ -4928,7 +6182,8 @@ def create_client(event, headers):
             body_json = json.loads(body.decode('utf-8'))
         
         # ID生成（5桁形式: CL00001〜）
-        if 'id' not in body_json or not body_json['id']:
+        id_generated = not body_json.get('id')
+        if id_generated:
             client_id = generate_next_id(CLIENTS_TABLE, 'CL')
         else:
             client_id = body_json['id']
@@ -4949,8 +6204,11 @@ def create_client(event, headers):
             'updated_at': now
         }
         
-        # DynamoDBに保存
-        CLIENTS_TABLE.put_item(Item=client_data)
+        # DynamoDBに保存（採番したIDは既存アイテムを上書きしないよう条件付きで書き込む）
+        if id_generated:
+            client_id = put_item_with_new_id(CLIENTS_TABLE, client_data, lambda: generate_next_id(CLIENTS_TABLE, 'CL'))
+        else:
+            CLIENTS_TABLE.put_item(Item=client_data)
         
         return {
             'statusCode': 200,
@@ -5334,7 +6592,8 @@ def create_worker(event, headers):
             }
         
         # ID生成（5桁形式: W00001〜）
-        if 'id' not in body_json or not body_json['id']:
+        id_generated = not body_json.get('id')
+        if id_generated:
             worker_id = generate_next_id(WORKERS_TABLE, 'W')
         else:
             worker_id = body_json['id']
@@ -5396,8 +6655,11 @@ def create_worker(event, headers):
             else:
                 worker_data['role'] = 'cleaning'
         
-        # DynamoDBに保存
-        WORKERS_TABLE.put_item(Item=worker_data)
+        # DynamoDBに保存（採番したIDは既存アイテムを上書きしないよう条件付きで書き込む）
+        if id_generated:
+            worker_id = put_item_with_new_id(WORKERS_TABLE, worker_data, lambda: generate_next_id(WORKERS_TABLE, 'W'))
+        else:
+            WORKERS_TABLE.put_item(Item=worker_data)
         
         return {
             'statusCode': 200,
@@ -5422,92 +6684,589 @@ def create_worker(event, headers):
             }, ensure_ascii=False)
         }
 
-def update_worker(worker_id, event, headers):
+def update_worker(worker_id, event, headers):
+    """
+    従業員を更新
+    """
+    try:
+        # リクエストボディを取得
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(event['body'])
+        else:
+            body = event.get('body', '')
+        
+        if isinstance(body, str):
+            body_json = json.loads(body)
+        else:
+            body_json = json.loads(body.decode('utf-8'))
+        
+        # メールアドレスのバリデーション（メールアドレスが更新される場合）
+        if 'email' in body_json:
+            email = body_json.get('email', '')
+            email_validation = validate_worker_email(email)
+            if not email_validation['valid']:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({
+                        'error': email_validation['message']
+                    }, ensure_ascii=False)
+                }
+        
+        # 既存の従業員を取得
+        response = WORKERS_TABLE.get_item(Key={'id': worker_id})
+        if 'Item' not in response:
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'body': json.dumps({
+                    'error': '従業員が見つかりません'
+                }, ensure_ascii=False)
+            }
+        
+        existing_item = response['Item']
+        
+        # 更新可能なフィールドを更新
+        update_expression_parts = []
+        expression_attribute_values = {}
+        expression_attribute_names = {}
+        
+        updatable_fields = [
+            'name', 'email', 'phone', 'role', 'role_code', 'department', 'job', 'status',
+            'scheduled_start_time', 'scheduled_end_time', 'scheduled_work_hours', 'work_pattern'
+        ]
+        
+        for field in updatable_fields:
+            if field in body_json:
+                update_expression_parts.append(f"#{field} = :{field}")
+                expression_attribute_names[f"#{field}"] = field
+                expression_attribute_values[f":{field}"] = body_json[field]
+        
+        # updated_atを更新
+        update_expression_parts.append("#updated_at = :updated_at")
+        expression_attribute_names["#updated_at"] = "updated_at"
+        expression_attribute_values[":updated_at"] = datetime.utcnow().isoformat() + 'Z'
+        
+        if update_expression_parts:
+            WORKERS_TABLE.update_item(
+                Key={'id': worker_id},
+                UpdateExpression='SET ' + ', '.join(update_expression_parts),
+                ExpressionAttributeNames=expression_attribute_names,
+                ExpressionAttributeValues=expression_attribute_values
+            )
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'status': 'success',
+                'message': '従業員を更新しました'
+            }, ensure_ascii=False)
+        }
+    except Exception as e:
+        print(f"Error updating worker: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({
+                'error': '従業員の更新に失敗しました',
+                'message': str(e)
+            }, ensure_ascii=False)
+        }
+
+# ==================== 勤怠の月次集計 ====================
+# 従業員ごと・月ごとの集計アイテム（attendance-monthly-summaries）を勤怠記録の書き込みのたびに差分で更新する
+# - キー: staff_id + month（YYYY-MM、勤怠記録の date の月）
+# - 勤怠記録の変更前後の値から差分を求め、ADD で加算する（日付が変わった場合は旧月から減算して新月に加算）
+# - 給与計算・エクスポートは従業員数分の集計アイテムを読むだけでよい（日次の勤怠記録を読まない）
+# - 集計がずれた場合は rebuild_attendance_summary（scripts/backfill_attendance_summaries.py）で作り直す
+ATTENDANCE_SUMMARY_SUM_FIELDS = ['work_hours', 'overtime_hours', 'total_hours', 'break_time', 'late_minutes', 'early_leave_minutes']
+ATTENDANCE_SUMMARY_COUNT_FIELDS = {
+    'late_count': 'is_late',
+    'early_leave_count': 'is_early_leave',
+    'holiday_work_count': 'is_holiday_work'
+}
+
+def _attendance_summary_decimal(value):
+    try:
+        return Decimal(str(value)) if value not in (None, '') else Decimal('0')
+    except Exception:
+        return Decimal('0')
+
+def attendance_summary_contribution(record):
+    """勤怠記録1件が月次集計に加える値 -> ((staff_id, month), {項目: 値})（集計対象外の場合は None）"""
+    if not record or not record.get('staff_id') or not record.get('date'):
+        return None
+    values = {field: _attendance_summary_decimal(record.get(field)) for field in ATTENDANCE_SUMMARY_SUM_FIELDS}
+    for count_field, flag_field in ATTENDANCE_SUMMARY_COUNT_FIELDS.items():
+        values[count_field] = Decimal('1') if record.get(flag_field) else Decimal('0')
+    values['record_count'] = Decimal('1')
+    values['completed_count'] = Decimal('1') if record.get('status') == 'completed' else Decimal('0')
+    return (record['staff_id'], str(record['date'])[:7]), values
+
+def apply_attendance_summary_delta(old_record, new_record):
+    """勤怠記録の変更前後の差分を月次集計に加算（失敗しても勤怠記録の保存は成功扱い）"""
+    deltas = {}
+    for record, sign in ((old_record, -1), (new_record, 1)):
+        contribution = attendance_summary_contribution(record)
+        if not contribution:
+            continue
+        key, values = contribution
+        delta = deltas.setdefault(key, {})
+        for field, value in values.items():
+            delta[field] = delta.get(field, Decimal('0')) + sign * value
+
+    now = datetime.utcnow().isoformat() + 'Z'
+    staff_name = (new_record or old_record or {}).get('staff_name')
+    for (staff_id, month), delta in deltas.items():
+        delta = {field: value for field, value in delta.items() if value != 0}
+        if not delta:
+            continue
+        names = {f'#{field}': field for field in delta}
+        values = {f':{field}': value for field, value in delta.items()}
+        set_parts = ['#updated_at = :updated_at']
+        names['#updated_at'] = 'updated_at'
+        values[':updated_at'] = now
+        if staff_name:
+            set_parts.append('#staff_name = :staff_name')
+            names['#staff_name'] = 'staff_name'
+            values[':staff_name'] = staff_name
+        try:
+            ATTENDANCE_SUMMARIES_TABLE.update_item(
+                Key={'staff_id': staff_id, 'month': month},
+                UpdateExpression='ADD ' + ', '.join(f'#{field} :{field}' for field in delta) + ' SET ' + ', '.join(set_parts),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+        except Exception as e:
+            print(f"Warning: Failed to update attendance summary {staff_id} {month}: {str(e)}")
+
+def update_attendance_record(attendance_id, update_expression_parts, expression_attribute_names, expression_attribute_values):
+    """勤怠記録を SET で更新し、月次集計に差分を反映（戻り値: 更新後の勤怠記録）"""
+    response = ATTENDANCE_TABLE.update_item(
+        Key={'id': attendance_id},
+        UpdateExpression='SET ' + ', '.join(update_expression_parts),
+        ExpressionAttributeNames=expression_attribute_names,
+        ExpressionAttributeValues=expression_attribute_values,
+        ReturnValues='ALL_OLD'
+    )
+    old_record = response.get('Attributes')
+    new_record = dict(old_record or {'id': attendance_id})
+    # update_expression_parts は "#項目 = :値" の形式
+    for part in update_expression_parts:
+        name, value = [token.strip() for token in part.split('=', 1)]
+        new_record[expression_attribute_names.get(name, name)] = expression_attribute_values[value]
+    apply_attendance_summary_delta(old_record, new_record)
+    return new_record
+
+def delete_attendance_record(attendance_id):
+    """勤怠記録を削除し、月次集計から差し引く（戻り値: 削除した勤怠記録）"""
+    response = ATTENDANCE_TABLE.delete_item(Key={'id': attendance_id}, ReturnValues='ALL_OLD')
+    old_record = response.get('Attributes')
+    apply_attendance_summary_delta(old_record, None)
+    return old_record
+
+def rebuild_attendance_summary(staff_id, month):
+    """1人・1か月分の集計を勤怠記録から作り直す（差分更新がずれた場合の修復用）"""
+    plan = plan_list_query('attendance', {'staff_id': staff_id}, {'date': (f'{month}-01', f'{month}-31')})
+    records, _ = execute_list_plan(ATTENDANCE_TABLE, plan)
+    summary = {'staff_id': staff_id, 'month': month}
+    for field in ATTENDANCE_SUMMARY_SUM_FIELDS + list(ATTENDANCE_SUMMARY_COUNT_FIELDS) + ['record_count', 'completed_count']:
+        summary[field] = Decimal('0')
+    for record in records:
+        contribution = attendance_summary_contribution(record)
+        if not contribution:
+            continue
+        for field, value in contribution[1].items():
+            summary[field] += value
+        if record.get('staff_name'):
+            summary['staff_name'] = record['staff_name']
+    summary['updated_at'] = datetime.utcnow().isoformat() + 'Z'
+    ATTENDANCE_SUMMARIES_TABLE.put_item(Item=summary)
+    return summary
+
+def get_attendance_summaries(event, headers):
+    """
+    勤怠の月次集計を取得（給与計算用）
+    - month（YYYY-MM）は必須、staff_id を指定した場合はその従業員のみ
+    """
+    try:
+        query_params = event.get('queryStringParameters') or {}
+        month = query_params.get('month')
+        staff_id = query_params.get('staff_id')
+        
+        try:
+            datetime.strptime(month or '', '%Y-%m')
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({
+                    'error': 'monthはYYYY-MM形式で指定してください',
+                    'code': 'VALIDATION_ERROR'
+                }, ensure_ascii=False)
+            }
+        
+        plan = plan_list_query('attendance-monthly-summaries', {'month': month, 'staff_id': staff_id})
+        try:
+            summaries, next_page_token, plan = execute_list_request(ATTENDANCE_SUMMARIES_TABLE, plan, query_params)
+        except ValueError:
+            return invalid_page_token_response(headers)
+        
+        return {
+            'statusCode': 200,
+            'headers': with_query_plan_header(headers, plan),
+            'body': dumps_json({
+                'month': month,
+                'summaries': summaries,
+                'count': len(summaries),
+                'next_page_token': next_page_token
+            })
+        }
+    except Exception as e:
+        print(f"Error getting attendance summaries: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({
+                'error': '勤怠の月次集計の取得に失敗しました',
+                'message': str(e)
+            }, ensure_ascii=False)
+        }
+
+# ==================== 勤怠の計算エンジン ====================
+# 出退勤時刻・休憩時間・所定時刻から、勤怠記録の計算項目（労働時間・残業・遅刻・早退・休日出勤・状態）を求める
+# - 打刻（create_or_update_attendance）は compute_attendance_metrics で1件ずつ計算する
+# - 月次の再計算（recompute_attendance_month）は列ごとの配列をまとめて compute_attendance_metrics_batch に渡す
+#   NumPy がある場合は全件を1回のベクトル演算で計算し、ない場合は1件ずつの計算にフォールバックする
+# - どちらも _attendance_metrics_row と同じ式（時刻は UTC のエポック秒、所定時刻は JST の0時からの分）
+# - 遅刻・早退は、打刻時刻の JST の日付における所定開始・終了時刻と比較する
+JST_OFFSET_SECONDS = 9 * 3600
+ATTENDANCE_RECOMPUTE_FIELDS = [
+    'break_time', 'total_hours', 'work_hours', 'overtime_hours',
+    'is_late', 'late_minutes', 'is_early_leave', 'early_leave_minutes',
+    'is_holiday', 'is_holiday_work', 'status'
+]
+ATTENDANCE_RECOMPUTE_WRITE_WORKERS = int(os.environ.get('ATTENDANCE_RECOMPUTE_WRITE_WORKERS', '8'))
+
+def _attendance_epoch(value):
+    """ISO8601 の時刻をエポック秒に変換（未指定・不正な値は None、タイムゾーンなしは UTC とみなす）"""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def _schedule_minutes(value):
+    """所定時刻（HH:MM）を JST の0時からの分に変換（未指定・不正な値は None）"""
+    if not value:
+        return None
+    try:
+        hour, minute = map(int, str(value).split(':'))
+        return hour * 60 + minute
+    except (ValueError, AttributeError) as e:
+        print(f"Error parsing scheduled time {value}: {str(e)}")
+        return None
+
+def _jst_day_start(epoch):
+    """エポック秒の JST の日付の0時（エポック秒）"""
+    return (epoch + JST_OFFSET_SECONDS) // 86400 * 86400 - JST_OFFSET_SECONDS
+
+def _attendance_metrics_row(clock_in, clock_out, break_hours, scheduled_start, scheduled_end, scheduled_work_hours, is_holiday):
+    """1件分の計算（引数はエポック秒・時間・分、未指定は None）"""
+    metrics = {
+        'total_hours': 0, 'work_hours': 0, 'overtime_hours': 0,
+        'is_late': False, 'late_minutes': 0, 'is_early_leave': False, 'early_leave_minutes': 0,
+        'is_holiday': bool(is_holiday), 'is_holiday_work': bool(is_holiday) and clock_in is not None
+    }
+    if clock_in is not None and scheduled_start is not None:
+        scheduled_at = _jst_day_start(clock_in) + scheduled_start * 60
+        if clock_in > scheduled_at:
+            metrics['is_late'] = True
+            metrics['late_minutes'] = int((clock_in - scheduled_at) / 60)
+    if clock_out is not None and scheduled_end is not None:
+        scheduled_at = _jst_day_start(clock_out) + scheduled_end * 60
+        if clock_out < scheduled_at:
+            metrics['is_early_leave'] = True
+            metrics['early_leave_minutes'] = int((scheduled_at - clock_out) / 60)
+    if clock_in is not None and clock_out is not None:
+        metrics['total_hours'] = (clock_out - clock_in) / 3600
+        metrics['work_hours'] = max(0, metrics['total_hours'] - break_hours)
+        metrics['overtime_hours'] = max(0, metrics['work_hours'] - scheduled_work_hours)
+        metrics['status'] = 'completed'
+    elif clock_in is not None:
+        metrics['status'] = 'working'
+    else:
+        metrics['status'] = 'absent'
+    return metrics
+
+def compute_attendance_metrics(clock_in, clock_out, break_hours=0, scheduled_start_time=None,
+                               scheduled_end_time=None, scheduled_work_hours=8.0, is_holiday=False):
+    """1件分の勤怠の計算項目を求める（時刻は ISO8601、所定時刻は HH:MM）"""
+    return _attendance_metrics_row(
+        _attendance_epoch(clock_in), _attendance_epoch(clock_out), float(break_hours or 0),
+        _schedule_minutes(scheduled_start_time), _schedule_minutes(scheduled_end_time),
+        float(scheduled_work_hours), is_holiday
+    )
+
+def compute_attendance_metrics_batch(columns):
+    """
+    複数件の勤怠の計算項目をまとめて求める（副作用なし）
+    columns: {'clock_in', 'clock_out', 'break_hours', 'scheduled_start', 'scheduled_end',
+              'scheduled_work_hours', 'is_holiday'} の同じ長さのリスト（未指定は None）
+    戻り値: {項目: リスト}（_attendance_metrics_row と同じ項目）
+    """
+    count = len(columns['clock_in'])
+    if not NUMPY_AVAILABLE:
+        rows = [
+            _attendance_metrics_row(*(columns[name][i] for name in (
+                'clock_in', 'clock_out', 'break_hours', 'scheduled_start', 'scheduled_end',
+                'scheduled_work_hours', 'is_holiday')))
+            for i in range(count)
+        ]
+        return {field: [row[field] for row in rows] for field in rows[0]} if rows else {}
+
+    def column(name):
+        return np.array([np.nan if v is None else v for v in columns[name]], dtype=np.float64)
+
+    clock_in = column('clock_in')
+    clock_out = column('clock_out')
+    break_hours = column('break_hours')
+    scheduled_start = column('scheduled_start')
+    scheduled_end = column('scheduled_end')
+    scheduled_work_hours = column('scheduled_work_hours')
+    is_holiday = np.array(columns['is_holiday'], dtype=bool)
+    has_in = ~np.isnan(clock_in)
+    has_out = ~np.isnan(clock_out)
+    completed = has_in & has_out
+
+    # NaN との比較は False になるため、未打刻・所定時刻なしの行は遅刻・早退にならない
+    with np.errstate(invalid='ignore'):
+        late_seconds = clock_in - (_jst_day_start(clock_in) + scheduled_start * 60)
+        early_seconds = (_jst_day_start(clock_out) + scheduled_end * 60) - clock_out
+        is_late = late_seconds > 0
+        is_early_leave = early_seconds > 0
+    total_hours = np.where(completed, (clock_out - clock_in) / 3600, 0.0)
+    work_hours = np.where(completed, np.maximum(0.0, total_hours - break_hours), 0.0)
+    overtime_hours = np.where(completed, np.maximum(0.0, work_hours - scheduled_work_hours), 0.0)
+    status = np.where(completed, 'completed', np.where(has_in, 'working', 'absent'))
+
+    return {
+        'total_hours': total_hours.tolist(),
+        'work_hours': work_hours.tolist(),
+        'overtime_hours': overtime_hours.tolist(),
+        'is_late': is_late.tolist(),
+        'late_minutes': np.where(is_late, np.trunc(np.nan_to_num(late_seconds) / 60), 0).astype(np.int64).tolist(),
+        'is_early_leave': is_early_leave.tolist(),
+        'early_leave_minutes': np.where(is_early_leave, np.trunc(np.nan_to_num(early_seconds) / 60), 0).astype(np.int64).tolist(),
+        'is_holiday': is_holiday.tolist(),
+        'is_holiday_work': (is_holiday & has_in).tolist(),
+        'status': status.tolist()
+    }
+
+def attendance_break_hours(breaks):
+    """休憩の配列から総休憩時間（時間）を求める"""
+    return sum(float(b.get('break_duration', 0)) for b in (breaks or []) if isinstance(b, dict))
+
+def attendance_metrics_fields(metrics, break_hours):
+    """計算結果を勤怠記録に保存する値に変換（0・False の項目は含めない）"""
+    fields = {'status': metrics['status']}
+    for field, value in (('break_time', break_hours), ('total_hours', metrics['total_hours']),
+                         ('work_hours', metrics['work_hours']), ('overtime_hours', metrics['overtime_hours'])):
+        if value > 0:
+            fields[field] = Decimal(str(round(float(value), 2)))
+    for flag, minutes in (('is_late', 'late_minutes'), ('is_early_leave', 'early_leave_minutes')):
+        if metrics[flag]:
+            fields[flag] = True
+            fields[minutes] = int(metrics[minutes])
+    for flag in ('is_holiday', 'is_holiday_work'):
+        if metrics[flag]:
+            fields[flag] = True
+    return fields
+
+def write_recomputed_attendance(record, fields, now):
+    """
+    再計算した項目だけを update_item で書き込む（計算結果にない項目は REMOVE）
+    書き込んだ場合は打刻時と同じく、更新前後の差分を月次集計に ADD で反映する
+    読み込み時から updated_at が変わった記録（打刻・修正と競合）は書き込まず False を返す
+    """
+    set_parts = ['#updated_at = :now']
+    remove_parts = []
+    names = {'#updated_at': 'updated_at'}
+    values = {':now': now}
+    for i, field in enumerate(ATTENDANCE_RECOMPUTE_FIELDS):
+        if field in fields:
+            names[f'#f{i}'] = field
+            set_parts.append(f'#f{i} = :f{i}')
+            values[f':f{i}'] = fields[field]
+        elif field in record:
+            names[f'#f{i}'] = field
+            remove_parts.append(f'#f{i}')
+    if 'updated_at' in record:
+        condition = 'attribute_exists(id) AND #updated_at = :read_updated_at'
+        values[':read_updated_at'] = record['updated_at']
+    else:
+        condition = 'attribute_exists(id) AND attribute_not_exists(#updated_at)'
+    update_expression = 'SET ' + ', '.join(set_parts)
+    if remove_parts:
+        update_expression += ' REMOVE ' + ', '.join(remove_parts)
+    try:
+        response = ATTENDANCE_TABLE.update_item(
+            Key={'id': record['id']},
+            UpdateExpression=update_expression,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_OLD'
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        return False
+    old_record = response.get('Attributes') or record
+    new_record = {k: v for k, v in old_record.items() if k not in ATTENDANCE_RECOMPUTE_FIELDS}
+    new_record.update({field: fields[field] for field in ATTENDANCE_RECOMPUTE_FIELDS if field in fields})
+    new_record['updated_at'] = now
+    apply_attendance_summary_delta(old_record, new_record)
+    return True
+
+def recompute_attendance_month(month, staff_id=None, dry_run=False):
+    """
+    1か月分の勤怠記録の計算項目を、現在の所定時刻・休日で再計算して保存
+    - 計算結果が変わった記録だけ、計算項目を updated_at が読み込み時のままであることを条件に並列で書き込み、
+      月次集計には記録ごとの差分を反映する（その間に打刻・修正された記録は上書きせず skipped に数える）
+    - 当日の勤務中（退勤前）の記録は打刻と競合するため対象外
+    """
+    started = time.time()
+    plan = plan_list_query('attendance', {'staff_id': staff_id}, {'date': (f'{month}-01', f'{month}-31')})
+    records, _ = execute_list_plan(ATTENDANCE_TABLE, plan)
+    today = (datetime.now(timezone.utc) + timedelta(hours=9)).strftime('%Y-%m-%d')
+    records = [r for r in records if r.get('staff_id') and not (r.get('date') == today and not r.get('clock_out'))]
+
+    workers = batch_get_items(WORKERS_TABLE, 'id', [r['staff_id'] for r in records])
+    columns = {name: [] for name in ('clock_in', 'clock_out', 'break_hours', 'scheduled_start',
+                                      'scheduled_end', 'scheduled_work_hours', 'is_holiday')}
+    break_hours = []
+    for record in records:
+        worker = workers.get(record['staff_id'])
+        record_break_hours = attendance_break_hours(record.get('breaks'))
+        break_hours.append(record_break_hours)
+        columns['clock_in'].append(_attendance_epoch(record.get('clock_in')))
+        columns['clock_out'].append(_attendance_epoch(record.get('clock_out')))
+        columns['break_hours'].append(record_break_hours)
+        # 打刻時と同じく、従業員が存在しない場合は遅刻・早退を判定しない
+        columns['scheduled_start'].append(_schedule_minutes(worker.get('scheduled_start_time', '09:00')) if worker else None)
+        columns['scheduled_end'].append(_schedule_minutes(worker.get('scheduled_end_time', '18:00')) if worker else None)
+        columns['scheduled_work_hours'].append(float(worker.get('scheduled_work_hours', 8.0)) if worker else 8.0)
+        columns['is_holiday'].append(is_holiday_date(record.get('date', '')))
+
+    metrics = compute_attendance_metrics_batch(columns)
+    computed_at = time.time()
+
+    now = datetime.utcnow().isoformat() + 'Z'
+    changes = []
+    for i, record in enumerate(records):
+        fields = attendance_metrics_fields({field: values[i] for field, values in metrics.items()}, break_hours[i])
+        before = {field: record[field] for field in ATTENDANCE_RECOMPUTE_FIELDS if field in record}
+        if before != fields:
+            updated = {k: v for k, v in record.items() if k not in ATTENDANCE_RECOMPUTE_FIELDS}
+            updated.update(fields)
+            updated['updated_at'] = now
+            changes.append((record, updated))
+
+    skipped = []
+    if not dry_run and changes:
+        workers = max(1, min(ATTENDANCE_RECOMPUTE_WRITE_WORKERS, len(changes)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            written = list(executor.map(lambda change: write_recomputed_attendance(change[0], change[1], now), changes))
+        skipped = [record.get('id') for (record, _), ok in zip(changes, written) if not ok]
+        changes = [change for change, ok in zip(changes, written) if ok]
+        if skipped:
+            print(f"Warning: Skipped {len(skipped)} attendance records updated during recompute: {', '.join(skipped[:20])}")
+
+    return {
+        'month': month,
+        'staff_id': staff_id,
+        'engine': 'numpy' if NUMPY_AVAILABLE else 'python',
+        'records': len(records),
+        'changed': len(changes),
+        'skipped': skipped,
+        'dry_run': dry_run,
+        'compute_ms': round((computed_at - started) * 1000),
+        'elapsed_ms': round((time.time() - started) * 1000),
+        'changes': [
+            {
+                'id': record.get('id'),
+                'before': {field: record.get(field) for field in ATTENDANCE_RECOMPUTE_FIELDS if field in record},
+                'after': {field: updated[field] for field in ATTENDANCE_RECOMPUTE_FIELDS if field in updated}
+            }
+            for record, updated in changes[:50]
+        ]
+    }
+
+def recompute_attendance(event, headers):
     """
-    従業員を更新
+    勤怠記録の月次再計算（管理者のみ）
+    所定時刻・休日を変更した後に、過去の記録の計算項目を作り直す
+    body: {'month': 'YYYY-MM', 'staff_id': 任意, 'dry_run': 任意}
     """
     try:
-        # リクエストボディを取得
+        auth_header = event.get('headers', {}).get('Authorization') or event.get('headers', {}).get('authorization', '')
+        id_token = auth_header.replace('Bearer ', '') if auth_header else ''
+        user_info = verify_firebase_token(id_token)
+        if not user_info or not user_info.get('verified'):
+            return {
+                'statusCode': 401,
+                'headers': headers,
+                'body': json.dumps({'error': 'Unauthorized'}, ensure_ascii=False)
+            }
+        if not check_admin_permission(user_info):
+            return {
+                'statusCode': 403,
+                'headers': headers,
+                'body': json.dumps({'error': 'Forbidden: Admin access required'}, ensure_ascii=False)
+            }
+        
         if event.get('isBase64Encoded'):
             body = base64.b64decode(event['body'])
         else:
-            body = event.get('body', '')
+            body = event.get('body', '') or '{}'
         
         if isinstance(body, str):
             body_json = json.loads(body)
         else:
             body_json = json.loads(body.decode('utf-8'))
         
-        # メールアドレスのバリデーション（メールアドレスが更新される場合）
-        if 'email' in body_json:
-            email = body_json.get('email', '')
-            email_validation = validate_worker_email(email)
-            if not email_validation['valid']:
-                return {
-                    'statusCode': 400,
-                    'headers': headers,
-                    'body': json.dumps({
-                        'error': email_validation['message']
-                    }, ensure_ascii=False)
-                }
-        
-        # 既存の従業員を取得
-        response = WORKERS_TABLE.get_item(Key={'id': worker_id})
-        if 'Item' not in response:
+        month = body_json.get('month')
+        try:
+            datetime.strptime(month or '', '%Y-%m')
+        except ValueError:
             return {
-                'statusCode': 404,
+                'statusCode': 400,
                 'headers': headers,
                 'body': json.dumps({
-                    'error': '従業員が見つかりません'
+                    'error': 'monthはYYYY-MM形式で指定してください',
+                    'code': 'VALIDATION_ERROR'
                 }, ensure_ascii=False)
             }
         
-        existing_item = response['Item']
-        
-        # 更新可能なフィールドを更新
-        update_expression_parts = []
-        expression_attribute_values = {}
-        expression_attribute_names = {}
-        
-        updatable_fields = [
-            'name', 'email', 'phone', 'role', 'role_code', 'department', 'job', 'status',
-            'scheduled_start_time', 'scheduled_end_time', 'scheduled_work_hours', 'work_pattern'
-        ]
-        
-        for field in updatable_fields:
-            if field in body_json:
-                update_expression_parts.append(f"#{field} = :{field}")
-                expression_attribute_names[f"#{field}"] = field
-                expression_attribute_values[f":{field}"] = body_json[field]
-        
-        # updated_atを更新
-        update_expression_parts.append("#updated_at = :updated_at")
-        expression_attribute_names["#updated_at"] = "updated_at"
-        expression_attribute_values[":updated_at"] = datetime.utcnow().isoformat() + 'Z'
-        
-        if update_expression_parts:
-            WORKERS_TABLE.update_item(
-                Key={'id': worker_id},
-                UpdateExpression='SET ' + ', '.join(update_expression_parts),
-                ExpressionAttributeNames=expression_attribute_names,
-                ExpressionAttributeValues=expression_attribute_values
-            )
-        
+        result = recompute_attendance_month(month, body_json.get('staff_id'), bool(body_json.get('dry_run')))
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': json.dumps({
-                'status': 'success',
-                'message': '従業員を更新しました'
-            }, ensure_ascii=False)
+            'body': dumps_json(result)
         }
     except Exception as e:
-        print(f"Error updating worker: {str(e)}")
+        print(f"Error recomputing attendance: {str(e)}")
         return {
             'statusCode': 500,
             'headers': headers,
             'body': json.dumps({
-                'error': '従業員の更新に失敗しました',
+                'error': '勤怠記録の再計算に失敗しました',
                 'message': str(e)
             }, ensure_ascii=False)
         }
@@ -5525,7 +7284,8 @@ def get_attendance(event, headers):
         date_to = query_params.get('date_to')
         year = query_params.get('year')
         month = query_params.get('month')
-        limit = int(query_params.get('limit', 100))
+        limit = parse_page_size(query_params, 100)
+        page_token = query_params.get('page_token')
         
         if staff_id and date:
             # 特定の従業員の特定日の勤怠記録を取得
@@ -5547,92 +7307,37 @@ def get_attendance(event, headers):
                     }, ensure_ascii=False)
                 }
         else:
-            # フィルタリング条件を構築
-            filter_expressions = []
-            expression_attribute_values = {}
-            expression_attribute_names = {}
-            
-            if staff_id:
-                filter_expressions.append("#staff_id = :staff_id")
-                expression_attribute_names["#staff_id"] = "staff_id"
-                expression_attribute_values[":staff_id"] = staff_id
-            
-            if date_from:
-                filter_expressions.append("#date >= :date_from")
-                expression_attribute_names["#date"] = "date"
-                expression_attribute_values[":date_from"] = date_from
-            
-            if date_to:
-                filter_expressions.append("#date <= :date_to")
-                if "#date" not in expression_attribute_names:
-                    expression_attribute_names["#date"] = "date"
-                expression_attribute_values[":date_to"] = date_to
-            
+            # 日付範囲を構築（date_from/date_to と year/month の両方が指定された場合は重なる範囲）
+            range_from = date_from
+            range_to = date_to
             if year and month:
-                # 月次フィルタリング
+                # 月次フィルタリング（YYYY-MM-DD の文字列比較のため月末は31日で代用）
                 month_start = f"{year}-{month.zfill(2)}-01"
-                # 次の月の1日を計算
-                next_month = int(month) + 1
-                next_year = int(year)
-                if next_month > 12:
-                    next_month = 1
-                    next_year += 1
-                month_end = f"{next_year}-{str(next_month).zfill(2)}-01"
-                
-                filter_expressions.append("#date >= :month_start")
-                filter_expressions.append("#date < :month_end")
-                if "#date" not in expression_attribute_names:
-                    expression_attribute_names["#date"] = "date"
-                expression_attribute_values[":month_start"] = month_start
-                expression_attribute_values[":month_end"] = month_end
+                month_end = f"{year}-{month.zfill(2)}-31"
+                range_from = max(range_from, month_start) if range_from else month_start
+                range_to = min(range_to, month_end) if range_to else month_end
             
-            # スキャンまたはクエリを実行
-            if staff_id and 'staff_id-date-index' in [idx['IndexName'] for idx in ATTENDANCE_TABLE.meta.client.describe_table(TableName='attendance').get('Table', {}).get('GlobalSecondaryIndexes', [])]:
-                # GSIを使用してクエリ
-                try:
-                    response = ATTENDANCE_TABLE.query(
-                        IndexName='staff_id-date-index',
-                        KeyConditionExpression=Key('staff_id').eq(staff_id),
-                        FilterExpression=' AND '.join(filter_expressions) if filter_expressions else None,
-                        ExpressionAttributeNames=expression_attribute_names if expression_attribute_names else None,
-                        ExpressionAttributeValues=expression_attribute_values if expression_attribute_values else None,
-                        ScanIndexForward=False,
-                        Limit=limit
-                    )
-                except Exception as e:
-                    # GSIが存在しない場合はスキャンにフォールバック
-                    print(f"GSI query failed, falling back to scan: {str(e)}")
-                    if filter_expressions:
-                        response = ATTENDANCE_TABLE.scan(
-                            FilterExpression=' AND '.join(filter_expressions),
-                            ExpressionAttributeNames=expression_attribute_names,
-                            ExpressionAttributeValues=expression_attribute_values,
-                            Limit=limit
-                        )
-                    else:
-                        response = ATTENDANCE_TABLE.scan(Limit=limit)
-            else:
-                # スキャンでフィルタリング
-                if filter_expressions:
-                    response = ATTENDANCE_TABLE.scan(
-                        FilterExpression=' AND '.join(filter_expressions),
-                        ExpressionAttributeNames=expression_attribute_names,
-                        ExpressionAttributeValues=expression_attribute_values,
-                        Limit=limit
-                    )
-                else:
-                    response = ATTENDANCE_TABLE.scan(Limit=limit)
+            # スキーマレジストリのGSI情報からクエリまたはスキャンを選択
+            plan = plan_list_query(
+                'attendance',
+                {'staff_id': staff_id},
+                {'date': (range_from, range_to)}
+            )
+            try:
+                items, next_page_token, plan = execute_list_page(ATTENDANCE_TABLE, plan, limit, page_token, descending=True)
+            except ValueError:
+                return invalid_page_token_response(headers)
             
-            items = response.get('Items', [])
             # 日付でソート（新しい順）
             items.sort(key=lambda x: x.get('date', ''), reverse=True)
             
             return {
                 'statusCode': 200,
-                'headers': headers,
+                'headers': with_query_plan_header(headers, plan),
                 'body': json.dumps({
                     'attendance': items,
-                    'count': len(items)
+                    'count': len(items),
+                    'next_page_token': next_page_token
                 }, ensure_ascii=False, default=str)
             }
     except Exception as e:
@@ -5902,7 +7607,7 @@ def create_or_update_attendance(event, headers):
             processed_breaks = existing_breaks
         
         # 総休憩時間を計算
-        total_break_hours = sum(b.get('break_duration', 0) for b in processed_breaks if isinstance(b, dict))
+        total_break_hours = attendance_break_hours(processed_breaks)
         
         # 従業員の所定労働時間を取得
         scheduled_start_time = None
@@ -5919,92 +7624,29 @@ def create_or_update_attendance(event, headers):
         except Exception as e:
             print(f"Error fetching worker info: {str(e)}")
         
-        # 遅刻・早退の判定
-        is_late = False
-        late_minutes = 0
-        is_early_leave = False
-        early_leave_minutes = 0
-        
-        if clock_in and scheduled_start_time:
-            try:
-                clock_in_dt = datetime.fromisoformat(clock_in.replace('Z', '+00:00'))
-                # 日付部分を取得（UTC+9に変換）
-                clock_in_jst = clock_in_dt + timedelta(hours=9)
-                date_str = clock_in_jst.strftime('%Y-%m-%d')
-                
-                # 所定開始時刻を取得（JST）
-                scheduled_hour, scheduled_minute = map(int, scheduled_start_time.split(':'))
-                scheduled_dt_jst = datetime.strptime(f"{date_str} {scheduled_hour:02d}:{scheduled_minute:02d}", '%Y-%m-%d %H:%M')
-                scheduled_dt_utc = scheduled_dt_jst - timedelta(hours=9)
-                scheduled_dt_utc = scheduled_dt_utc.replace(tzinfo=timezone.utc)
-                
-                if clock_in_dt > scheduled_dt_utc:
-                    is_late = True
-                    late_minutes = int((clock_in_dt - scheduled_dt_utc).total_seconds() / 60)
-            except (ValueError, AttributeError) as e:
-                print(f"Error calculating late time: {str(e)}")
-        
-        if clock_out and scheduled_end_time:
-            try:
-                clock_out_dt = datetime.fromisoformat(clock_out.replace('Z', '+00:00'))
-                # 日付部分を取得（UTC+9に変換）
-                clock_out_jst = clock_out_dt + timedelta(hours=9)
-                date_str = clock_out_jst.strftime('%Y-%m-%d')
-                
-                # 所定終了時刻を取得（JST）
-                scheduled_hour, scheduled_minute = map(int, scheduled_end_time.split(':'))
-                scheduled_dt_jst = datetime.strptime(f"{date_str} {scheduled_hour:02d}:{scheduled_minute:02d}", '%Y-%m-%d %H:%M')
-                scheduled_dt_utc = scheduled_dt_jst - timedelta(hours=9)
-                scheduled_dt_utc = scheduled_dt_utc.replace(tzinfo=timezone.utc)
-                
-                if clock_out_dt < scheduled_dt_utc:
-                    is_early_leave = True
-                    early_leave_minutes = int((scheduled_dt_utc - clock_out_dt).total_seconds() / 60)
-            except (ValueError, AttributeError) as e:
-                print(f"Error calculating early leave time: {str(e)}")
-        
-        # 労働時間を計算
-        total_hours = 0
-        work_hours = 0
-        overtime_hours = 0
-        
-        if clock_in and clock_out:
-            try:
-                clock_in_dt = datetime.fromisoformat(clock_in.replace('Z', '+00:00'))
-                clock_out_dt = datetime.fromisoformat(clock_out.replace('Z', '+00:00'))
-                total_hours = (clock_out_dt - clock_in_dt).total_seconds() / 3600
-                work_hours = max(0, total_hours - total_break_hours)
-                # 残業時間（所定労働時間超過分）
-                overtime_hours = max(0, work_hours - scheduled_work_hours)
-            except (ValueError, AttributeError):
-                pass
-        
         # 休日判定
         is_holiday = False
-        is_holiday_work = False
         
         try:
-            # 日付で休日を検索
-            holiday_response = HOLIDAYS_TABLE.query(
-                IndexName='date-index',
-                KeyConditionExpression=Key('date').eq(date)
-            )
-            if holiday_response.get('Items'):
-                is_holiday = True
-                # 出退勤記録がある場合は休日出勤
-                if clock_in:
-                    is_holiday_work = True
+            # 休日カレンダー（コンテナ内）で判定
+            is_holiday = is_holiday_date(date)
         except Exception as e:
             print(f"Error checking holiday: {str(e)}")
         
-        # 勤務状態を判定
-        status = 'working'
-        if clock_in and clock_out:
-            status = 'completed'
-        elif clock_in:
-            status = 'working'
-        else:
-            status = 'absent'
+        # 遅刻・早退・労働時間・休日出勤・勤務状態を計算（勤怠の計算エンジン）
+        metrics = compute_attendance_metrics(
+            clock_in, clock_out, total_break_hours,
+            scheduled_start_time, scheduled_end_time, scheduled_work_hours, is_holiday
+        )
+        is_late = metrics['is_late']
+        late_minutes = metrics['late_minutes']
+        is_early_leave = metrics['is_early_leave']
+        early_leave_minutes = metrics['early_leave_minutes']
+        total_hours = metrics['total_hours']
+        work_hours = metrics['work_hours']
+        overtime_hours = metrics['overtime_hours']
+        is_holiday_work = metrics['is_holiday_work']
+        status = metrics['status']
         
         if existing_item:
             # 既存の記録を更新
@@ -6081,12 +7723,7 @@ def create_or_update_attendance(event, headers):
             expression_attribute_names["#updated_at"] = "updated_at"
             expression_attribute_values[":updated_at"] = now
             
-            ATTENDANCE_TABLE.update_item(
-                Key={'id': attendance_id},
-                UpdateExpression='SET ' + ', '.join(update_expression_parts),
-                ExpressionAttributeNames=expression_attribute_names,
-                ExpressionAttributeValues=expression_attribute_values
-            )
+            update_attendance_record(attendance_id, update_expression_parts, expression_attribute_names, expression_attribute_values)
         else:
             # 新規作成
             attendance_data = {
@@ -6121,6 +7758,7 @@ def create_or_update_attendance(event, headers):
                     Item=attendance_data,
                     ConditionExpression='attribute_not_exists(id)'
                 )
+                apply_attendance_summary_delta(None, attendance_data)
             except ATTENDANCE_TABLE.meta.client.exceptions.ConditionalCheckFailedException:
                 # 既にレコードが存在する場合は更新処理に切り替え
                 print(f"Record {attendance_id} already exists, switching to update")
@@ -6201,12 +7839,7 @@ def create_or_update_attendance(event, headers):
                     expression_attribute_names["#updated_at"] = "updated_at"
                     expression_attribute_values[":updated_at"] = now
                     
-                    ATTENDANCE_TABLE.update_item(
-                        Key={'id': attendance_id},
-                        UpdateExpression='SET ' + ', '.join(update_expression_parts),
-                        ExpressionAttributeNames=expression_attribute_names,
-                        ExpressionAttributeValues=expression_attribute_values
-                    )
+                    update_attendance_record(attendance_id, update_expression_parts, expression_attribute_names, expression_attribute_values)
         
         return {
             'statusCode': 200,
@@ -6678,7 +8311,7 @@ def update_attendance_request(request_id, event, headers):
             # 削除依頼の場合は、タイムカードを削除
             if action == 'delete' and attendance_id:
                 try:
-                    ATTENDANCE_TABLE.delete_item(Key={'id': attendance_id})
+                    delete_attendance_record(attendance_id)
                     print(f"[UpdateAttendanceRequest] Deleted attendance record {attendance_id} for delete request")
                 except Exception as e:
                     print(f"Error deleting attendance record: {str(e)}")
@@ -6850,12 +8483,7 @@ def update_attendance_request(request_id, event, headers):
                 if update_expression_parts:
                     print(f"[UpdateAttendanceRequest] Updating attendance record with {len(update_expression_parts)} fields")
                     print(f"[UpdateAttendanceRequest] Update expression: SET {', '.join(update_expression_parts)}")
-                    ATTENDANCE_TABLE.update_item(
-                        Key={'id': attendance_id},
-                        UpdateExpression='SET ' + ', '.join(update_expression_parts),
-                        ExpressionAttributeNames=expression_attribute_names,
-                        ExpressionAttributeValues=expression_attribute_values
-                    )
+                    update_attendance_record(attendance_id, update_expression_parts, expression_attribute_names, expression_attribute_values)
                     print(f"[UpdateAttendanceRequest] Attendance record updated successfully")
                 else:
                     print(f"[UpdateAttendanceRequest] No fields to update, skipping")
@@ -6979,12 +8607,7 @@ def update_attendance(attendance_id, event, headers):
         expression_attribute_values[":updated_at"] = datetime.utcnow().isoformat() + 'Z'
         
         if update_expression_parts:
-            ATTENDANCE_TABLE.update_item(
-                Key={'id': attendance_id},
-                UpdateExpression='SET ' + ', '.join(update_expression_parts),
-                ExpressionAttributeNames=expression_attribute_names,
-                ExpressionAttributeValues=expression_attribute_values
-            )
+            update_attendance_record(attendance_id, update_expression_parts, expression_attribute_names, expression_attribute_values)
         
         return {
             'statusCode': 200,
@@ -7010,7 +8633,7 @@ def delete_attendance(attendance_id, headers):
     勤怠記録を削除
     """
     try:
-        ATTENDANCE_TABLE.delete_item(Key={'id': attendance_id})
+        delete_attendance_record(attendance_id)
         return {
             'statusCode': 200,
             'headers': headers,
@@ -7030,6 +8653,166 @@ def delete_attendance(attendance_id, headers):
             }, ensure_ascii=False)
         }
 
+# ==================== 休日カレンダー ====================
+# 休日判定・休日一覧のためのコンテナ内カレンダー
+# - holidays テーブルの登録分と、計算で求めた国民の祝日（NATIONAL_HOLIDAY_FIRST_YEAR 〜 翌年）を日付順の配列に保持する
+# - 休日判定・期間指定の一覧は bisect による二分探索（テーブルへの問い合わせなし）
+# - 休日の登録・更新・削除のたびに counters テーブルのバージョン番号を加算し、他のコンテナは次回の確認で読み直す
+# - 国民の祝日と同じ日付に type='national' の登録がある場合は、登録内容を優先する
+HOLIDAY_CALENDAR_VERSION_COUNTER = 'holiday-calendar-version'
+HOLIDAY_CALENDAR_MAX_AGE = int(os.environ.get('HOLIDAY_CALENDAR_MAX_AGE', '3600'))
+# バージョン番号を確認する間隔（秒）。休日の変更は頻繁ではないため、勤怠の打刻ごとには確認しない
+HOLIDAY_CALENDAR_CHECK_INTERVAL = float(os.environ.get('HOLIDAY_CALENDAR_CHECK_INTERVAL', '60'))
+NATIONAL_HOLIDAYS_ENABLED = os.environ.get('NATIONAL_HOLIDAYS_ENABLED', 'true').lower() == 'true'
+# 春分・秋分の日の近似式は 2099年まで有効。2020年以降の祝日法（天皇誕生日 2/23 等）に基づく
+NATIONAL_HOLIDAY_FIRST_YEAR = int(os.environ.get('NATIONAL_HOLIDAY_FIRST_YEAR', '2020'))
+_holiday_calendar_cache = {}
+
+# 東京オリンピック・パラリンピックに伴う特例（海の日・スポーツの日・山の日の移動）
+NATIONAL_HOLIDAY_SPECIAL_DATES = {
+    2020: {'海の日': (7, 23), 'スポーツの日': (7, 24), '山の日': (8, 10)},
+    2021: {'海の日': (7, 22), 'スポーツの日': (7, 23), '山の日': (8, 8)},
+}
+
+def _nth_weekday(year, month, n, weekday=0):
+    """year年month月の第n週の曜日（weekday: 0=月曜）の日付"""
+    first = datetime(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+def japanese_national_holidays(year):
+    """
+    year年の国民の祝日（振替休日・国民の休日を含む）を計算
+    戻り値: [(YYYY-MM-DD, 名称)]（日付順）
+    """
+    if year < NATIONAL_HOLIDAY_FIRST_YEAR or year > 2099:
+        return []
+    offset = year - 1980
+    spring_equinox = int(20.8431 + 0.242194 * offset - offset // 4)
+    autumn_equinox = int(23.2488 + 0.242194 * offset - offset // 4)
+    special = NATIONAL_HOLIDAY_SPECIAL_DATES.get(year, {})
+
+    def moved(name, default):
+        return datetime(year, *special[name]) if name in special else default
+
+    holidays = {
+        datetime(year, 1, 1): '元日',
+        _nth_weekday(year, 1, 2): '成人の日',
+        datetime(year, 2, 11): '建国記念の日',
+        datetime(year, 2, 23): '天皇誕生日',
+        datetime(year, 3, spring_equinox): '春分の日',
+        datetime(year, 4, 29): '昭和の日',
+        datetime(year, 5, 3): '憲法記念日',
+        datetime(year, 5, 4): 'みどりの日',
+        datetime(year, 5, 5): 'こどもの日',
+        moved('海の日', _nth_weekday(year, 7, 3)): '海の日',
+        moved('山の日', datetime(year, 8, 11)): '山の日',
+        _nth_weekday(year, 9, 3): '敬老の日',
+        datetime(year, 9, autumn_equinox): '秋分の日',
+        moved('スポーツの日', _nth_weekday(year, 10, 2)): 'スポーツの日',
+        datetime(year, 11, 3): '文化の日',
+        datetime(year, 11, 23): '勤労感謝の日',
+    }
+
+    # 国民の休日: 前日と翌日が祝日の平日（9月の敬老の日と秋分の日の間など）
+    for day in list(holidays):
+        between = day + timedelta(days=1)
+        if between not in holidays and between + timedelta(days=1) in holidays and between.weekday() != 6:
+            holidays[between] = '国民の休日'
+
+    # 振替休日: 祝日が日曜日の場合、その後の最初の祝日でない日
+    for day in sorted(holidays):
+        if day.weekday() == 6 and holidays[day] != '振替休日':
+            substitute = day + timedelta(days=1)
+            while substitute in holidays:
+                substitute += timedelta(days=1)
+            holidays[substitute] = '振替休日'
+
+    return [(day.strftime('%Y-%m-%d'), name) for day, name in sorted(holidays.items())]
+
+def get_holiday_calendar_version():
+    """休日カレンダーのバージョン番号を取得（未作成の場合は0）"""
+    response = COUNTERS_TABLE.get_item(
+        Key={'counter_id': HOLIDAY_CALENDAR_VERSION_COUNTER},
+        ConsistentRead=True
+    )
+    return int(response.get('Item', {}).get('current_value', 0))
+
+def bump_holiday_calendar_version():
+    """休日カレンダーのバージョン番号を加算し、このコンテナのカレンダーを破棄"""
+    _holiday_calendar_cache.clear()
+    try:
+        COUNTERS_TABLE.update_item(
+            Key={'counter_id': HOLIDAY_CALENDAR_VERSION_COUNTER},
+            UpdateExpression='ADD current_value :n SET updated_at = :now',
+            ExpressionAttributeValues={
+                ':n': 1,
+                ':now': datetime.utcnow().isoformat() + 'Z'
+            }
+        )
+    except Exception as e:
+        # 他のコンテナのカレンダーは HOLIDAY_CALENDAR_MAX_AGE 経過後に作り直される
+        print(f"Warning: Failed to bump holiday calendar version: {str(e)}")
+
+def build_holiday_calendar(items):
+    """holidays テーブルのアイテムと国民の祝日から、日付順の配列（dates と entries は同じ並び）を作成"""
+    entries = [item for item in items if item.get('date')]
+    if NATIONAL_HOLIDAYS_ENABLED:
+        registered_national = {item['date'] for item in entries if item.get('type') == 'national'}
+        for year in range(NATIONAL_HOLIDAY_FIRST_YEAR, datetime.now(timezone.utc).year + 2):
+            for date, name in japanese_national_holidays(year):
+                if date not in registered_national:
+                    entries.append({
+                        'id': f'national-{date}',
+                        'date': date,
+                        'name': name,
+                        'type': 'national',
+                        'computed': True
+                    })
+    entries.sort(key=lambda x: x['date'])
+    return {'dates': [entry['date'] for entry in entries], 'entries': entries}
+
+def get_holiday_calendar():
+    """
+    休日カレンダーを取得（バージョン番号が変わっていればテーブルを読み直す）
+    注意: 戻り値はキャッシュと共有されるため、呼び出し側で変更しないこと
+    """
+    now = time.time()
+    cached = _holiday_calendar_cache.get('calendar')
+    if cached and now - cached['built_at'] < HOLIDAY_CALENDAR_MAX_AGE:
+        if now - cached['checked_at'] < HOLIDAY_CALENDAR_CHECK_INTERVAL:
+            return cached
+        version = get_holiday_calendar_version()
+        if version == cached['version']:
+            cached['checked_at'] = now
+            return cached
+    else:
+        version = get_holiday_calendar_version()
+
+    items = []
+    response = HOLIDAYS_TABLE.scan()
+    items.extend(response.get('Items', []))
+    while 'LastEvaluatedKey' in response:
+        response = HOLIDAYS_TABLE.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        items.extend(response.get('Items', []))
+
+    calendar = build_holiday_calendar(items)
+    calendar.update({'version': version, 'built_at': now, 'checked_at': now})
+    _holiday_calendar_cache['calendar'] = calendar
+    return calendar
+
+def find_holidays(date_from=None, date_to=None):
+    """期間内（両端を含む、省略時は無制限）の休日を日付順に取得"""
+    calendar = get_holiday_calendar()
+    start = bisect_left(calendar['dates'], date_from) if date_from else 0
+    end = bisect_right(calendar['dates'], date_to) if date_to else len(calendar['dates'])
+    return calendar['entries'][start:end]
+
+def is_holiday_date(date):
+    """指定日（YYYY-MM-DD）が休日かどうか"""
+    dates = get_holiday_calendar()['dates']
+    index = bisect_left(dates, date)
+    return index < len(dates) and dates[index] == date
+
 def get_holidays(event, headers):
     """
     休日・祝日一覧を取得
@@ -7042,40 +8825,19 @@ def get_holidays(event, headers):
         month = query_params.get('month')
         holiday_type = query_params.get('type')
         
+        # 休日カレンダー（日付順）から二分探索で期間を切り出す
         if date_from and date_to:
-            # 日付範囲でフィルタリング
-            holidays = []
-            scan_response = HOLIDAYS_TABLE.scan()
-            for item in scan_response.get('Items', []):
-                if date_from <= item.get('date', '') <= date_to:
-                    if not holiday_type or item.get('type') == holiday_type:
-                        holidays.append(item)
-            holidays.sort(key=lambda x: x.get('date', ''))
+            # 日付範囲
+            holidays = find_holidays(date_from, date_to)
         elif year and month:
-            # 年月でフィルタリング
-            month_start = f"{year}-{month.zfill(2)}-01"
-            next_month = int(month) + 1
-            next_year = int(year)
-            if next_month > 12:
-                next_month = 1
-                next_year += 1
-            month_end = f"{next_year}-{str(next_month).zfill(2)}-01"
-            
-            holidays = []
-            scan_response = HOLIDAYS_TABLE.scan()
-            for item in scan_response.get('Items', []):
-                item_date = item.get('date', '')
-                if month_start <= item_date < month_end:
-                    if not holiday_type or item.get('type') == holiday_type:
-                        holidays.append(item)
-            holidays.sort(key=lambda x: x.get('date', ''))
+            # 年月
+            month_prefix = f"{year}-{month.zfill(2)}"
+            holidays = find_holidays(f"{month_prefix}-01", f"{month_prefix}-31")
         else:
             # 全件取得
-            scan_response = HOLIDAYS_TABLE.scan()
-            holidays = scan_response.get('Items', [])
-            if holiday_type:
-                holidays = [h for h in holidays if h.get('type') == holiday_type]
-            holidays.sort(key=lambda x: x.get('date', ''))
+            holidays = find_holidays()
+        if holiday_type:
+            holidays = [h for h in holidays if h.get('type') == holiday_type]
         
         return {
             'statusCode': 200,
@@ -7137,6 +8899,7 @@ def create_holiday(event, headers):
         }
         
         HOLIDAYS_TABLE.put_item(Item=holiday_data)
+        bump_holiday_calendar_version()
         
         return {
             'statusCode': 200,
@@ -7238,6 +9001,7 @@ def update_holiday(holiday_id, event, headers):
                 ExpressionAttributeNames=expression_attribute_names,
                 ExpressionAttributeValues=expression_attribute_values
             )
+            bump_holiday_calendar_version()
         
         return {
             'statusCode': 200,
@@ -7264,6 +9028,7 @@ def delete_holiday(holiday_id, headers):
     """
     try:
         HOLIDAYS_TABLE.delete_item(Key={'id': holiday_id})
+        bump_holiday_calendar_version()
         return {
             'statusCode': 200,
             'headers': headers,
@@ -7377,25 +9142,21 @@ def get_brands(event, headers):
         query_params = event.get('queryStringParameters') or {}
         client_id = query_params.get('client_id')
         
-        # スキャンまたはクエリを実行
-        if client_id:
-            # クライアントIDでフィルタ
-            response = BRANDS_TABLE.scan(
-                FilterExpression=Attr('client_id').eq(client_id)
-            )
-        else:
-            # 全件取得
-            response = BRANDS_TABLE.scan()
-        
-        brands = response.get('Items', [])
+        # クエリプランナーでGSIを選択（該当インデックスがなければスキャン）
+        plan = plan_list_query('misesapo-brands', {'client_id': client_id})
+        try:
+            brands, next_page_token, plan = execute_list_request(BRANDS_TABLE, plan, query_params)
+        except ValueError:
+            return invalid_page_token_response(headers)
         
         # レスポンス形式を統一（items配列で返す）
         return {
             'statusCode': 200,
-            'headers': headers,
+            'headers': with_query_plan_header(headers, plan),
             'body': json.dumps({
                 'items': brands,
-                'count': len(brands)
+                'count': len(brands),
+                'next_page_token': next_page_token
             }, ensure_ascii=False, default=str)
         }
     except Exception as e:
@@ -7428,7 +9189,8 @@ def create_brand(event, headers):
             body_json = json.loads(body.decode('utf-8'))
         
         # ID生成（5桁形式: BR00001〜）
-        if 'id' not in body_json or not body_json['id']:
+        id_generated = not body_json.get('id')
+        if id_generated:
             brand_id = generate_next_id(BRANDS_TABLE, 'BR')
         else:
             brand_id = body_json['id']
@@ -7445,8 +9207,11 @@ def create_brand(event, headers):
             'updated_at': now
         }
         
-        # DynamoDBに保存
-        BRANDS_TABLE.put_item(Item=brand_data)
+        # DynamoDBに保存（採番したIDは既存アイテムを上書きしないよう条件付きで書き込む）
+        if id_generated:
+            brand_id = put_item_with_new_id(BRANDS_TABLE, brand_data, lambda: generate_next_id(BRANDS_TABLE, 'BR'))
+        else:
+            BRANDS_TABLE.put_item(Item=brand_data)
         
         return {
             'statusCode': 200,
@@ -7615,30 +9380,24 @@ def get_stores(event, headers):
         client_id = query_params.get('client_id')
         brand_id = query_params.get('brand_id')
         
-        # スキャンまたはクエリを実行
-        if brand_id:
-            # ブランドIDでフィルタ
-            response = STORES_TABLE.scan(
-                FilterExpression=Attr('brand_id').eq(brand_id)
-            )
-        elif client_id:
-            # クライアントIDでフィルタ
-            response = STORES_TABLE.scan(
-                FilterExpression=Attr('client_id').eq(client_id)
-            )
-        else:
-            # 全件取得
-            response = STORES_TABLE.scan()
-        
-        stores = response.get('Items', [])
+        # クエリプランナーでGSIを選択（該当インデックスがなければスキャン）
+        plan = plan_list_query('misesapo-stores', {
+            'brand_id': brand_id,
+            'client_id': client_id
+        })
+        try:
+            stores, next_page_token, plan = execute_list_request(STORES_TABLE, plan, query_params)
+        except ValueError:
+            return invalid_page_token_response(headers)
         
         # レスポンス形式を統一（items配列で返す）
         return {
             'statusCode': 200,
-            'headers': headers,
+            'headers': with_query_plan_header(headers, plan),
             'body': json.dumps({
                 'items': stores,
-                'count': len(stores)
+                'count': len(stores),
+                'next_page_token': next_page_token
             }, ensure_ascii=False, default=str)
         }
     except Exception as e:
@@ -7671,7 +9430,8 @@ def create_store(event, headers):
             body_json = json.loads(body.decode('utf-8'))
         
         # ID生成（5桁形式: ST00001〜）
-        if 'id' not in body_json or not body_json['id']:
+        id_generated = not body_json.get('id')
+        if id_generated:
             store_id = generate_next_id(STORES_TABLE, 'ST')
         else:
             store_id = body_json['id']
@@ -7700,8 +9460,11 @@ def create_store(event, headers):
             'updated_at': now
         }
         
-        # DynamoDBに保存
-        STORES_TABLE.put_item(Item=store_data)
+        # DynamoDBに保存（採番したIDは既存アイテムを上書きしないよう条件付きで書き込む）
+        if id_generated:
+            store_id = put_item_with_new_id(STORES_TABLE, store_data, lambda: generate_next_id(STORES_TABLE, 'ST'))
+        else:
+            STORES_TABLE.put_item(Item=store_data)
         
         return {
             'statusCode': 200,
@@ -7992,69 +9755,138 @@ def get_report_feedback(report_id, event, headers):
         }
 
 
+# ==================== 在庫カタログのキャッシュ ====================
+# 在庫一覧（inventory-items 全件）のコンテナ内スナップショット
+# - 商品の登録・更新・入出庫のたびに counters テーブルのバージョン番号を加算する
+# - 一覧の取得時はバージョン番号（GetItem 1回）だけを確認し、変わっていなければスナップショットをそのまま返す
+# - バージョン番号の加算に失敗した場合に備え、INVENTORY_CATALOG_MAX_AGE 秒経過したスナップショットは作り直す
+# - 在庫が安全在庫数を下回る商品（要発注リスト）もスナップショット作成時に計算しておく
+INVENTORY_CATALOG_VERSION_COUNTER = 'inventory-catalog-version'
+INVENTORY_CATALOG_MAX_AGE = int(os.environ.get('INVENTORY_CATALOG_MAX_AGE', '300'))
+# バージョン番号を確認する間隔（秒）。0 の場合は毎回確認する
+INVENTORY_CATALOG_CHECK_INTERVAL = float(os.environ.get('INVENTORY_CATALOG_CHECK_INTERVAL', '0'))
+_inventory_catalog_cache = {}
+
+def get_inventory_catalog_version():
+    """在庫カタログのバージョン番号を取得（未作成の場合は0）"""
+    response = COUNTERS_TABLE.get_item(
+        Key={'counter_id': INVENTORY_CATALOG_VERSION_COUNTER},
+        ConsistentRead=True
+    )
+    return int(response.get('Item', {}).get('current_value', 0))
+
+def bump_inventory_catalog_version():
+    """在庫カタログのバージョン番号を加算し、このコンテナのスナップショットを破棄"""
+    _inventory_catalog_cache.clear()
+    try:
+        COUNTERS_TABLE.update_item(
+            Key={'counter_id': INVENTORY_CATALOG_VERSION_COUNTER},
+            UpdateExpression='ADD current_value :n SET updated_at = :now',
+            ExpressionAttributeValues={
+                ':n': 1,
+                ':now': datetime.utcnow().isoformat() + 'Z'
+            }
+        )
+    except Exception as e:
+        # 他のコンテナのスナップショットは INVENTORY_CATALOG_MAX_AGE 経過後に作り直される
+        print(f"Warning: Failed to bump inventory catalog version: {str(e)}")
+
+def inventory_stock_status(item):
+    """在庫ステータス（safe / warning / danger）を判定"""
+    stock = item.get('stock', 0)
+    if stock >= item.get('safeStock', 100):
+        return 'safe'
+    if stock >= item.get('minStock', 50):
+        return 'warning'
+    return 'danger'
+
+def build_inventory_catalog(items):
+    """DynamoDBのアイテムから在庫一覧と要発注リストを作成"""
+    processed_items = []
+    for item in items:
+        # DynamoDBの型をJSONシリアライズ可能な型に変換
+        processed_item = {}
+        for key, value in item.items():
+            # Decimal型をintに変換
+            if isinstance(value, Decimal):
+                processed_item[key] = int(value)
+            elif isinstance(value, (int, float, str, bool, type(None))):
+                processed_item[key] = value
+            else:
+                processed_item[key] = str(value)
+        processed_item['status'] = inventory_stock_status(processed_item)
+        processed_items.append(processed_item)
+
+    # 要発注リスト: 安全在庫数を下回る商品（不足数の多い順）
+    low_stock = [
+        {**item, 'shortage': item.get('safeStock', 100) - item.get('stock', 0)}
+        for item in processed_items if item['status'] != 'safe'
+    ]
+    low_stock.sort(key=lambda item: (item['status'] != 'danger', -item['shortage']))
+    return {
+        'items': processed_items,
+        'items_body': json.dumps({'items': processed_items}, ensure_ascii=False),
+        'low_stock': low_stock,
+        'low_stock_body': json.dumps({
+            'items': low_stock,
+            'count': len(low_stock),
+            'danger_count': sum(1 for item in low_stock if item['status'] == 'danger')
+        }, ensure_ascii=False)
+    }
+
+def get_inventory_catalog():
+    """
+    在庫カタログのスナップショットを取得（バージョン番号が変わっていればテーブルを読み直す）
+    注意: 戻り値はキャッシュと共有されるため、呼び出し側で変更しないこと
+    """
+    now = time.time()
+    cached = _inventory_catalog_cache.get('catalog')
+    if cached and now - cached['built_at'] < INVENTORY_CATALOG_MAX_AGE:
+        if now - cached['checked_at'] < INVENTORY_CATALOG_CHECK_INTERVAL:
+            return cached
+        version = get_inventory_catalog_version()
+        if version == cached['version']:
+            cached['checked_at'] = now
+            return cached
+    else:
+        version = get_inventory_catalog_version()
+
+    # スキャン前にバージョン番号を読んでおく（スキャン中の更新は次回の確認で検出される）
+    items = []
+    response = INVENTORY_ITEMS_TABLE.scan()
+    items.extend(response.get('Items', []))
+    while 'LastEvaluatedKey' in response:
+        response = INVENTORY_ITEMS_TABLE.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        items.extend(response.get('Items', []))
+
+    catalog = build_inventory_catalog(items)
+    catalog.update({'version': version, 'built_at': now, 'checked_at': now})
+    _inventory_catalog_cache['catalog'] = catalog
+    return catalog
+
+
 # ==================== 在庫管理API ====================
 
 def get_inventory_items(event, headers):
     """
     在庫一覧を取得（認証不要）
+    コンテナ内のスナップショットを返す（在庫カタログのキャッシュを参照）
     """
     try:
-        print("DEBUG: get_inventory_items called")
-        items = []
         try:
-            print("DEBUG: Attempting to scan inventory-items table")
-            response = INVENTORY_ITEMS_TABLE.scan()
-            print(f"DEBUG: Scan response received, items count: {len(response.get('Items', []))}")
-            items.extend(response.get('Items', []))
-            
-            while 'LastEvaluatedKey' in response:
-                print("DEBUG: Paginating scan results")
-                response = INVENTORY_ITEMS_TABLE.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-                items.extend(response.get('Items', []))
+            catalog = get_inventory_catalog()
         except Exception as table_error:
             # テーブルが存在しない場合やエラーの場合
             import traceback
             print(f"ERROR: Error scanning inventory items table: {str(table_error)}")
             print(traceback.format_exc())
             # 空の配列を返す（テーブルが存在しない場合のフォールバック）
-            items = []
-        
-        print(f"DEBUG: Processing {len(items)} items")
-        # 在庫ステータスを計算
-        processed_items = []
-        for item in items:
-            # DynamoDBの型をJSONシリアライズ可能な型に変換
-            processed_item = {}
-            for key, value in item.items():
-                # Decimal型をintに変換
-                if hasattr(value, '__class__') and value.__class__.__name__ == 'Decimal':
-                    processed_item[key] = int(value)
-                elif isinstance(value, (int, float, str, bool, type(None))):
-                    processed_item[key] = value
-                else:
-                    processed_item[key] = str(value)
-            
-            # 数値型に変換してから比較
-            stock = processed_item.get('stock', 0)
-            safe_stock = processed_item.get('safeStock', 100)
-            min_stock = processed_item.get('minStock', 50)
-            
-            if stock >= safe_stock:
-                processed_item['status'] = 'safe'
-            elif stock >= min_stock:
-                processed_item['status'] = 'warning'
-            else:
-                processed_item['status'] = 'danger'
-            
-            processed_items.append(processed_item)
+            catalog = {'items_body': json.dumps({'items': []}, ensure_ascii=False)}
         
-        print(f"DEBUG: Returning {len(processed_items)} items")
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': json.dumps({
-                'items': processed_items
-            }, ensure_ascii=False)
+            'body': catalog['items_body']
         }
     except Exception as e:
         import traceback
@@ -8071,6 +9903,32 @@ def get_inventory_items(event, headers):
         }
 
 
+def get_inventory_low_stock(event, headers):
+    """
+    要発注リスト（安全在庫数を下回る商品）を取得（認証不要）
+    アラートバッジは count / danger_count を参照する
+    """
+    try:
+        catalog = get_inventory_catalog()
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': catalog['low_stock_body']
+        }
+    except Exception as e:
+        import traceback
+        print(f"Error getting low stock items: {str(e)}")
+        print(traceback.format_exc())
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({
+                'error': '要発注リストの取得に失敗しました',
+                'message': str(e)
+            }, ensure_ascii=False)
+        }
+
+
 def create_inventory_item(event, headers):
     """
     商品を登録（管理者のみ）
@@ -8140,6 +9998,8 @@ def create_inventory_item(event, headers):
         
         INVENTORY_ITEMS_TABLE.put_item(Item=item)
         
+        bump_inventory_catalog_version()
+        
         return {
             'statusCode': 201,
             'headers': headers,
@@ -8275,6 +10135,7 @@ def update_inventory_item(product_id, event, headers):
             ExpressionAttributeNames=expression_attribute_names,
             ExpressionAttributeValues=expression_attribute_values
         )
+        bump_inventory_catalog_version()
         
         # 更新後の商品情報を取得
         updated = INVENTORY_ITEMS_TABLE.get_item(Key={'product_id': product_id})
@@ -8302,6 +10163,239 @@ def update_inventory_item(product_id, event, headers):
         }
 
 
+# 在庫の入出庫は TransactWriteItems でまとめて書き込む
+# - 在庫数は ADD による相対更新（読み取り→上書きによる更新の取りこぼしを防ぐ）
+# - 出庫は「在庫数 >= 出庫数」を条件にし、在庫がマイナスにならないようにする
+# - 履歴（inventory-transactions）の行も同じトランザクションで書き込む
+# - 集計（inventory-rollups）の加算も同じトランザクションで行う
+# - 1トランザクションの操作数上限は100件
+INVENTORY_TRANSACT_MAX_ACTIONS = 100
+INVENTORY_TRANSACT_MAX_RETRIES = 3
+INVENTORY_TRANSACTION_TTL_DAYS = 90
+
+# 入出庫の集計（inventory-rollups）
+# - パーティションキー scope: 'product#{product_id}' または 'staff#{staff_id}'
+# - ソートキー period: 'day#YYYY-MM-DD' / 'month#YYYY-MM'（JST）、商品ごとの累計は 'total'
+# - 各アイテムは in_quantity / out_quantity / in_count / out_count を持ち、入出庫の確定時に ADD で加算する
+# - 履歴（inventory-transactions）は90日で削除されるが、集計は期限なしで保持する
+INVENTORY_ROLLUPS_ENABLED = os.environ.get('INVENTORY_ROLLUPS_ENABLED', 'true').lower() == 'true'
+INVENTORY_ROLLUP_GRANULARITIES = ('day', 'month')
+# 1商品あたりの操作数（在庫更新・履歴・日次・月次・累計）と、1リクエストあたりのスタッフ集計（日次・月次）
+INVENTORY_ACTIONS_PER_LINE = 5 if INVENTORY_ROLLUPS_ENABLED else 2
+INVENTORY_ACTIONS_PER_BATCH = 2 if INVENTORY_ROLLUPS_ENABLED else 0
+INVENTORY_TRANSACT_BATCH_SIZE = (INVENTORY_TRANSACT_MAX_ACTIONS - INVENTORY_ACTIONS_PER_BATCH) // INVENTORY_ACTIONS_PER_LINE
+
+def inventory_rollup_periods(timestamp):
+    """ISO8601の日時から集計期間のソートキー（day / month）を取得（JST基準）"""
+    jst_time = datetime.fromisoformat(timestamp).astimezone(timezone(timedelta(hours=9)))
+    return {
+        'day': f"day#{jst_time.strftime('%Y-%m-%d')}",
+        'month': f"month#{jst_time.strftime('%Y-%m')}"
+    }
+
+def _inventory_rollup_update(scope, period, transaction_type, quantity, count, attributes):
+    """集計アイテム1件分の加算（Update）を作成"""
+    values = {':quantity': quantity, ':count': count}
+    set_parts = []
+    for name, value in attributes.items():
+        set_parts.append(f'{name} = :{name}')
+        values[f':{name}'] = value
+    return {
+        'Update': {
+            'TableName': INVENTORY_ROLLUPS_TABLE.name,
+            'Key': {'scope': _type_serializer.serialize(scope), 'period': _type_serializer.serialize(period)},
+            'UpdateExpression': f'ADD {transaction_type}_quantity :quantity, {transaction_type}_count :count SET ' + ', '.join(set_parts),
+            'ExpressionAttributeValues': {k: _type_serializer.serialize(v) for k, v in values.items()}
+        }
+    }
+
+def build_inventory_rollup_items(ledgers, transaction_type, staff, now):
+    """
+    履歴行に対応する集計の加算を作成
+    戻り値: (商品ごとの操作リストのリスト, スタッフ集計の操作リスト)
+    """
+    periods = inventory_rollup_periods(now)
+    per_line = []
+    for ledger in ledgers:
+        scope = f"product#{ledger['product_id']}"
+        attributes = {'product_id': ledger['product_id'], 'product_name': ledger['product_name'], 'updated_at': now}
+        actions = [
+            _inventory_rollup_update(scope, periods[granularity], transaction_type, ledger['quantity'], 1, attributes)
+            for granularity in INVENTORY_ROLLUP_GRANULARITIES
+        ]
+        # 累計には最終入庫/出庫の日時と担当者も保持する（商品詳細の「最終入出庫」表示用）
+        actions.append(_inventory_rollup_update(scope, 'total', transaction_type, ledger['quantity'], 1, {
+            **attributes,
+            f'last_{transaction_type}_at': now,
+            f'last_{transaction_type}_staff_id': staff['staff_id'],
+            f'last_{transaction_type}_staff_name': staff['staff_name']
+        }))
+        per_line.append(actions)
+    staff_actions = []
+    if ledgers and staff['staff_id']:
+        quantity = sum(ledger['quantity'] for ledger in ledgers)
+        attributes = {'staff_id': staff['staff_id'], 'staff_name': staff['staff_name'], 'updated_at': now}
+        staff_actions = [
+            _inventory_rollup_update(f"staff#{staff['staff_id']}", periods[granularity], transaction_type, quantity, len(ledgers), attributes)
+            for granularity in INVENTORY_ROLLUP_GRANULARITIES
+        ]
+    return per_line, staff_actions
+
+def normalize_inventory_lines(items):
+    """リクエストの商品行を検証し、同じ商品の行を1行にまとめる（1トランザクション内で同一アイテムを2回更新できないため）"""
+    lines = {}
+    errors = []
+    for item_data in items:
+        product_id = item_data.get('product_id')
+        try:
+            quantity = int(item_data.get('quantity', 0))
+        except (TypeError, ValueError):
+            quantity = 0
+        if not product_id or quantity <= 0:
+            errors.append(f'商品IDまたは数量が不正です: {product_id}')
+            continue
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    return [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in lines.items()], errors
+
+def batch_get_items(table, key_name, key_values):
+    """単一キーのテーブルから BatchGetItem でまとめて取得（キーの値 -> アイテム、存在しないキーは含まない）"""
+    found = {}
+    key_values = list(dict.fromkeys(key_values))
+    for start in range(0, len(key_values), 100):
+        request = {table.name: {'Keys': [{key_name: value} for value in key_values[start:start + 100]]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(table.name, []):
+                found[item[key_name]] = item
+            request = response.get('UnprocessedKeys') or None
+    return found
+
+def fetch_inventory_products(product_ids):
+    """商品を BatchGetItem でまとめて取得（product_id -> 商品）"""
+    return batch_get_items(INVENTORY_ITEMS_TABLE, 'product_id', product_ids)
+
+def build_inventory_transact_items(line, product, transaction_type, staff, now):
+    """1商品分の在庫更新（条件付きADD）と履歴行のPutを作成"""
+    product_id = line['product_id']
+    quantity = line['quantity']
+    delta = -quantity if transaction_type == 'out' else quantity
+    # 履歴の前後在庫数は取得時点の値。在庫数が取得時点から変わっていないことを条件にし、
+    # 記録した値と実際に書き込んだ値を一致させる（変わっていた場合は commit_inventory_batch が読み直して再試行）
+    stock_before = int(product.get('stock', 0))
+    ledger = {
+        'transaction_id': str(uuid.uuid4()),
+        'product_id': product_id,
+        'product_name': product.get('name', ''),
+        'staff_id': staff['staff_id'],
+        'staff_name': staff['staff_name'],
+        'staff_email': staff['staff_email'],
+        'quantity': quantity,
+        'type': transaction_type,
+        'stock_before': stock_before,
+        'stock_after': stock_before + delta,
+        'created_at': now,
+        'ttl': int((datetime.now(timezone.utc) + timedelta(days=INVENTORY_TRANSACTION_TTL_DAYS)).timestamp())  # 3ヶ月後に自動削除
+    }
+    values = {':delta': delta, ':updated_at': now}
+    condition = 'attribute_exists(product_id)'
+    if 'stock' in product:
+        condition += ' AND stock = :stock_before'
+        values[':stock_before'] = product['stock']
+    else:
+        condition += ' AND attribute_not_exists(stock)'
+    if transaction_type == 'out':
+        condition += ' AND stock >= :quantity'
+        values[':quantity'] = quantity
+    update = {
+        'Update': {
+            'TableName': INVENTORY_ITEMS_TABLE.name,
+            'Key': {'product_id': _type_serializer.serialize(product_id)},
+            'UpdateExpression': 'ADD stock :delta SET updated_at = :updated_at',
+            'ConditionExpression': condition,
+            'ExpressionAttributeValues': {k: _type_serializer.serialize(v) for k, v in values.items()},
+            'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+        }
+    }
+    put = {
+        'Put': {
+            'TableName': INVENTORY_TRANSACTIONS_TABLE.name,
+            'Item': {k: _type_serializer.serialize(v) for k, v in ledger.items()}
+        }
+    }
+    return [update, put], ledger
+
+def _inventory_condition_error(line, product, reason, transaction_type):
+    """条件チェックに失敗した商品のエラーメッセージを作成"""
+    old_item = reason.get('Item')
+    if not old_item:
+        return f'商品が見つかりません: {line["product_id"]}'
+    current_stock = int(_type_deserializer.deserialize(old_item['stock'])) if 'stock' in old_item else 0
+    if transaction_type == 'out':
+        return f'{product.get("name")}の在庫が不足しています（現在: {current_stock}個、必要: {line["quantity"]}個）'
+    return f'{line["product_id"]}の処理に失敗しました: 条件チェックに失敗しました'
+
+def commit_inventory_batch(lines, products, transaction_type, staff):
+    """
+    1トランザクション分の商品行を書き込む
+    条件チェックに失敗した商品は、在庫数が取得後に変わっただけ（在庫は足りている）なら失敗時の商品で products を更新して再試行し、
+    在庫不足・商品なしの場合はエラーとして除外して残りの商品で再実行する（従来どおり商品単位の部分成功を維持）
+    戻り値: (書き込んだ履歴行のリスト, エラーメッセージのリスト)
+    """
+    errors = []
+    pending = list(lines)
+    conflicts = 0
+    while pending:
+        now = datetime.now(timezone.utc).isoformat()
+        transact_items = []
+        # 在庫更新（条件付き）の操作位置 -> 商品行（キャンセル理由から失敗した商品を特定するため）
+        owners = {}
+        ledgers = []
+        for line in pending:
+            actions, ledger = build_inventory_transact_items(line, products[line['product_id']], transaction_type, staff, now)
+            owners[len(transact_items)] = line
+            transact_items.extend(actions)
+            ledgers.append(ledger)
+        if INVENTORY_ROLLUPS_ENABLED:
+            rollups_per_line, staff_rollups = build_inventory_rollup_items(ledgers, transaction_type, staff, now)
+            for actions in rollups_per_line:
+                transact_items.extend(actions)
+            transact_items.extend(staff_rollups)
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+            return ledgers, errors
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+                raise
+            reasons = e.response.get('CancellationReasons') or []
+            failed = set()
+            stale = False
+            for index, reason in enumerate(reasons):
+                if reason.get('Code') == 'ConditionalCheckFailed' and index in owners:
+                    line = owners[index]
+                    current = {k: _type_deserializer.deserialize(v) for k, v in (reason.get('Item') or {}).items()}
+                    if current and (transaction_type != 'out' or int(current.get('stock', 0)) >= line['quantity']):
+                        # 取得後に在庫数が変わった: 失敗時点の商品で前後在庫数を作り直して再試行
+                        products[line['product_id']] = current
+                        stale = True
+                        continue
+                    failed.add(line['product_id'])
+                    errors.append(_inventory_condition_error(line, products[line['product_id']], reason, transaction_type))
+            if failed:
+                pending = [line for line in pending if line['product_id'] not in failed]
+                continue
+            if stale:
+                conflicts += 1
+                if conflicts > INVENTORY_TRANSACT_MAX_RETRIES:
+                    raise
+                continue
+            # 他の書き込みとの競合（TransactionConflict 等）は同じ内容で再試行
+            conflicts += 1
+            if conflicts > INVENTORY_TRANSACT_MAX_RETRIES:
+                raise
+            time.sleep(0.05 * (2 ** conflicts))
+    return [], errors
+
+
 def process_inventory_transaction(event, headers, transaction_type):
     """
     在庫トランザクション処理（入庫/出庫）
@@ -8353,79 +10447,39 @@ def process_inventory_transaction(event, headers, transaction_type):
                 'body': json.dumps({'error': '商品IDと数量を指定してください'}, ensure_ascii=False)
             }
         
+        lines, errors = normalize_inventory_lines(items)
+        
+        # 商品をまとめて取得（存在しない商品はトランザクションに含めない）
+        products = fetch_inventory_products([line['product_id'] for line in lines])
+        valid_lines = []
+        for line in lines:
+            if line['product_id'] not in products:
+                errors.append(f'商品が見つかりません: {line["product_id"]}')
+            else:
+                valid_lines.append(line)
+        
+        staff = {'staff_id': staff_id, 'staff_name': staff_name, 'staff_email': staff_email}
         results = []
-        errors = []
-        
-        for item_data in items:
-            product_id = item_data.get('product_id')
-            quantity = int(item_data.get('quantity', 0))
-            
-            if not product_id or quantity <= 0:
-                errors.append(f'商品IDまたは数量が不正です: {product_id}')
-                continue
-            
+        for start in range(0, len(valid_lines), INVENTORY_TRANSACT_BATCH_SIZE):
+            batch = valid_lines[start:start + INVENTORY_TRANSACT_BATCH_SIZE]
             try:
-                # 商品を取得
-                response = INVENTORY_ITEMS_TABLE.get_item(Key={'product_id': product_id})
-                if 'Item' not in response:
-                    errors.append(f'商品が見つかりません: {product_id}')
-                    continue
-                
-                product = response['Item']
-                current_stock = int(product.get('stock', 0))
-                stock_before = current_stock
-                
-                # 在庫更新
-                if transaction_type == 'out':
-                    # 出庫処理
-                    if current_stock < quantity:
-                        errors.append(f'{product.get("name")}の在庫が不足しています（現在: {current_stock}個、必要: {quantity}個）')
-                        continue
-                    new_stock = current_stock - quantity
-                else:
-                    # 入庫処理
-                    new_stock = current_stock + quantity
-                
-                # 在庫を更新
-                now = datetime.now(timezone.utc).isoformat()
-                INVENTORY_ITEMS_TABLE.update_item(
-                    Key={'product_id': product_id},
-                    UpdateExpression='SET stock = :stock, updated_at = :updated_at',
-                    ExpressionAttributeValues={
-                        ':stock': new_stock,
-                        ':updated_at': now
-                    }
-                )
-                
-                # トランザクションログを記録
-                transaction_id = str(uuid.uuid4())
-                transaction = {
-                    'transaction_id': transaction_id,
-                    'product_id': product_id,
-                    'product_name': product.get('name', ''),
-                    'staff_id': staff_id,
-                    'staff_name': staff_name,
-                    'staff_email': staff_email,
-                    'quantity': quantity,
-                    'type': transaction_type,
-                    'stock_before': stock_before,
-                    'stock_after': new_stock,
-                    'created_at': now,
-                    'ttl': int((datetime.now(timezone.utc) + timedelta(days=90)).timestamp())  # 3ヶ月後に自動削除
-                }
-                
-                INVENTORY_TRANSACTIONS_TABLE.put_item(Item=transaction)
-                
+                ledgers, batch_errors = commit_inventory_batch(batch, products, transaction_type, staff)
+            except Exception as e:
+                print(f"Error committing inventory batch: {str(e)}")
+                errors.extend(f'{line["product_id"]}の処理に失敗しました: {str(e)}' for line in batch)
+                continue
+            errors.extend(batch_errors)
+            for ledger in ledgers:
                 results.append({
-                    'product_id': product_id,
-                    'product_name': product.get('name', ''),
-                    'quantity': quantity,
-                    'stock_before': stock_before,
-                    'stock_after': new_stock
+                    'product_id': ledger['product_id'],
+                    'product_name': ledger['product_name'],
+                    'quantity': ledger['quantity'],
+                    'stock_before': ledger['stock_before'],
+                    'stock_after': ledger['stock_after']
                 })
-                
-            except Exception as e:
-                errors.append(f'{product_id}の処理に失敗しました: {str(e)}')
+        
+        if results:
+            bump_inventory_catalog_version()
         
         if errors and not results:
             # 全てエラーの場合
@@ -8491,68 +10545,42 @@ def get_inventory_transactions(event, headers):
         is_admin = user_info.get('role') == 'admin'
         staff_id = user_info.get('uid') or user_info.get('cognito_sub', '')
         
-        # フィルター条件
-        filter_expressions = []
-        
-        # 清掃員の場合は自分の履歴のみ
+        # 検索条件（清掃員の場合は自分の履歴のみ、管理者はフィルタリング可能）
+        equals = {}
         if not is_admin and staff_id:
-            filter_expressions.append(Attr('staff_id').eq(staff_id))
-        
-        # 管理者の場合はフィルタリング可能
+            equals['staff_id'] = staff_id
         if is_admin:
-            if query_params.get('staff_id'):
-                filter_expressions.append(Attr('staff_id').eq(query_params['staff_id']))
-            if query_params.get('product_id'):
-                filter_expressions.append(Attr('product_id').eq(query_params['product_id']))
-            if query_params.get('type'):
-                filter_expressions.append(Attr('type').eq(query_params['type']))
-        
-        # 日付範囲フィルター
-        date_from = query_params.get('date_from')
-        date_to = query_params.get('date_to')
-        if date_from:
-            filter_expressions.append(Attr('created_at').gte(date_from))
-        if date_to:
-            filter_expressions.append(Attr('created_at').lte(date_to))
-        
-        # スキャン実行
-        if filter_expressions:
-            from functools import reduce
-            filter_expr = reduce(lambda x, y: x & y, filter_expressions)
-            response = INVENTORY_TRANSACTIONS_TABLE.scan(FilterExpression=filter_expr)
-        else:
-            response = INVENTORY_TRANSACTIONS_TABLE.scan()
-        
-        transactions = response.get('Items', [])
+            equals['staff_id'] = query_params.get('staff_id')
+            equals['product_id'] = query_params.get('product_id')
+            equals['type'] = query_params.get('type')
+        
+        # 日付範囲はGSIのレンジキー（created_at）で絞り込む
+        plan = plan_list_query(
+            'inventory-transactions',
+            equals,
+            {'created_at': (query_params.get('date_from'), query_params.get('date_to'))}
+        )
         
-        while 'LastEvaluatedKey' in response:
-            if filter_expressions:
-                response = INVENTORY_TRANSACTIONS_TABLE.scan(
-                    FilterExpression=filter_expr,
-                    ExclusiveStartKey=response['LastEvaluatedKey']
-                )
-            else:
-                response = INVENTORY_TRANSACTIONS_TABLE.scan(
-                    ExclusiveStartKey=response['LastEvaluatedKey']
-                )
-            transactions.extend(response.get('Items', []))
+        # ページネーション（offsetではなく継続トークンで次ページを取得）
+        limit = parse_page_size(query_params, 100)
+        try:
+            transactions, next_page_token, plan = execute_list_page(
+                INVENTORY_TRANSACTIONS_TABLE, plan, limit, query_params.get('page_token'), descending=True
+            )
+        except ValueError:
+            return invalid_page_token_response(headers)
         
         # 日付でソート（降順）
         transactions.sort(key=lambda x: x.get('created_at', ''), reverse=True)
         
-        # ページネーション
-        limit = int(query_params.get('limit', 100))
-        offset = int(query_params.get('offset', 0))
-        paginated_transactions = transactions[offset:offset + limit]
-        
         return {
             'statusCode': 200,
-            'headers': headers,
+            'headers': with_query_plan_header(headers, plan),
             'body': json.dumps({
-                'transactions': paginated_transactions,
-                'total': len(transactions),
+                'transactions': transactions,
+                'count': len(transactions),
                 'limit': limit,
-                'offset': offset
+                'next_page_token': next_page_token
             }, ensure_ascii=False, default=str)
         }
         
@@ -8569,6 +10597,399 @@ def get_inventory_transactions(event, headers):
             }, ensure_ascii=False)
         }
 
+
+def query_inventory_rollups(scope, granularity, period_from=None, period_to=None):
+    """1つの scope（商品またはスタッフ）の集計を期間順に取得"""
+    if granularity == 'total':
+        response = INVENTORY_ROLLUPS_TABLE.get_item(Key={'scope': scope, 'period': 'total'})
+        return [response['Item']] if 'Item' in response else []
+    key_condition = Key('scope').eq(scope)
+    if period_from or period_to:
+        # to は前方一致で含める（例: granularity=day, to=2025-01 → 1月末日まで）
+        key_condition &= Key('period').between(f'{granularity}#{period_from or ""}', f'{granularity}#{period_to or "9999"}~')
+    else:
+        key_condition &= Key('period').begins_with(f'{granularity}#')
+    rollups = []
+    query_kwargs = {'KeyConditionExpression': key_condition}
+    while True:
+        response = INVENTORY_ROLLUPS_TABLE.query(**query_kwargs)
+        rollups.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return rollups
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def query_inventory_rollups_by_period(period, scope_type):
+    """1つの期間について全商品（または全スタッフ）の集計を取得（period-scope-index）"""
+    rollups = []
+    query_kwargs = {
+        'IndexName': 'period-scope-index',
+        'KeyConditionExpression': Key('period').eq(period) & Key('scope').begins_with(f'{scope_type}#')
+    }
+    while True:
+        response = INVENTORY_ROLLUPS_TABLE.query(**query_kwargs)
+        rollups.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return rollups
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def get_inventory_rollups(event, headers):
+    """
+    入出庫の集計を取得
+    - scope: product / staff、id: 商品ID・スタッフID
+    - granularity: day / month / total、from・to: 期間（day は YYYY-MM-DD、month は YYYY-MM）
+    - id を省略した場合は period（例: month#2025-01）で指定した期間の全商品（全スタッフ）の集計を返す
+    清掃員は商品の集計と自分の集計のみ取得可能
+    """
+    try:
+        # 認証チェック
+        auth_header = event.get('headers', {}).get('Authorization', '') or event.get('headers', {}).get('authorization', '')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return {
+                'statusCode': 401,
+                'headers': headers,
+                'body': json.dumps({'error': '認証が必要です'}, ensure_ascii=False)
+            }
+        
+        id_token = auth_header.replace('Bearer ', '')
+        user_info = verify_firebase_token(id_token)
+        
+        if not user_info or not user_info.get('verified'):
+            return {
+                'statusCode': 401,
+                'headers': headers,
+                'body': json.dumps({'error': '認証に失敗しました'}, ensure_ascii=False)
+            }
+        
+        query_params = event.get('queryStringParameters') or {}
+        scope_type = query_params.get('scope', 'product')
+        scope_id = query_params.get('id')
+        granularity = query_params.get('granularity', 'month')
+        if scope_type not in ('product', 'staff') or granularity not in INVENTORY_ROLLUP_GRANULARITIES + ('total',):
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'scope または granularity が不正です'}, ensure_ascii=False)
+            }
+        
+        staff_id = user_info.get('uid') or user_info.get('cognito_sub', '')
+        if scope_type == 'staff' and not check_admin_permission(user_info) and scope_id != staff_id:
+            return {
+                'statusCode': 403,
+                'headers': headers,
+                'body': json.dumps({'error': '他のスタッフの集計は参照できません'}, ensure_ascii=False)
+            }
+        
+        if scope_id:
+            rollups = query_inventory_rollups(
+                f'{scope_type}#{scope_id}', granularity, query_params.get('from'), query_params.get('to')
+            )
+        else:
+            period = query_params.get('period')
+            valid_period = period == 'total' if granularity == 'total' else (period or '').startswith(f'{granularity}#')
+            if not valid_period:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'id または period を指定してください'}, ensure_ascii=False)
+                }
+            rollups = query_inventory_rollups_by_period(period, scope_type)
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': dumps_json({
+                'rollups': rollups,
+                'count': len(rollups)
+            })
+        }
+        
+    except Exception as e:
+        import traceback
+        print(f"Error getting inventory rollups: {str(e)}")
+        print(traceback.format_exc())
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({
+                'error': '集計の取得に失敗しました',
+                'message': str(e)
+            }, ensure_ascii=False)
+        }
+
+# ==================== 業務連絡の受信箱 ====================
+# 個別向けの業務連絡は、作成時に対象者ごとの受信箱アイテム（announcement-inbox）を書き込む（書き込み時ファンアウト）
+# - キー: staff_id（従業員の cognito_sub。清掃員アプリはトークンの sub で取得する）+ announcement_id
+# - LSI staff_id-created_at-index: 清掃員ごとの個別向けの一覧（新しい順）
+# - GSI announcement_id-staff_id-index: 業務連絡ごとの対象者（対象の変更・削除・既読状況で使用）
+# - 既読は受信箱アイテムの is_read / read_at を更新する（UpdateItem 1回）
+# 全社員向け（target_type='all'）は受信箱に配信せず、従来どおり created_at-index へのクエリで全員に返す
+# （作成後に登録された従業員や cognito_sub 未設定の従業員にも表示される）。既読は既読記録（business-announcement-reads）で判定する
+
+def list_announcement_staff():
+    """全社員向けの対象となる従業員の一覧（ID 9999 を除く）"""
+    workers = []
+    scan_kwargs = {
+        'ProjectionExpression': 'id, cognito_sub, #name, email',
+        'ExpressionAttributeNames': {'#name': 'name'}
+    }
+    while True:
+        response = WORKERS_TABLE.scan(**scan_kwargs)
+        workers.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    # ID 9999を除外（削除済みだがAPIに残っている可能性があるため）
+    return [w for w in workers if str(w.get('id', '')).strip() != '9999']
+
+def resolve_announcement_recipients(target_type, target_staff_ids):
+    """
+    個別向けの業務連絡の対象者を受信箱のキーに解決（staff_id -> 受信箱アイテムの対象者情報）
+    全社員向けは受信箱に配信しないため空を返す。cognito_sub のない従業員は受信箱で取得できないため除外して警告する
+    """
+    if target_type == 'all':
+        return {}
+    target_staff_ids = [staff_id for staff_id in target_staff_ids if staff_id]
+    found = batch_get_items(WORKERS_TABLE, 'id', target_staff_ids)
+    # 従業員IDとして見つからない値は cognito_sub が直接指定されたものとして扱う
+    workers = [found.get(staff_id, {'cognito_sub': staff_id}) for staff_id in target_staff_ids]
+
+    recipients = {}
+    for worker in workers:
+        inbox_staff_id = worker.get('cognito_sub')
+        if not inbox_staff_id:
+            print(f"Warning: Worker {worker.get('id')} has no cognito_sub, announcement not delivered")
+            continue
+        recipients[inbox_staff_id] = {
+            'staff_id': inbox_staff_id,
+            'worker_id': worker.get('id'),
+            'staff_name': worker.get('name') or worker.get('email') or 'Unknown'
+        }
+    return recipients
+
+def write_announcement_inbox(announcement, recipients):
+    """対象者ごとの受信箱アイテムを BatchWriteItem でまとめて書き込む"""
+    with ANNOUNCEMENT_INBOX_TABLE.batch_writer() as batch:
+        for recipient in recipients:
+            batch.put_item(Item={
+                **{k: v for k, v in recipient.items() if v is not None},
+                'announcement_id': announcement['id'],
+                'created_at': announcement['created_at'],
+                'is_read': False
+            })
+    return len(recipients)
+
+def get_announcement_inbox_entries(announcement_id):
+    """業務連絡を受信している対象者の既読状態を取得（staff_id -> is_read）"""
+    entries = {}
+    query_kwargs = {
+        'IndexName': 'announcement_id-staff_id-index',
+        'KeyConditionExpression': Key('announcement_id').eq(announcement_id),
+        'ProjectionExpression': 'staff_id, is_read'
+    }
+    while True:
+        response = ANNOUNCEMENT_INBOX_TABLE.query(**query_kwargs)
+        entries.update((item['staff_id'], bool(item.get('is_read'))) for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return entries
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def delete_announcement_inbox(announcement_id, staff_ids):
+    """指定した staff_id の受信箱アイテムを削除"""
+    with ANNOUNCEMENT_INBOX_TABLE.batch_writer() as batch:
+        for staff_id in staff_ids:
+            batch.delete_item(Key={'staff_id': staff_id, 'announcement_id': announcement_id})
+    return len(staff_ids)
+
+def sync_announcement_inbox(announcement):
+    """対象の変更に合わせて受信箱アイテムを追加・削除し、対象者数・既読数を補正（既存の対象者の既読状態は維持）"""
+    recipients = resolve_announcement_recipients(announcement.get('target_type'), announcement.get('target_staff_ids', []))
+    existing = get_announcement_inbox_entries(announcement['id'])
+    removed_ids = existing.keys() - recipients.keys()
+    added = write_announcement_inbox(announcement, [recipients[staff_id] for staff_id in recipients.keys() - existing.keys()])
+    removed = delete_announcement_inbox(announcement['id'], removed_ids)
+    removed_read = sum(1 for staff_id in removed_ids if existing[staff_id])
+    # カウンター導入前の業務連絡は詳細表示時に受信箱から集計するため補正しない
+    if 'audience_count' in announcement:
+        adjust_announcement_counters(announcement['id'], audience_delta=added - removed, read_delta=-removed_read)
+    return added, removed
+
+# 業務連絡アイテムの audience_count（対象者数）/ read_count（既読数）
+# - 作成時に対象者数を書き込み、既読・対象変更のたびに ADD で増減する（詳細画面で既読一覧を集計しない）
+# - 既読は受信箱アイテムの is_read が false -> true になった場合だけ加算する（同じスタッフの重複既読は数えない）
+
+def adjust_announcement_counters(announcement_id, audience_delta=0, read_delta=0):
+    """対象者数・既読数を増減（業務連絡が削除済みの場合は何もしない）"""
+    if not audience_delta and not read_delta:
+        return
+    try:
+        ANNOUNCEMENTS_TABLE.update_item(
+            Key={'id': announcement_id},
+            UpdateExpression='ADD audience_count :audience, read_count :read',
+            ConditionExpression='attribute_exists(id)',
+            ExpressionAttributeValues={':audience': audience_delta, ':read': read_delta}
+        )
+    except ANNOUNCEMENTS_TABLE.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+
+def count_announcement_reads(announcement_id):
+    """既読記録の件数"""
+    count = 0
+    query_kwargs = {
+        'IndexName': 'announcement_id-read_at-index',
+        'KeyConditionExpression': Key('announcement_id').eq(announcement_id),
+        'Select': 'COUNT'
+    }
+    while True:
+        response = ANNOUNCEMENT_READS_TABLE.query(**query_kwargs)
+        count += response.get('Count', 0)
+        if 'LastEvaluatedKey' not in response:
+            return count
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def get_announcement_counters(announcement):
+    """
+    対象者数・既読数を取得（カウンター導入前の業務連絡は受信箱から集計）
+    全社員向けは受信箱を使わないため、現在の従業員数と既読記録の件数を返す
+    """
+    if announcement.get('target_type') == 'all':
+        return len(list_announcement_staff()), count_announcement_reads(announcement['id'])
+    if 'audience_count' in announcement:
+        return int(announcement.get('audience_count', 0)), int(announcement.get('read_count', 0))
+    entries = get_announcement_inbox_entries(announcement['id'])
+    return len(entries), sum(1 for is_read in entries.values() if is_read)
+
+def mark_announcement_inbox_read(staff_id, announcement_id, read_at):
+    """受信箱アイテムを既読にする（初めて既読になった場合は True、既読済み・対象外の場合は False）"""
+    try:
+        ANNOUNCEMENT_INBOX_TABLE.update_item(
+            Key={'staff_id': staff_id, 'announcement_id': announcement_id},
+            UpdateExpression='SET is_read = :true, read_at = :read_at',
+            ConditionExpression='attribute_exists(staff_id) AND is_read = :false',
+            ExpressionAttributeValues={':true': True, ':false': False, ':read_at': read_at}
+        )
+        return True
+    except ANNOUNCEMENT_INBOX_TABLE.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+def _query_newest(table, index_name, key_condition, limit):
+    """インデックスをレンジキーの降順にクエリし、最大 limit 件を返す"""
+    items = []
+    query_kwargs = {
+        'IndexName': index_name,
+        'KeyConditionExpression': key_condition,
+        'ScanIndexForward': False,
+        'Limit': limit
+    }
+    while len(items) < limit:
+        response = table.query(**query_kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return items[:limit]
+
+def get_all_announcement_read_status(announcement_id):
+    """全社員向けの既読状況（現在の従業員ごと、既読記録の staff_id は cognito_sub）"""
+    read_times = {}
+    query_kwargs = {
+        'IndexName': 'announcement_id-read_at-index',
+        'KeyConditionExpression': Key('announcement_id').eq(announcement_id)
+    }
+    while True:
+        response = ANNOUNCEMENT_READS_TABLE.query(**query_kwargs)
+        for item in response.get('Items', []):
+            read_times[item.get('staff_id')] = item.get('read_at')
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    read_status = []
+    for worker in list_announcement_staff():
+        staff_id = worker.get('cognito_sub') or worker.get('id')
+        read_at = read_times.get(staff_id)
+        read_status.append({
+            'staff_id': staff_id,
+            'worker_id': worker.get('id'),
+            'staff_name': worker.get('name') or worker.get('email') or 'Unknown',
+            'is_read': read_at is not None,
+            'read_at': read_at
+        })
+    return read_status
+
+def get_staff_announcement_feed(staff_id, limit, before=None):
+    """
+    清掃員の業務連絡を新しい順に1ページ分取得
+    - 個別向け: 受信箱（LSI staff_id-created_at-index）
+    - 全社員向け: business-announcements の created_at-index（target_type='all'）、既読は既読記録で判定
+    それぞれ created_at が before より前のものを最大 limit + 1 件読み、作成日時順にまとめて limit 件を返す
+    戻り値: ([(業務連絡, 既読か)], 次のページの before（続きがない場合はNone）)
+    """
+    inbox_condition = Key('staff_id').eq(staff_id)
+    all_condition = Key('target_type').eq('all')
+    if before:
+        inbox_condition = inbox_condition & Key('created_at').lt(before)
+        all_condition = all_condition & Key('created_at').lt(before)
+    inbox_items = _query_newest(ANNOUNCEMENT_INBOX_TABLE, 'staff_id-created_at-index', inbox_condition, limit + 1)
+    all_items = _query_newest(ANNOUNCEMENTS_TABLE, 'created_at-index', all_condition, limit + 1)
+
+    announcement_map = batch_get_items(ANNOUNCEMENTS_TABLE, 'id', [item['announcement_id'] for item in inbox_items])
+    read_ids = set(batch_get_items(ANNOUNCEMENT_READS_TABLE, 'id', [f"{item['id']}_{staff_id}" for item in all_items]))
+    entries = [(item, f"{item['id']}_{staff_id}" in read_ids) for item in all_items]
+    # 削除済みの業務連絡、以前の配信で受信箱に残っている全社員向けは除外
+    entries += [
+        (announcement_map[item['announcement_id']], bool(item.get('is_read')))
+        for item in inbox_items
+        if item['announcement_id'] in announcement_map and announcement_map[item['announcement_id']].get('target_type') != 'all'
+    ]
+    entries.sort(key=lambda entry: entry[0].get('created_at', ''), reverse=True)
+    has_more = len(entries) > limit or len(inbox_items) > limit or len(all_items) > limit
+    entries = entries[:limit]
+    next_before = entries[-1][0].get('created_at') if has_more and entries else None
+    return entries, next_before
+
+def _get_legacy_staff_announcements(staff_id, limit):
+    """受信箱を使わない従来の取得（受信箱テーブルが未作成の場合のフォールバック）"""
+    # 全社員向け（target_type='all'）
+    all_announcements = []
+    try:
+        response = ANNOUNCEMENTS_TABLE.query(
+            IndexName='created_at-index',
+            KeyConditionExpression=Key('target_type').eq('all'),
+            ScanIndexForward=False,
+            Limit=limit
+        )
+        all_announcements = response.get('Items', [])
+    except Exception as e:
+        print(f"Error querying all announcements: {e}")
+    
+    # 個別向け（target_type='individual'、target_staff_idsにstaff_idが含まれる）
+    individual_announcements = []
+    try:
+        response = ANNOUNCEMENTS_TABLE.scan(
+            FilterExpression=Attr('target_type').eq('individual') & Attr('target_staff_ids').contains(staff_id)
+        )
+        individual_announcements = response.get('Items', [])
+    except Exception as e:
+        print(f"Error querying individual announcements: {e}")
+    
+    # マージしてソート
+    all_items = all_announcements + individual_announcements
+    all_items.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    
+    # 既読情報を取得
+    read_ids = set()
+    try:
+        read_response = ANNOUNCEMENT_READS_TABLE.query(
+            IndexName='staff_id-read_at-index',
+            KeyConditionExpression=Key('staff_id').eq(staff_id)
+        )
+        read_ids = {item.get('announcement_id') for item in read_response.get('Items', [])}
+    except Exception as e:
+        print(f"Error querying read status: {e}")
+    
+    return [(item, item.get('id') in read_ids) for item in all_items[:limit]]
+
+
 # ==================== 業務連絡機能 ====================
 
 def get_staff_announcements(event, headers):
@@ -8599,53 +11020,28 @@ def get_staff_announcements(event, headers):
         query_params = event.get('queryStringParameters') or {}
         limit = int(query_params.get('limit', 50))
         
-        # 全社員向けと個別向けの業務連絡を取得
-        now = datetime.utcnow().isoformat() + 'Z'
-        
-        # 全社員向け（target_type='all'）
-        all_announcements = []
-        try:
-            response = ANNOUNCEMENTS_TABLE.query(
-                IndexName='created_at-index',
-                KeyConditionExpression=Key('target_type').eq('all'),
-                ScanIndexForward=False,
-                Limit=limit
-            )
-            all_announcements = response.get('Items', [])
-        except Exception as e:
-            print(f"Error querying all announcements: {e}")
-        
-        # 個別向け（target_type='individual'、target_staff_idsにstaff_idが含まれる）
-        individual_announcements = []
-        try:
-            response = ANNOUNCEMENTS_TABLE.scan(
-                FilterExpression=Attr('target_type').eq('individual') & Attr('target_staff_ids').contains(staff_id)
-            )
-            individual_announcements = response.get('Items', [])
-        except Exception as e:
-            print(f"Error querying individual announcements: {e}")
-        
-        # マージしてソート
-        all_items = all_announcements + individual_announcements
-        all_items.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        
-        # 既読情報を取得
-        read_ids = set()
+        # 個別向け（受信箱）と全社員向けを新しい順に1ページ分取得
+        # 継続トークンは最後の作成日時を清掃員ごとの範囲で署名したもの
+        next_page_token = None
+        token_plan = plan_list_query('announcement-inbox', {'staff_id': staff_id})
+        before = None
+        if query_params.get('page_token'):
+            try:
+                before = decode_page_token(query_params['page_token'], token_plan).get('created_at')
+            except ValueError:
+                return invalid_page_token_response(headers)
         try:
-            read_response = ANNOUNCEMENT_READS_TABLE.query(
-                IndexName='staff_id-read_at-index',
-                KeyConditionExpression=Key('staff_id').eq(staff_id)
-            )
-            read_ids = {item.get('announcement_id') for item in read_response.get('Items', [])}
-        except Exception as e:
-            print(f"Error querying read status: {e}")
+            entries, next_before = get_staff_announcement_feed(staff_id, limit, before)
+            if next_before:
+                next_page_token = encode_page_token({'created_at': next_before}, token_plan)
+        except ClientError as e:
+            print(f"Warning: announcement inbox unavailable, falling back to scan: {str(e)}")
+            entries = _get_legacy_staff_announcements(staff_id, limit)
         
         # レスポンスに既読情報とNEWバッジ情報を追加
         announcements = []
-        for item in all_items[:limit]:
-            announcement_id = item.get('id')
+        for item, is_read in entries:
             created_at = item.get('created_at', '')
-            is_read = announcement_id in read_ids
             
             # NEWバッジ判定（作成から1週間以内）
             is_new = False
@@ -8668,7 +11064,8 @@ def get_staff_announcements(event, headers):
             'headers': headers,
             'body': json.dumps({
                 'announcements': announcements,
-                'total': len(announcements)
+                'total': len(announcements),
+                'next_page_token': next_page_token
             }, ensure_ascii=False, default=str)
         }
     except Exception as e:
@@ -8715,6 +11112,13 @@ def mark_announcement_read(announcement_id, event, headers):
         
         ANNOUNCEMENT_READS_TABLE.put_item(Item=read_item)
         
+        # 受信箱アイテムを既読にし、初めて既読になった場合だけ既読数を加算
+        try:
+            if mark_announcement_inbox_read(staff_id, announcement_id, now):
+                adjust_announcement_counters(announcement_id, read_delta=1)
+        except Exception as e:
+            print(f"Warning: Failed to mark announcement inbox read: {str(e)}")
+        
         return {
             'statusCode': 200,
             'headers': headers,
@@ -8906,8 +11310,20 @@ def create_announcement(event, headers):
             'target_type': target_type  # GSI用
         }
         
+        # 個別向けは対象者を解決し、対象者数・既読数のカウンターを初期化（全社員向けは受信箱・カウンターを使わない）
+        recipients = resolve_announcement_recipients(target_type, announcement_item['target_staff_ids'])
+        if target_type != 'all':
+            announcement_item['audience_count'] = len(recipients)
+            announcement_item['read_count'] = 0
+        
         ANNOUNCEMENTS_TABLE.put_item(Item=announcement_item)
         
+        # 対象者ごとの受信箱に配信（失敗しても業務連絡は作成済みのため、scripts/backfill_announcement_inbox.py で補完する）
+        try:
+            write_announcement_inbox(announcement_item, list(recipients.values()))
+        except Exception as e:
+            print(f"Warning: Failed to write announcement inbox for {announcement_item['id']}: {str(e)}")
+        
         return {
             'statusCode': 201,
             'headers': headers,
@@ -8932,7 +11348,7 @@ def create_announcement(event, headers):
 
 def get_announcement_detail(announcement_id, event, headers):
     """
-    業務連絡詳細取得（既読状況含む、管理者向け）
+    業務連絡詳細取得（既読数・対象者数を含む、管理者向け）
     """
     try:
         # 認証・権限チェック
@@ -8964,48 +11380,11 @@ def get_announcement_detail(announcement_id, event, headers):
         
         announcement = response['Item']
         
-        # 既読状況を取得
-        read_response = ANNOUNCEMENT_READS_TABLE.query(
-            IndexName='announcement_id-read_at-index',
-            KeyConditionExpression=Key('announcement_id').eq(announcement_id)
-        )
-        read_items = read_response.get('Items', [])
-        
-        # 全従業員リストを取得（既読チェック用）
-        all_staff = []
-        try:
-            staff_response = WORKERS_TABLE.scan(
-                FilterExpression=Attr('role_code').eq('4')  # 清掃
-            )
-            all_staff = staff_response.get('Items', [])
-        except Exception as e:
-            print(f"Error getting staff list: {e}")
-        
-        # 既読マップを作成
-        read_map = {item.get('staff_id'): item for item in read_items}
-        
-        # 対象者リストを作成
-        target_staff_ids = announcement.get('target_staff_ids', [])
-        if announcement.get('target_type') == 'all':
-            # 全社員向けの場合は全従業員が対象
-            target_staff_ids = [staff.get('id') for staff in all_staff]
-        
-        # 既読チェックリストを作成
-        read_status = []
-        for staff_id in target_staff_ids:
-            staff = next((s for s in all_staff if s.get('id') == staff_id), None)
-            if staff:
-                read_item = read_map.get(staff_id)
-                read_status.append({
-                    'staff_id': staff_id,
-                    'staff_name': staff.get('name', staff.get('email', 'Unknown')),
-                    'is_read': read_item is not None,
-                    'read_at': read_item.get('read_at') if read_item else None
-                })
-        
-        announcement['read_status'] = read_status
-        announcement['read_count'] = len([s for s in read_status if s['is_read']])
-        announcement['total_count'] = len(read_status)
+        # 既読状況は対象者数・既読数のカウンターのみ返す（スタッフごとの一覧は /reads で必要な時にページ単位で取得）
+        audience_count, read_count = get_announcement_counters(announcement)
+        announcement['read_count'] = read_count
+        announcement['total_count'] = audience_count
+        announcement['audience_count'] = audience_count
         
         return {
             'statusCode': 200,
@@ -9025,6 +11404,92 @@ def get_announcement_detail(announcement_id, event, headers):
             }, ensure_ascii=False)
         }
 
+def get_announcement_reads(announcement_id, event, headers):
+    """
+    業務連絡の既読状況（対象者ごと）をページ単位で取得（管理者向け）
+    - status: read / unread で絞り込み（省略時は全対象者）
+    - page_size / page_token でページング
+    """
+    try:
+        # 認証・権限チェック
+        auth_header = event.get('headers', {}).get('Authorization') or event.get('headers', {}).get('authorization', '')
+        id_token = auth_header.replace('Bearer ', '') if auth_header else ''
+        user_info = verify_firebase_token(id_token)
+        if not user_info or not user_info.get('verified'):
+            return {
+                'statusCode': 401,
+                'headers': headers,
+                'body': json.dumps({'error': 'Unauthorized'}, ensure_ascii=False)
+            }
+        
+        if not check_admin_permission(user_info):
+            return {
+                'statusCode': 403,
+                'headers': headers,
+                'body': json.dumps({'error': 'Forbidden: Admin access required'}, ensure_ascii=False)
+            }
+        
+        query_params = event.get('queryStringParameters') or {}
+        status = query_params.get('status')
+        
+        announcement = ANNOUNCEMENTS_TABLE.get_item(Key={'id': announcement_id}).get('Item')
+        if announcement and announcement.get('target_type') == 'all':
+            # 全社員向けは受信箱がないため、現在の従業員と既読記録から作成（1回で全件を返す）
+            read_status = get_all_announcement_read_status(announcement_id)
+            if status in ('read', 'unread'):
+                read_status = [entry for entry in read_status if entry['is_read'] == (status == 'read')]
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps({
+                    'read_status': read_status,
+                    'count': len(read_status),
+                    'next_page_token': None
+                }, ensure_ascii=False, default=str)
+            }
+        
+        equals = {'announcement_id': announcement_id}
+        if status in ('read', 'unread'):
+            equals['is_read'] = status == 'read'
+        
+        plan = plan_list_query('announcement-inbox', equals)
+        try:
+            inbox_items, next_page_token, plan = execute_list_page(
+                ANNOUNCEMENT_INBOX_TABLE, plan, parse_page_size(query_params), query_params.get('page_token')
+            )
+        except ValueError:
+            return invalid_page_token_response(headers)
+        
+        read_status = [{
+            'staff_id': item.get('staff_id'),
+            'worker_id': item.get('worker_id'),
+            'staff_name': item.get('staff_name', 'Unknown'),
+            'is_read': bool(item.get('is_read')),
+            'read_at': item.get('read_at')
+        } for item in inbox_items]
+        
+        return {
+            'statusCode': 200,
+            'headers': with_query_plan_header(headers, plan),
+            'body': json.dumps({
+                'read_status': read_status,
+                'count': len(read_status),
+                'next_page_token': next_page_token
+            }, ensure_ascii=False, default=str)
+        }
+    except Exception as e:
+        import traceback
+        print(f"Error getting announcement reads: {str(e)}")
+        print(traceback.format_exc())
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({
+                'error': '既読状況の取得に失敗しました',
+                'message': str(e)
+            }, ensure_ascii=False)
+        }
+
 def update_announcement(announcement_id, event, headers):
     """
     業務連絡更新（管理者のみ）
@@ -9083,7 +11548,22 @@ def update_announcement(announcement_id, event, headers):
             'updated_at': now
         }
         
-        ANNOUNCEMENTS_TABLE.put_item(Item=update_item)
+        # 編集可能な項目だけを更新する（既読時に加算される read_count などを上書きしない）
+        editable_fields = ['title', 'content', 'target_type', 'target_staff_ids', 'has_deadline', 'deadline', 'updated_at']
+        ANNOUNCEMENTS_TABLE.update_item(
+            Key={'id': announcement_id},
+            UpdateExpression='SET ' + ', '.join(f'#{field} = :{field}' for field in editable_fields),
+            ExpressionAttributeNames={f'#{field}': field for field in editable_fields},
+            ExpressionAttributeValues={f':{field}': update_item[field] for field in editable_fields}
+        )
+        
+        # 対象が変わった場合は受信箱の配信先を更新
+        if (update_item['target_type'] != existing.get('target_type') or
+                set(update_item.get('target_staff_ids') or []) != set(existing.get('target_staff_ids') or [])):
+            try:
+                sync_announcement_inbox(update_item)
+            except Exception as e:
+                print(f"Warning: Failed to sync announcement inbox: {str(e)}")
         
         return {
             'statusCode': 200,
@@ -9143,6 +11623,12 @@ def delete_announcement(announcement_id, event, headers):
         except Exception as e:
             print(f"Error deleting read records: {e}")
         
+        # 受信箱アイテムも削除
+        try:
+            delete_announcement_inbox(announcement_id, get_announcement_inbox_entries(announcement_id).keys())
+        except Exception as e:
+            print(f"Error deleting inbox items: {e}")
+        
         return {
             'statusCode': 200,
             'headers': headers,
@@ -9176,7 +11662,7 @@ def get_daily_reports(event, headers):
         date = query_params.get('date')
         date_from = query_params.get('date_from')
         date_to = query_params.get('date_to')
-        limit = int(query_params.get('limit', 100))
+        limit = parse_page_size(query_params, 100)
         
         if staff_id and date:
             # 特定の従業員の特定日の日報を取得
@@ -9198,47 +11684,28 @@ def get_daily_reports(event, headers):
                     }, ensure_ascii=False)
                 }
         else:
-            # フィルタリング条件を構築
-            filter_expressions = []
-            expression_attribute_names = {}
-            expression_attribute_values = {}
-            
-            if staff_id:
-                filter_expressions.append('#staff_id = :staff_id')
-                expression_attribute_names['#staff_id'] = 'staff_id'
-                expression_attribute_values[':staff_id'] = staff_id
-            
-            if date_from:
-                filter_expressions.append('#date >= :date_from')
-                expression_attribute_names['#date'] = 'date'
-                expression_attribute_values[':date_from'] = date_from
-            
-            if date_to:
-                filter_expressions.append('#date <= :date_to')
-                expression_attribute_names['#date'] = 'date'
-                expression_attribute_values[':date_to'] = date_to
-            
-            # スキャンでフィルタリング
-            if filter_expressions:
-                response = DAILY_REPORTS_TABLE.scan(
-                    FilterExpression=' AND '.join(filter_expressions),
-                    ExpressionAttributeNames=expression_attribute_names,
-                    ExpressionAttributeValues=expression_attribute_values,
-                    Limit=limit
+            # クエリプランナーでGSIを選択（該当インデックスがなければスキャン）
+            plan = plan_list_query(
+                'daily-reports',
+                {'staff_id': staff_id},
+                {'date': (date_from, date_to)}
+            )
+            try:
+                items, next_page_token, plan = execute_list_page(
+                    DAILY_REPORTS_TABLE, plan, limit, query_params.get('page_token'), descending=True
                 )
-            else:
-                response = DAILY_REPORTS_TABLE.scan(Limit=limit)
-            
-            items = response.get('Items', [])
+            except ValueError:
+                return invalid_page_token_response(headers)
             # 日付でソート（新しい順）
             items.sort(key=lambda x: x.get('date', ''), reverse=True)
             
             return {
                 'statusCode': 200,
-                'headers': headers,
+                'headers': with_query_plan_header(headers, plan),
                 'body': json.dumps({
                     'daily_reports': items,
-                    'count': len(items)
+                    'count': len(items),
+                    'next_page_token': next_page_token
                 }, ensure_ascii=False, default=str)
             }
     except Exception as e:
@@ -9416,44 +11883,27 @@ def get_todos(event, headers):
         query_params = event.get('queryStringParameters') or {}
         staff_id = query_params.get('staff_id')
         completed = query_params.get('completed')  # 'true' or 'false'
-        limit = int(query_params.get('limit', 100))
-        
-        # フィルタリング条件を構築
-        filter_expressions = []
-        expression_attribute_names = {}
-        expression_attribute_values = {}
-        
-        if staff_id:
-            filter_expressions.append('#staff_id = :staff_id')
-            expression_attribute_names['#staff_id'] = 'staff_id'
-            expression_attribute_values[':staff_id'] = staff_id
-        
-        if completed is not None:
-            filter_expressions.append('#completed = :completed')
-            expression_attribute_names['#completed'] = 'completed'
-            expression_attribute_values[':completed'] = completed.lower() == 'true'
-        
-        # スキャンでフィルタリング
-        if filter_expressions:
-            response = TODOS_TABLE.scan(
-                FilterExpression=' AND '.join(filter_expressions),
-                ExpressionAttributeNames=expression_attribute_names,
-                ExpressionAttributeValues=expression_attribute_values,
-                Limit=limit
-            )
-        else:
-            response = TODOS_TABLE.scan(Limit=limit)
+        limit = parse_page_size(query_params, 100)
         
-        items = response.get('Items', [])
+        # クエリプランナーでGSIを選択（該当インデックスがなければスキャン）
+        plan = plan_list_query('todos', {
+            'staff_id': staff_id,
+            'completed': completed.lower() == 'true' if completed is not None else None
+        })
+        try:
+            items, next_page_token, plan = execute_list_page(TODOS_TABLE, plan, limit, query_params.get('page_token'), descending=True)
+        except ValueError:
+            return invalid_page_token_response(headers)
         # 作成日時でソート（新しい順）
         items.sort(key=lambda x: x.get('created_at', ''), reverse=True)
         
         return {
             'statusCode': 200,
-            'headers': headers,
+            'headers': with_query_plan_header(headers, plan),
             'body': json.dumps({
                 'todos': items,
-                'count': len(items)
+                'count': len(items),
+                'next_page_token': next_page_token
             }, ensure_ascii=False, default=str)
         }
     except Exception as e:
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+既存の業務連絡（business-announcements）を対象者の受信箱（announcement-inbox）に配信するスクリプト（1回限りの移行）
+
+- 個別向けの業務連絡ごとに lambda_function.resolve_announcement_recipients で対象者を解決し、未配信の対象者にだけ書き込む
+- 全社員向けは受信箱を使わない（created_at-index から返す）ため、以前の配信で書き込まれた受信箱アイテムを削除する
+- 既読記録（business-announcement-reads）がある対象者は既読として書き込む
+- 対象者数・既読数のカウンター（audience_count / read_count）が未設定の業務連絡は受信箱から集計して設定する
+- 何度実行しても、既に配信済みの受信箱アイテム（既読状態を含む）は変更しない
+
+使い方:
+    python3 scripts/backfill_announcement_inbox.py [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+
+from boto3.dynamodb.conditions import Key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import lambda_function as lf  # noqa: E402
+
+
+def get_read_times(announcement_id):
+    """staff_id -> 既読日時"""
+    read_times = {}
+    query_kwargs = {
+        'IndexName': 'announcement_id-read_at-index',
+        'KeyConditionExpression': Key('announcement_id').eq(announcement_id)
+    }
+    while True:
+        response = lf.ANNOUNCEMENT_READS_TABLE.query(**query_kwargs)
+        for item in response.get('Items', []):
+            read_times[item.get('staff_id')] = item.get('read_at')
+        if 'LastEvaluatedKey' not in response:
+            return read_times
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill announcement-inbox from business-announcements')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    total_announcements = 0
+    total_written = 0
+    for announcement in lf.parallel_scan(lf.ANNOUNCEMENTS_TABLE):
+        if not announcement.get('id') or not announcement.get('created_at'):
+            continue
+        total_announcements += 1
+        if announcement.get('target_type') == 'all':
+            stale = lf.get_announcement_inbox_entries(announcement['id']).keys()
+            print(f"{announcement['id']}  all staff  inbox items to delete={len(stale)}")
+            if stale and not args.dry_run:
+                lf.delete_announcement_inbox(announcement['id'], stale)
+            continue
+        recipients = lf.resolve_announcement_recipients(
+            announcement.get('target_type'), announcement.get('target_staff_ids', [])
+        )
+        existing = lf.get_announcement_inbox_entries(announcement['id']).keys()
+        missing = [recipients[staff_id] for staff_id in recipients.keys() - existing]
+        read_times = get_read_times(announcement['id'])
+        print(f"{announcement['id']}  recipients={len(recipients)}  already delivered={len(existing)}  "
+              f"to write={len(missing)}  read={len(read_times)}")
+        if args.dry_run:
+            continue
+
+        with lf.ANNOUNCEMENT_INBOX_TABLE.batch_writer() as batch:
+            for recipient in missing:
+                read_at = read_times.get(recipient['staff_id'])
+                item = {
+                    **{k: v for k, v in recipient.items() if v is not None},
+                    'announcement_id': announcement['id'],
+                    'created_at': announcement['created_at'],
+                    'is_read': bool(read_at)
+                }
+                if read_at:
+                    item['read_at'] = read_at
+                batch.put_item(Item=item)
+        total_written += len(missing)
+
+        if 'audience_count' not in announcement:
+            entries = lf.get_announcement_inbox_entries(announcement['id'])
+            try:
+                lf.ANNOUNCEMENTS_TABLE.update_item(
+                    Key={'id': announcement['id']},
+                    UpdateExpression='SET audience_count = :audience, read_count = :read',
+                    ConditionExpression='attribute_not_exists(audience_count)',
+                    ExpressionAttributeValues={
+                        ':audience': len(entries),
+                        ':read': sum(1 for is_read in entries.values() if is_read)
+                    }
+                )
+            except lf.ANNOUNCEMENTS_TABLE.meta.client.exceptions.ConditionalCheckFailedException:
+                pass
+
+    print(f"Done: announcements={total_announcements}  inbox items written={total_written}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+既存の勤怠記録（attendance）から attendance-monthly-summaries の集計を作成するスクリプト
+
+- 集計の書き込みを有効にした Lambda をデプロイした後に実行する
+- 従業員・月ごとに lambda_function.rebuild_attendance_summary で勤怠記録から集計を作り直す（上書きのため何度実行してもよい）
+- 差分更新がずれた場合の修復にも使える（--month / --staff-id で対象を絞り込み）
+
+使い方:
+    python3 scripts/backfill_attendance_summaries.py [--month 2025-01] [--staff-id W001] [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import lambda_function as lf  # noqa: E402
+
+
+def scan_staff_months(month=None, staff_id=None):
+    """勤怠記録が存在する (staff_id, month) の一覧"""
+    targets = set()
+    scan_kwargs = {'ProjectionExpression': 'staff_id, #date', 'ExpressionAttributeNames': {'#date': 'date'}}
+    for item in lf.parallel_scan(lf.ATTENDANCE_TABLE, scan_kwargs):
+        if not item.get('staff_id') or not item.get('date'):
+            continue
+        target = (item['staff_id'], str(item['date'])[:7])
+        if (month and target[1] != month) or (staff_id and target[0] != staff_id):
+            continue
+        targets.add(target)
+    return sorted(targets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild attendance-monthly-summaries from attendance')
+    parser.add_argument('--month', help='YYYY-MM')
+    parser.add_argument('--staff-id')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    targets = scan_staff_months(args.month, args.staff_id)
+    print(f"summary items to rebuild={len(targets)}")
+    if args.dry_run:
+        for staff_id, month in targets[:20]:
+            print(f"  {staff_id} {month}")
+        return
+
+    for staff_id, month in targets:
+        summary = lf.rebuild_attendance_summary(staff_id, month)
+        print(f"  {staff_id} {month} records={summary['record_count']} work_hours={summary['work_hours']}")
+    print(f"Done: {len(targets)} summary items rebuilt")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+既存の入出庫履歴（inventory-transactions）から inventory-rollups の集計を作成するスクリプト（1回限りの移行）
+
+- 集計の書き込みを有効にした Lambda をデプロイした後、デプロイ時刻を --until に指定して実行する
+  （--until より前の履歴だけを集計し、デプロイ後に Lambda が加算した値と重複させない）
+- 集計は ADD で加算するため、同じ期間を2回実行すると二重に加算される点に注意
+- 履歴は90日で削除されるため、それより前の集計は作成できない
+
+使い方:
+    python3 scripts/backfill_inventory_rollups.py --until 2025-01-01T00:00:00+00:00 [--dry-run]
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+REGION = 'ap-northeast-1'
+JST = timezone(timedelta(hours=9))
+
+
+def scan_transactions(table, until):
+    scan_kwargs = {'FilterExpression': Attr('created_at').lt(until)}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            yield item
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def aggregate(transactions):
+    """(scope, period) ごとに入出庫数・件数・最終入出庫を集計（lambda_function.build_inventory_rollup_items と同じキー）"""
+    rollups = defaultdict(lambda: {'quantity': defaultdict(int), 'count': defaultdict(int), 'attributes': {}})
+    for tx in transactions:
+        tx_type = tx.get('type')
+        if tx_type not in ('in', 'out') or not tx.get('created_at'):
+            continue
+        jst_time = datetime.fromisoformat(tx['created_at']).astimezone(JST)
+        periods = [f"day#{jst_time.strftime('%Y-%m-%d')}", f"month#{jst_time.strftime('%Y-%m')}"]
+        quantity = int(tx.get('quantity', 0))
+        targets = []
+        if tx.get('product_id'):
+            product_attributes = {'product_id': tx['product_id'], 'product_name': tx.get('product_name', '')}
+            targets += [(f"product#{tx['product_id']}", period, product_attributes) for period in periods + ['total']]
+        if tx.get('staff_id'):
+            staff_attributes = {'staff_id': tx['staff_id'], 'staff_name': tx.get('staff_name', '')}
+            targets += [(f"staff#{tx['staff_id']}", period, staff_attributes) for period in periods]
+        for scope, period, attributes in targets:
+            rollup = rollups[(scope, period)]
+            rollup['quantity'][tx_type] += quantity
+            rollup['count'][tx_type] += 1
+            rollup['attributes'].update(attributes)
+            if period == 'total' and tx['created_at'] > rollup['attributes'].get(f'last_{tx_type}_at', ''):
+                rollup['attributes'].update({
+                    f'last_{tx_type}_at': tx['created_at'],
+                    f'last_{tx_type}_staff_id': tx.get('staff_id', ''),
+                    f'last_{tx_type}_staff_name': tx.get('staff_name', '')
+                })
+    return rollups
+
+
+def write_rollup(table, scope, period, rollup):
+    add_parts = []
+    set_parts = []
+    values = {}
+    for tx_type, quantity in rollup['quantity'].items():
+        add_parts.append(f'{tx_type}_quantity :{tx_type}_quantity, {tx_type}_count :{tx_type}_count')
+        values[f':{tx_type}_quantity'] = quantity
+        values[f':{tx_type}_count'] = rollup['count'][tx_type]
+    for name, value in rollup['attributes'].items():
+        # 商品名・最終入出庫などは Lambda が記録した新しい値を優先する
+        set_parts.append(f'{name} = if_not_exists({name}, :{name})')
+        values[f':{name}'] = value
+    table.update_item(
+        Key={'scope': scope, 'period': period},
+        UpdateExpression='ADD ' + ', '.join(add_parts) + ' SET ' + ', '.join(set_parts),
+        ExpressionAttributeValues=values
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill inventory-rollups from inventory-transactions')
+    parser.add_argument('--until', required=True, help='ISO8601 timestamp of the Lambda deployment (exclusive)')
+    parser.add_argument('--transactions-table', default='inventory-transactions')
+    parser.add_argument('--rollups-table', default='inventory-rollups')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    transactions_table = dynamodb.Table(args.transactions_table)
+    rollups_table = dynamodb.Table(args.rollups_table)
+
+    transactions = list(scan_transactions(transactions_table, args.until))
+    rollups = aggregate(transactions)
+    print(f"transactions={len(transactions)}  rollup items={len(rollups)}")
+    if args.dry_run:
+        for (scope, period), rollup in sorted(rollups.items())[:20]:
+            print(f"  {scope} {period} quantity={dict(rollup['quantity'])} count={dict(rollup['count'])}")
+        return
+
+    for index, ((scope, period), rollup) in enumerate(sorted(rollups.items()), 1):
+        write_rollup(rollups_table, scope, period, rollup)
+        if index % 100 == 0:
+            print(f"  written {index}/{len(rollups)}")
+    print(f"Done: {len(rollups)} rollup items updated")
+
+
+if __name__ == '__main__':
+    main()
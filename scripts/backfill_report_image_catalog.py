@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+既存の report-images に catalog_key を設定するスクリプト（1回限りの移行）
+
+catalog_key = "{category}#{folder_name}#{uploaded_at}"（lambda_function.build_report_image_catalog_key と同じ形式）
+cleaning_date-catalog_key-index はこの属性を持つアイテムのみを含むため、
+インデックス作成後にこのスクリプトで既存画像を登録する。
+
+使い方:
+    python3 scripts/backfill_report_image_catalog.py [--dry-run]
+"""
+
+import argparse
+
+import boto3
+
+REGION = 'ap-northeast-1'
+
+
+def escape_catalog_component(value):
+    return (value or '').replace('%', '%25').replace('#', '%23')
+
+
+def build_catalog_key(item):
+    return f"{item.get('category', '')}#{escape_catalog_component(item.get('folder_name'))}#{item.get('uploaded_at', '')}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill catalog_key on report-images')
+    parser.add_argument('--table', default='report-images')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    table = dynamodb.Table(args.table)
+
+    total = 0
+    updated = 0
+    skipped = 0
+    scan_kwargs = {}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            total += 1
+            if not item.get('cleaning_date') or not item.get('category'):
+                skipped += 1
+                continue
+            catalog_key = build_catalog_key(item)
+            if item.get('catalog_key') == catalog_key:
+                continue
+            if not args.dry_run:
+                table.update_item(
+                    Key={'image_id': item['image_id']},
+                    UpdateExpression='SET catalog_key = :k',
+                    ExpressionAttributeValues={':k': catalog_key}
+                )
+            updated += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    action = 'would update' if args.dry_run else 'updated'
+    print(f"images={total}  {action}={updated}  skipped (no cleaning_date/category)={skipped}")
+
+
+if __name__ == '__main__':
+    main()
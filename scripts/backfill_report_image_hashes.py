@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+既存の report-images の画像ハッシュを report-image-hashes に登録するスクリプト（1回限りの移行）
+
+- image_hash を持つアイテムを全件スキャンし、ハッシュごとに最も古い画像を登録する
+- 既に登録済みのハッシュは上書きしない（attribute_not_exists 条件付き書き込み）
+- report-images は lambda_function.parallel_scan で並列にスキャンする
+
+使い方:
+    python3 scripts/backfill_report_image_hashes.py [--dry-run] [--segments 8]
+"""
+
+import argparse
+import os
+import sys
+
+import boto3
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import lambda_function as lf  # noqa: E402
+
+REGION = 'ap-northeast-1'
+CLAIM_FIELDS = ['image_id', 'url', 's3_key', 'category', 'cleaning_date', 'uploaded_at', 'folder_name']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill report-image-hashes from report-images')
+    parser.add_argument('--images-table', default='report-images')
+    parser.add_argument('--hashes-table', default='report-image-hashes')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--segments', type=int, default=8, help='number of parallel scan segments')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    images_table = dynamodb.Table(args.images_table)
+    hashes_table = dynamodb.Table(args.hashes_table)
+
+    oldest_by_hash = {}
+    total = 0
+    without_hash = 0
+    for item in lf.parallel_scan(images_table, total_segments=args.segments):
+        total += 1
+        image_hash = item.get('image_hash')
+        if not image_hash:
+            without_hash += 1
+            continue
+        current = oldest_by_hash.get(image_hash)
+        if current is None or item.get('uploaded_at', '') < current.get('uploaded_at', ''):
+            oldest_by_hash[image_hash] = item
+
+    duplicates = total - without_hash - len(oldest_by_hash)
+    print(f"images={total}  without image_hash={without_hash}  unique hashes={len(oldest_by_hash)}  duplicates={duplicates}")
+    if args.dry_run:
+        return
+
+    written = 0
+    skipped = 0
+    for image_hash, item in oldest_by_hash.items():
+        claim = {'image_hash': image_hash}
+        for field in CLAIM_FIELDS:
+            if item.get(field):
+                claim[field] = item[field]
+        try:
+            hashes_table.put_item(Item=claim, ConditionExpression='attribute_not_exists(image_hash)')
+            written += 1
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            skipped += 1
+    print(f"written={written}  already registered={skipped}")
+
+
+if __name__ == '__main__':
+    main()
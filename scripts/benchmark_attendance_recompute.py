@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+勤怠の計算エンジン（lambda_function.compute_attendance_metrics_batch）を計測するスクリプト
+
+- 合成した勤怠記録（既定 100,000件）を列ごとの配列にして、1件ずつの計算と NumPy の一括計算を比較する
+- 両者の計算結果が一致することも確認する（NumPy がない環境では1件ずつの計算のみ）
+- DynamoDB にはアクセスしない
+
+使い方:
+    python3 scripts/benchmark_attendance_recompute.py [--records 100000] [--seed 1]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# lambda_function はインポート時にboto3のクライアントを作成するため、リージョン未設定の環境でも読み込めるようにする
+os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-northeast-1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import lambda_function as lf  # noqa: E402
+
+FIELDS = ('clock_in', 'clock_out', 'break_hours', 'scheduled_start', 'scheduled_end', 'scheduled_work_hours', 'is_holiday')
+
+
+def generate_columns(count, seed):
+    """出勤 8:00〜10:30・退勤 16:30〜21:00（JST）前後の記録を合成（一部は未退勤・所定時刻なし）"""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1, tzinfo=timezone(timedelta(hours=9)))
+    columns = {name: [] for name in FIELDS}
+    for _ in range(count):
+        day = base + timedelta(days=rng.randrange(365))
+        clock_in = day + timedelta(minutes=rng.randrange(8 * 60, 10 * 60 + 30), seconds=rng.randrange(60))
+        clock_out = day + timedelta(minutes=rng.randrange(16 * 60 + 30, 21 * 60), seconds=rng.randrange(60))
+        has_schedule = rng.random() > 0.05
+        columns['clock_in'].append(clock_in.timestamp())
+        columns['clock_out'].append(clock_out.timestamp() if rng.random() > 0.1 else None)
+        columns['break_hours'].append(rng.choice([0.0, 0.5, 0.75, 1.0]))
+        columns['scheduled_start'].append(rng.choice([9 * 60, 9 * 60 + 30]) if has_schedule else None)
+        columns['scheduled_end'].append(rng.choice([18 * 60, 17 * 60 + 30]) if has_schedule else None)
+        columns['scheduled_work_hours'].append(rng.choice([8.0, 7.5]))
+        columns['is_holiday'].append(rng.random() < 0.03)
+    return columns
+
+
+def row_by_row(columns):
+    count = len(columns['clock_in'])
+    rows = [lf._attendance_metrics_row(*(columns[name][i] for name in FIELDS)) for i in range(count)]
+    return {field: [row[field] for row in rows] for field in rows[0]}
+
+
+def compare(expected, actual):
+    """一致しない件数（時間は丸め後の値で比較）"""
+    mismatches = 0
+    for i in range(len(expected['status'])):
+        left = lf.attendance_metrics_fields({f: v[i] for f, v in expected.items()}, 0)
+        right = lf.attendance_metrics_fields({f: v[i] for f, v in actual.items()}, 0)
+        if left != right:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  [warn] row {i}: {left} != {right}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the attendance metrics engine')
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    columns = generate_columns(args.records, args.seed)
+    print(f"records={args.records}  numpy={'yes' if lf.NUMPY_AVAILABLE else 'no'}")
+
+    start = time.perf_counter()
+    expected = row_by_row(columns)
+    print(f"row by row : {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    if not lf.NUMPY_AVAILABLE:
+        print("NumPy is not installed; skipping the vectorised run.")
+        return
+
+    start = time.perf_counter()
+    actual = lf.compute_attendance_metrics_batch(columns)
+    print(f"numpy batch: {(time.perf_counter() - start) * 1000:.1f}ms")
+    print(f"mismatches={compare(expected, actual)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+レポート写真アップロードの直列・並列の処理時間を比較するベンチマーク
+
+ローカルに簡易S3（PUTを受けて指定ミリ秒待ってから200を返すHTTPサーバー）を立て、
+lambda_function.s3_client をそこへ向けた boto3 クライアントに差し替えて
+upload_photos_concurrently を max_workers=1（直列）と並列で実行する。
+AWSへの通信は発生しない。
+
+使い方:
+    python3 scripts/benchmark_photo_uploads.py [--photos 40] [--size-kb 300] [--latency-ms 80] [--workers 8]
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+from botocore.config import Config
+
+
+def make_fake_s3_handler(latency_seconds):
+    class FakeS3Handler(BaseHTTPRequestHandler):
+        # botocore は PUT に Expect: 100-continue を付けるため HTTP/1.1 で応答する
+        protocol_version = 'HTTP/1.1'
+
+        def do_PUT(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(length)
+            time.sleep(latency_seconds)
+            self.send_response(200)
+            self.send_header('ETag', '"benchmark"')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeS3Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark serial vs parallel report photo uploads')
+    parser.add_argument('--photos', type=int, default=40)
+    parser.add_argument('--size-kb', type=int, default=300)
+    parser.add_argument('--latency-ms', type=int, default=80)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_fake_s3_handler(args.latency_ms / 1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-northeast-1')
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    import lambda_function as lf
+
+    lf.s3_client = boto3.client(
+        's3',
+        endpoint_url=endpoint,
+        region_name='ap-northeast-1',
+        aws_access_key_id='benchmark',
+        aws_secret_access_key='benchmark',
+        config=Config(s3={'addressing_style': 'path'}, max_pool_connections=max(10, args.workers))
+    )
+
+    photos = [
+        'data:image/jpeg;base64,' + base64.b64encode(os.urandom(args.size_kb * 1024)).decode('ascii')
+        for _ in range(args.photos)
+    ]
+    print(f"{args.photos} photos x {args.size_kb}KB, simulated PutObject latency {args.latency_ms}ms")
+
+    results = {}
+    for label, workers in (('serial', 1), ('parallel', args.workers)):
+        start = time.perf_counter()
+        # report_id なし: photo-blobs への参照登録を行わずアップロードのみ計測
+        uploaded = lf.upload_photos_concurrently(photos, max_workers=workers)
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for result in uploaded if result['error'])
+        expected_hashes = [hashlib.sha256(base64.b64decode(photo.split(',', 1)[1])).hexdigest() for photo in photos]
+        in_order = [result['content_hash'] for result in uploaded] == expected_hashes
+        results[label] = elapsed
+        print(f"{label:<9} workers={workers:<3} {elapsed * 1000:8.0f} ms  failed={failed}  order preserved={in_order}")
+
+    print(f"speedup: {results['serial'] / results['parallel']:.1f}x")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
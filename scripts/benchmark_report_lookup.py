@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+staff-reports の report_id 検索を計測・移行確認するスクリプト
+
+- 旧実装: FilterExpression + Limit=10 のページングスキャン（テーブルサイズに比例して遅くなる）
+- 新実装: report_id パーティションキーへのクエリ1回（テーブルサイズに依存しない）
+
+実行内容:
+1. テーブルを一度だけ全件スキャンし、report_id を持たないアイテムや重複を報告（移行確認）
+2. サンプリングした report_id について旧実装・新実装それぞれのレイテンシと往復回数を計測
+
+使い方:
+    python3 scripts/benchmark_report_lookup.py [--samples 20] [--table staff-reports]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+import boto3
+from boto3.dynamodb.conditions import Key, Attr
+
+REGION = 'ap-northeast-1'
+
+
+def scan_all_report_ids(table):
+    """移行確認: 全件スキャンして report_id の一覧と問題のあるアイテムを取得"""
+    report_ids = []
+    missing = 0
+    counts = {}
+    scan_kwargs = {'ProjectionExpression': 'report_id'}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            report_id = item.get('report_id')
+            if not report_id:
+                missing += 1
+                continue
+            report_ids.append(report_id)
+            counts[report_id] = counts.get(report_id, 0) + 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    duplicates = [report_id for report_id, count in counts.items() if count > 1]
+    return report_ids, missing, duplicates
+
+
+def legacy_scan_lookup(table, report_id):
+    """旧実装のスキャン検索（往復回数も返す）"""
+    round_trips = 0
+    scan_kwargs = {
+        'FilterExpression': Attr('report_id').eq(report_id),
+        'Limit': 10
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        round_trips += 1
+        items = response.get('Items', [])
+        if items:
+            return items[0], round_trips
+        if 'LastEvaluatedKey' not in response:
+            return None, round_trips
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def key_lookup(table, report_id):
+    """新実装のキー検索（lambda_function.get_report_by_id と同じクエリ）"""
+    response = table.query(
+        KeyConditionExpression=Key('report_id').eq(report_id),
+        ScanIndexForward=False,
+        Limit=1
+    )
+    items = response.get('Items', [])
+    return (items[0] if items else None), 1
+
+
+def measure(lookup, table, report_ids):
+    latencies = []
+    round_trips = []
+    not_found = 0
+    for report_id in report_ids:
+        start = time.perf_counter()
+        item, trips = lookup(table, report_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+        round_trips.append(trips)
+        if item is None:
+            not_found += 1
+    return latencies, round_trips, not_found
+
+
+def print_result(label, latencies, round_trips, not_found):
+    print(f"{label}:")
+    print(f"  latency  median={statistics.median(latencies):.1f}ms  max={max(latencies):.1f}ms")
+    print(f"  requests median={statistics.median(round_trips)}  max={max(round_trips)}")
+    print(f"  not found={not_found}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark report_id lookup on staff-reports')
+    parser.add_argument('--table', default='staff-reports')
+    parser.add_argument('--samples', type=int, default=20)
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    table = dynamodb.Table(args.table)
+
+    print(f"Scanning {args.table} once to collect report IDs...")
+    report_ids, missing, duplicates = scan_all_report_ids(table)
+    print(f"  items={len(report_ids) + missing}  without report_id={missing}  duplicated report_id={len(duplicates)}")
+    for report_id in duplicates[:10]:
+        print(f"  [warn] duplicated report_id: {report_id}")
+    if not report_ids:
+        print("No reports found; nothing to benchmark.")
+        return
+
+    samples = random.sample(report_ids, min(args.samples, len(report_ids)))
+    print(f"Benchmarking {len(samples)} lookups...")
+    print_result('legacy scan', *measure(legacy_scan_lookup, table, samples))
+    print_result('key query', *measure(key_lookup, table, samples))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+verify_firebase_token の検証コストを計測するマイクロベンチマーク
+
+- cold: キャッシュなし（ヘッダー/ペイロードのデコード + RS256 署名検証）
+- warm: 検証済みトークンキャッシュのヒット（トークンのハッシュ計算 + 辞書参照）
+- legacy: 署名検証なしでペイロードをデコードするだけの旧実装相当
+
+テスト用のRSA鍵をその場で生成し、COGNITO_JWKS_JSON 経由で lambda_function に渡す。
+AWSへの通信は発生しない。
+
+使い方:
+    python3 scripts/benchmark_token_verification.py [--iterations 2000] [--bits 2048]
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+SHA256_DIGEST_INFO_PREFIX = bytes.fromhex('3031300d060960864801650304020105000420')
+
+
+def b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def is_probable_prime(n, rounds=40):
+    if n < 4:
+        return n in (2, 3)
+    for p in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29):
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for _ in range(rounds):
+        x = pow(random.randrange(2, n - 2), d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def generate_prime(bits):
+    while True:
+        candidate = random.getrandbits(bits) | (1 << (bits - 1)) | 1
+        if is_probable_prime(candidate):
+            return candidate
+
+
+def generate_rsa_key(bits, e=65537):
+    while True:
+        p = generate_prime(bits // 2)
+        q = generate_prime(bits // 2)
+        phi = (p - 1) * (q - 1)
+        if p != q and phi % e != 0:
+            n = p * q
+            if n.bit_length() == bits:
+                return n, e, pow(e, -1, phi)
+
+
+def sign_rs256(message, n, d):
+    key_length = (n.bit_length() + 7) // 8
+    digest_info = SHA256_DIGEST_INFO_PREFIX + hashlib.sha256(message).digest()
+    encoded = b'\x00\x01' + b'\xff' * (key_length - len(digest_info) - 3) + b'\x00' + digest_info
+    return pow(int.from_bytes(encoded, 'big'), d, n).to_bytes(key_length, 'big')
+
+
+def make_token(n, d, kid, issuer):
+    header = {'alg': 'RS256', 'kid': kid}
+    payload = {
+        'sub': 'benchmark-user',
+        'email': 'benchmark@example.com',
+        'cognito:groups': ['staff'],
+        'iss': issuer,
+        'token_use': 'id',
+        'exp': int(time.time()) + 3600
+    }
+    signing_input = f"{b64url(json.dumps(header).encode())}.{b64url(json.dumps(payload).encode())}"
+    return f"{signing_input}.{b64url(sign_rs256(signing_input.encode('ascii'), n, d))}"
+
+
+def legacy_decode(id_token):
+    payload_part = id_token.split('.')[1]
+    return json.loads(base64.urlsafe_b64decode(payload_part + '=' * (-len(payload_part) % 4)))
+
+
+def bench(label, fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8} {elapsed / iterations * 1e6:10.1f} us/call  ({iterations} calls)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark verify_firebase_token cold/warm cost')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--bits', type=int, default=2048)
+    args = parser.parse_args()
+
+    print(f"Generating {args.bits}-bit test key...")
+    n, e, d = generate_rsa_key(args.bits)
+    kid = 'benchmark-key'
+    os.environ['COGNITO_JWKS_JSON'] = json.dumps({'keys': [{
+        'kty': 'RSA', 'alg': 'RS256', 'use': 'sig', 'kid': kid,
+        'n': b64url(n.to_bytes((n.bit_length() + 7) // 8, 'big')),
+        'e': b64url(e.to_bytes(3, 'big'))
+    }]})
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-northeast-1')
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    import lambda_function as lf
+
+    token = make_token(n, d, kid, lf.COGNITO_TOKEN_ISSUER)
+    user_info = lf.verify_firebase_token(token)
+    if not user_info:
+        print("Verification failed; aborting.")
+        sys.exit(1)
+    print(f"Verified: uid={user_info['uid']} role={user_info['role']}")
+
+    def cold():
+        lf.clear_verified_token_cache()
+        lf.verify_firebase_token(token)
+
+    bench('legacy', lambda: legacy_decode(token), args.iterations)
+    bench('cold', cold, args.iterations)
+    bench('warm', lambda: lf.verify_firebase_token(token), args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@ set -e
 REGION="ap-northeast-1"
 ANNOUNCEMENTS_TABLE="business-announcements"
 ANNOUNCEMENT_READS_TABLE="business-announcement-reads"
+ANNOUNCEMENT_INBOX_TABLE="announcement-inbox"
 
 echo "=== Announcements DynamoDBテーブル作成を開始 ==="
 
@@ -98,11 +99,69 @@ else
   echo "✅ テーブル ${ANNOUNCEMENT_READS_TABLE} の作成が完了しました"
 fi
 
+# 3. announcement-inboxテーブルを作成（対象者ごとの受信箱）
+# - staff_id + announcement_id をキーにし、既読は is_read / read_at で管理
+# - LSI staff_id-created_at-index: 清掃員ごとの一覧（新しい順）
+# - GSI announcement_id-staff_id-index: 業務連絡ごとの対象者
+# 既存の業務連絡の配信は scripts/backfill_announcement_inbox.py で行う
+if aws dynamodb describe-table \
+  --table-name ${ANNOUNCEMENT_INBOX_TABLE} \
+  --region ${REGION} &>/dev/null; then
+  echo "テーブル ${ANNOUNCEMENT_INBOX_TABLE} は既に存在します"
+else
+  echo "テーブル ${ANNOUNCEMENT_INBOX_TABLE} を作成中..."
+  aws dynamodb create-table \
+    --table-name ${ANNOUNCEMENT_INBOX_TABLE} \
+    --attribute-definitions \
+      AttributeName=staff_id,AttributeType=S \
+      AttributeName=announcement_id,AttributeType=S \
+      AttributeName=created_at,AttributeType=S \
+    --key-schema \
+      AttributeName=staff_id,KeyType=HASH \
+      AttributeName=announcement_id,KeyType=RANGE \
+    --local-secondary-indexes \
+      "[
+        {
+          \"IndexName\": \"staff_id-created_at-index\",
+          \"KeySchema\": [
+            {\"AttributeName\": \"staff_id\", \"KeyType\": \"HASH\"},
+            {\"AttributeName\": \"created_at\", \"KeyType\": \"RANGE\"}
+          ],
+          \"Projection\": {
+            \"ProjectionType\": \"ALL\"
+          }
+        }
+      ]" \
+    --global-secondary-indexes \
+      "[
+        {
+          \"IndexName\": \"announcement_id-staff_id-index\",
+          \"KeySchema\": [
+            {\"AttributeName\": \"announcement_id\", \"KeyType\": \"HASH\"},
+            {\"AttributeName\": \"staff_id\", \"KeyType\": \"RANGE\"}
+          ],
+          \"Projection\": {
+            \"ProjectionType\": \"ALL\"
+          }
+        }
+      ]" \
+    --billing-mode PAY_PER_REQUEST \
+    --region ${REGION}
+
+  echo "テーブル ${ANNOUNCEMENT_INBOX_TABLE} の作成を開始しました"
+  echo "テーブルがアクティブになるまで待機中..."
+  aws dynamodb wait table-exists \
+    --table-name ${ANNOUNCEMENT_INBOX_TABLE} \
+    --region ${REGION}
+  echo "✅ テーブル ${ANNOUNCEMENT_INBOX_TABLE} の作成が完了しました"
+fi
+
 echo ""
 echo "=== テーブル作成完了 ==="
 echo "作成されたテーブル:"
 echo "  - ${ANNOUNCEMENTS_TABLE}"
 echo "  - ${ANNOUNCEMENT_READS_TABLE}"
+echo "  - ${ANNOUNCEMENT_INBOX_TABLE}"
 echo "リージョン: ${REGION}"
 echo ""
 echo "✅ すべてのテーブルが正常に作成されました"
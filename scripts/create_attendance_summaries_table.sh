@@ -0,0 +1,44 @@
+#!/bin/bash
+
+# 勤怠の月次集計用DynamoDBテーブルを作成（給与計算・エクスポート用）
+# - staff_id: 従業員ID（勤怠記録の staff_id）
+# - month: 'YYYY-MM'（勤怠記録の date の月）
+# - work_hours / overtime_hours / total_hours / break_time / late_minutes / early_leave_minutes: 合計
+# - record_count / completed_count / late_count / early_leave_count / holiday_work_count: 件数
+# - month-staff_id-index: 月を指定して全従業員の集計を取得する
+#
+# 既存の勤怠記録からの集計は scripts/backfill_attendance_summaries.py で行う
+
+TABLE_NAME="attendance-monthly-summaries"
+REGION="ap-northeast-1"
+
+echo "Creating DynamoDB table: $TABLE_NAME"
+
+aws dynamodb create-table \
+  --table-name $TABLE_NAME \
+  --attribute-definitions \
+    AttributeName=staff_id,AttributeType=S \
+    AttributeName=month,AttributeType=S \
+  --key-schema \
+    AttributeName=staff_id,KeyType=HASH \
+    AttributeName=month,KeyType=RANGE \
+  --global-secondary-indexes \
+    "[
+      {
+        \"IndexName\": \"month-staff_id-index\",
+        \"KeySchema\": [
+          {\"AttributeName\": \"month\", \"KeyType\": \"HASH\"},
+          {\"AttributeName\": \"staff_id\", \"KeyType\": \"RANGE\"}
+        ],
+        \"Projection\": {
+          \"ProjectionType\": \"ALL\"
+        }
+      }
+    ]" \
+  --billing-mode PAY_PER_REQUEST \
+  --region $REGION
+
+echo "Waiting for table to be created..."
+aws dynamodb wait table-exists --table-name $TABLE_NAME --region $REGION
+
+echo "Table $TABLE_NAME created successfully!"
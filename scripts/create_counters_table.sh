@@ -0,0 +1,24 @@
+#!/bin/bash
+
+# ID採番カウンター用DynamoDBテーブルを作成
+# - counter_id: "{テーブル名}#{プレフィックス}"（例: workers#W, schedules#SCH-20250101）
+# - current_value: 最後に払い出した番号（Lambdaが ADD で原子的に加算）
+
+TABLE_NAME="counters"
+REGION="ap-northeast-1"
+
+echo "Creating DynamoDB table: $TABLE_NAME"
+
+aws dynamodb create-table \
+  --table-name $TABLE_NAME \
+  --attribute-definitions \
+    AttributeName=counter_id,AttributeType=S \
+  --key-schema \
+    AttributeName=counter_id,KeyType=HASH \
+  --billing-mode PAY_PER_REQUEST \
+  --region $REGION
+
+echo "Waiting for table to be created..."
+aws dynamodb wait table-exists --table-name $TABLE_NAME --region $REGION
+
+echo "Table $TABLE_NAME created successfully!"
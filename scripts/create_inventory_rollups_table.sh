@@ -0,0 +1,43 @@
+#!/bin/bash
+
+# 入出庫の集計用DynamoDBテーブルを作成
+# - scope: 'product#{product_id}' または 'staff#{staff_id}'
+# - period: 'day#YYYY-MM-DD' / 'month#YYYY-MM'（JST）、商品ごとの累計は 'total'
+# - in_quantity / out_quantity / in_count / out_count: 入出庫の確定時に加算
+# - period-scope-index: 期間を指定して全商品・全スタッフの集計を取得する
+#
+# 既存の履歴（inventory-transactions、直近90日分）からの集計は scripts/backfill_inventory_rollups.py で行う
+
+TABLE_NAME="inventory-rollups"
+REGION="ap-northeast-1"
+
+echo "Creating DynamoDB table: $TABLE_NAME"
+
+aws dynamodb create-table \
+  --table-name $TABLE_NAME \
+  --attribute-definitions \
+    AttributeName=scope,AttributeType=S \
+    AttributeName=period,AttributeType=S \
+  --key-schema \
+    AttributeName=scope,KeyType=HASH \
+    AttributeName=period,KeyType=RANGE \
+  --global-secondary-indexes \
+    "[
+      {
+        \"IndexName\": \"period-scope-index\",
+        \"KeySchema\": [
+          {\"AttributeName\": \"period\", \"KeyType\": \"HASH\"},
+          {\"AttributeName\": \"scope\", \"KeyType\": \"RANGE\"}
+        ],
+        \"Projection\": {
+          \"ProjectionType\": \"ALL\"
+        }
+      }
+    ]" \
+  --billing-mode PAY_PER_REQUEST \
+  --region $REGION
+
+echo "Waiting for table to be created..."
+aws dynamodb wait table-exists --table-name $TABLE_NAME --region $REGION
+
+echo "Table $TABLE_NAME created successfully!"
@@ -0,0 +1,64 @@
+#!/bin/bash
+# 一覧API用のGSIを作成するスクリプト
+# lambda_function.py の TABLE_INDEXES と対応（未作成のインデックスはLambda側でスキャンにフォールバック）
+# 既に存在するインデックスはスキップする
+
+REGION="ap-northeast-1"
+
+create_index() {
+  local TABLE_NAME=$1
+  local INDEX_NAME=$2
+  local HASH_KEY=$3
+  local RANGE_KEY=$4
+
+  if aws dynamodb describe-table --table-name ${TABLE_NAME} --region ${REGION} \
+    --query "Table.GlobalSecondaryIndexes[?IndexName=='${INDEX_NAME}'].IndexName" \
+    --output text 2>/dev/null | grep -q "${INDEX_NAME}"; then
+    echo "インデックス ${TABLE_NAME}/${INDEX_NAME} は既に存在します"
+    return
+  fi
+
+  local ATTRIBUTES="AttributeName=${HASH_KEY},AttributeType=S"
+  local KEY_SCHEMA="{\"AttributeName\": \"${HASH_KEY}\", \"KeyType\": \"HASH\"}"
+  if [ -n "${RANGE_KEY}" ]; then
+    ATTRIBUTES="${ATTRIBUTES} AttributeName=${RANGE_KEY},AttributeType=S"
+    KEY_SCHEMA="${KEY_SCHEMA}, {\"AttributeName\": \"${RANGE_KEY}\", \"KeyType\": \"RANGE\"}"
+  fi
+
+  echo "インデックス ${TABLE_NAME}/${INDEX_NAME} を作成中..."
+  aws dynamodb update-table \
+    --table-name ${TABLE_NAME} \
+    --attribute-definitions ${ATTRIBUTES} \
+    --global-secondary-index-updates \
+      "[{\"Create\": {\"IndexName\": \"${INDEX_NAME}\", \"KeySchema\": [${KEY_SCHEMA}], \"Projection\": {\"ProjectionType\": \"ALL\"}}}]" \
+    --region ${REGION} > /dev/null || return
+
+  # 同一テーブルへのGSI追加は1つずつしか行えないため、作成完了まで待機
+  echo "インデックスがアクティブになるまで待機中..."
+  while true; do
+    STATUS=$(aws dynamodb describe-table --table-name ${TABLE_NAME} --region ${REGION} \
+      --query "Table.GlobalSecondaryIndexes[?IndexName=='${INDEX_NAME}'].IndexStatus" --output text)
+    [ "${STATUS}" = "ACTIVE" ] && break
+    sleep 10
+  done
+  echo "✅ インデックス ${TABLE_NAME}/${INDEX_NAME} の作成が完了しました"
+}
+
+create_index schedules status-index status date
+create_index schedules assigned_to-index assigned_to date
+create_index schedules date-index date created_at
+create_index estimates store_id-created_at-index store_id created_at
+create_index estimates status-created_at-index status created_at
+create_index estimates schedule_id-index schedule_id
+create_index misesapo-clients firebase_uid-index firebase_uid
+create_index misesapo-clients email-index email
+create_index misesapo-clients status-index status
+create_index misesapo-stores brand_id-index brand_id
+create_index misesapo-stores client_id-index client_id
+create_index misesapo-brands client_id-index client_id
+create_index todos staff_id-created_at-index staff_id created_at
+create_index daily-reports staff_id-date-index staff_id date
+create_index cleaning-logs user_id-timestamp-index user_id timestamp
+create_index cleaning-logs facility_id-timestamp-index facility_id timestamp
+# 画像カタログ（既存画像の catalog_key は scripts/backfill_report_image_catalog.py で設定）
+create_index report-images cleaning_date-catalog_key-index cleaning_date catalog_key
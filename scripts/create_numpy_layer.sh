@@ -0,0 +1,63 @@
+#!/bin/bash
+# 勤怠の一括再計算用のNumPy Lambda Layerを作成するスクリプト
+# NumPyはネイティブ拡張を含むため、Lambdaの実行環境（Amazon Linux / x86_64）向けのホイールを取得する
+
+set -e
+
+REGION="ap-northeast-1"
+LAYER_NAME="numpy"
+PYTHON_VERSION="python3.12"
+FUNCTION_NAME="misesapo-s3-upload"
+
+echo "=== NumPy Lambda Layer作成スクリプト ==="
+
+TEMP_DIR=$(mktemp -d)
+echo "一時ディレクトリ: ${TEMP_DIR}"
+
+echo "NumPyをインストール中..."
+pip3 install numpy \
+  --platform manylinux2014_x86_64 \
+  --only-binary=:all: \
+  --python-version ${PYTHON_VERSION#python} \
+  -t ${TEMP_DIR}/python/lib/${PYTHON_VERSION}/site-packages/
+
+ZIP_FILE="${TEMP_DIR}/numpy-layer.zip"
+echo "ZIPファイルを作成中..."
+(cd ${TEMP_DIR} && zip -r ${ZIP_FILE} python > /dev/null)
+
+echo "Lambda Layerを作成中..."
+LAYER_ARN=$(aws lambda publish-layer-version \
+  --layer-name ${LAYER_NAME} \
+  --description "NumPy for attendance recompute" \
+  --zip-file fileb://${ZIP_FILE} \
+  --compatible-runtimes ${PYTHON_VERSION} \
+  --region ${REGION} \
+  --query 'LayerVersionArn' \
+  --output text)
+echo "Lambda Layer作成完了: ${LAYER_ARN}"
+
+# 既存のLayersに追加
+EXISTING_LAYERS=$(aws lambda get-function-configuration \
+  --function-name ${FUNCTION_NAME} \
+  --region ${REGION} \
+  --query 'Layers[?Arn!=`null`].Arn' \
+  --output text)
+
+if [ -z "$EXISTING_LAYERS" ] || [ "$EXISTING_LAYERS" == "None" ]; then
+  LAYERS="${LAYER_ARN}"
+else
+  LAYERS="${EXISTING_LAYERS} ${LAYER_ARN}"
+fi
+
+aws lambda update-function-configuration \
+  --function-name ${FUNCTION_NAME} \
+  --layers ${LAYERS} \
+  --region ${REGION} > /dev/null
+echo "Lambda関数にLayerを追加しました"
+
+rm -rf ${TEMP_DIR}
+
+echo ""
+echo "次のステップ:"
+echo "1. 所定時刻・休日を変更した後、POST /admin/attendance/recompute（{\"month\": \"YYYY-MM\", \"dry_run\": true}）で差分を確認してから再計算"
+echo "2. 計算エンジンの計測は scripts/benchmark_attendance_recompute.py"
@@ -0,0 +1,29 @@
+#!/bin/bash
+
+# レポート写真（コンテンツアドレス保存）の参照管理用DynamoDBテーブルを作成
+# - content_hash: 写真のSHA-256（S3キー photos/{先頭2文字}/{content_hash}.jpg）
+# - used_in_reports: 参照しているレポートIDの文字列セット（空になると属性ごと消える）
+# - unreferenced_at: used_in_reports が空になった時刻（再参照されると削除。GCの猶予期間の起点）
+# - uploaded: S3への保存が完了していれば true
+# - derivatives: サムネイル・WebPの生成結果
+#
+# 参照がなくなった写真は scripts/gc_photo_blobs.py で削除する
+
+TABLE_NAME="photo-blobs"
+REGION="ap-northeast-1"
+
+echo "Creating DynamoDB table: $TABLE_NAME"
+
+aws dynamodb create-table \
+  --table-name $TABLE_NAME \
+  --attribute-definitions \
+    AttributeName=content_hash,AttributeType=S \
+  --key-schema \
+    AttributeName=content_hash,KeyType=HASH \
+  --billing-mode PAY_PER_REQUEST \
+  --region $REGION
+
+echo "Waiting for table to be created..."
+aws dynamodb wait table-exists --table-name $TABLE_NAME --region $REGION
+
+echo "Table $TABLE_NAME created successfully!"
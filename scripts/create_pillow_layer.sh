@@ -0,0 +1,64 @@
+#!/bin/bash
+# 画像の派生ファイル（サムネイル・WebP）生成用のPillow Lambda Layerを作成するスクリプト
+# Pillowはネイティブ拡張を含むため、Lambdaの実行環境（Amazon Linux / x86_64）向けのホイールを取得する
+
+set -e
+
+REGION="ap-northeast-1"
+LAYER_NAME="pillow"
+PYTHON_VERSION="python3.12"
+FUNCTION_NAME="misesapo-s3-upload"
+
+echo "=== Pillow Lambda Layer作成スクリプト ==="
+
+TEMP_DIR=$(mktemp -d)
+echo "一時ディレクトリ: ${TEMP_DIR}"
+
+echo "Pillowをインストール中..."
+pip3 install Pillow \
+  --platform manylinux2014_x86_64 \
+  --only-binary=:all: \
+  --python-version ${PYTHON_VERSION#python} \
+  -t ${TEMP_DIR}/python/lib/${PYTHON_VERSION}/site-packages/
+
+ZIP_FILE="${TEMP_DIR}/pillow-layer.zip"
+echo "ZIPファイルを作成中..."
+(cd ${TEMP_DIR} && zip -r ${ZIP_FILE} python > /dev/null)
+
+echo "Lambda Layerを作成中..."
+LAYER_ARN=$(aws lambda publish-layer-version \
+  --layer-name ${LAYER_NAME} \
+  --description "Pillow for report image thumbnails/WebP" \
+  --zip-file fileb://${ZIP_FILE} \
+  --compatible-runtimes ${PYTHON_VERSION} \
+  --region ${REGION} \
+  --query 'LayerVersionArn' \
+  --output text)
+echo "Lambda Layer作成完了: ${LAYER_ARN}"
+
+# 既存のLayersに追加
+EXISTING_LAYERS=$(aws lambda get-function-configuration \
+  --function-name ${FUNCTION_NAME} \
+  --region ${REGION} \
+  --query 'Layers[?Arn!=`null`].Arn' \
+  --output text)
+
+if [ -z "$EXISTING_LAYERS" ] || [ "$EXISTING_LAYERS" == "None" ]; then
+  LAYERS="${LAYER_ARN}"
+else
+  LAYERS="${EXISTING_LAYERS} ${LAYER_ARN}"
+fi
+
+aws lambda update-function-configuration \
+  --function-name ${FUNCTION_NAME} \
+  --layers ${LAYERS} \
+  --region ${REGION} > /dev/null
+echo "Lambda関数にLayerを追加しました"
+
+rm -rf ${TEMP_DIR}
+
+echo ""
+echo "次のステップ:"
+echo "1. 派生ファイルはS3イベントで生成するため、画像バケットのS3イベント通知"
+echo "   （ObjectCreated、プレフィックス before/・after/・photos/）でこのLambda関数を呼び出すよう設定"
+echo "2. Lambdaのメモリを1024MB以上にすることを推奨（画像のデコード・リサイズ）"
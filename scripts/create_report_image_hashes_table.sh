@@ -0,0 +1,26 @@
+#!/bin/bash
+
+# レポート画像の重複チェック用DynamoDBテーブルを作成
+# - image_hash: 画像のSHA-256（Lambdaが attribute_not_exists 条件付きで書き込み、重複チェックと確保を1回で行う）
+# - image_id / url / s3_key / category / cleaning_date / folder_name: 最初にアップロードされた画像の情報（重複時に返す）
+#
+# 既存の report-images の画像は scripts/backfill_report_image_hashes.py で登録する
+
+TABLE_NAME="report-image-hashes"
+REGION="ap-northeast-1"
+
+echo "Creating DynamoDB table: $TABLE_NAME"
+
+aws dynamodb create-table \
+  --table-name $TABLE_NAME \
+  --attribute-definitions \
+    AttributeName=image_hash,AttributeType=S \
+  --key-schema \
+    AttributeName=image_hash,KeyType=HASH \
+  --billing-mode PAY_PER_REQUEST \
+  --region $REGION
+
+echo "Waiting for table to be created..."
+aws dynamodb wait table-exists --table-name $TABLE_NAME --region $REGION
+
+echo "Table $TABLE_NAME created successfully!"
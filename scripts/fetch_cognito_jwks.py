@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Cognito User Pool の JWKS を取得して標準出力に書き出すスクリプト
+
+Lambda は起動時にネットワークへ取りに行かず、デプロイパッケージに同梱した
+cognito_jwks.json（または COGNITO_JWKS_JSON 環境変数）から公開鍵を読み込む。
+鍵がローテーションされたらこのスクリプトで再取得して再デプロイすること。
+
+使い方:
+    python3 scripts/fetch_cognito_jwks.py > cognito_jwks.json
+    python3 scripts/fetch_cognito_jwks.py --user-pool-id ap-northeast-1_XXXXXXX > cognito_jwks.json
+"""
+
+import argparse
+import json
+import sys
+import urllib.request
+
+REGION = 'ap-northeast-1'
+DEFAULT_USER_POOL_ID = 'ap-northeast-1_EDKElIGoC'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fetch Cognito JWKS for bundling with the Lambda package')
+    parser.add_argument('--user-pool-id', default=DEFAULT_USER_POOL_ID)
+    args = parser.parse_args()
+
+    url = f"https://cognito-idp.{REGION}.amazonaws.com/{args.user_pool_id}/.well-known/jwks.json"
+    with urllib.request.urlopen(url, timeout=10) as response:
+        jwks = json.loads(response.read().decode('utf-8'))
+
+    kids = [key.get('kid') for key in jwks.get('keys', [])]
+    print(f"Fetched {len(kids)} keys: {', '.join(kids)}", file=sys.stderr)
+    json.dump(jwks, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
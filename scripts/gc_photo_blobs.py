@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+参照されなくなったレポート写真（コンテンツアドレス保存）を削除するスクリプト
+
+- photo-blobs から used_in_reports が空（属性なし）で、参照がなくなってから（unreferenced_at）猶予期間を過ぎたものを探す
+  unreferenced_at のない古いアイテムには今回の時刻を記録し、猶予期間後の実行で削除する
+- 先に「used_in_reports が空かつ猶予期間を過ぎている」を条件にテーブルのアイテムを削除し、
+  成功した場合のみS3のオリジナルと派生ファイル（.w320.webp 等）を削除する（再参照された写真は残る）
+- S3の削除に失敗した場合はアイテムを書き戻し、次回の実行で再試行する
+- アイテム削除からS3削除までの間に同じ写真が再アップロードされた場合は、アイテムを uploaded=false に戻して
+  次回のレポート保存時に再アップロードされるようにし、警告を表示する
+- テーブルは lambda_function.parallel_scan で並列にスキャンし、削除もセグメントごとのスレッドで行う
+- --checkpoint を指定すると処理済みの位置をファイルに保存し、中断しても同じファイルを指定して再開できる
+
+使い方:
+    python3 scripts/gc_photo_blobs.py [--grace-days 7] [--dry-run] [--segments 8] [--checkpoint gc.json]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import lambda_function as lf  # noqa: E402
+
+REGION = 'ap-northeast-1'
+DEFAULT_BUCKET = 'misesapo-cleaning-manual-images'
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return lf.load_scan_checkpoint(f.read())
+
+
+def save_checkpoint(path, checkpoint):
+    with open(path, 'w') as f:
+        f.write(lf.dump_scan_checkpoint(checkpoint))
+
+
+def delete_blob_objects(s3, bucket, s3_key):
+    """オリジナルと派生ファイルをまとめて削除"""
+    prefix = s3_key.rsplit('.', 1)[0] + '.'
+    keys = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []))
+    if keys:
+        s3.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True})
+    return len(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Delete unreferenced content-addressed report photos')
+    parser.add_argument('--table', default='photo-blobs')
+    parser.add_argument('--bucket', default=DEFAULT_BUCKET)
+    parser.add_argument('--grace-days', type=int, default=7)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--segments', type=int, default=8, help='number of parallel scan segments')
+    parser.add_argument('--checkpoint', help='file to save/resume scan progress')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    table = dynamodb.Table(args.table)
+    s3 = boto3.client('s3', region_name=REGION)
+    cutoff = (datetime.utcnow() - timedelta(days=args.grace_days)).isoformat() + 'Z'
+
+    def collect(item):
+        """1件分の削除（セグメントのスレッドで実行）-> (s3_key, 削除したS3オブジェクト数, 結果)"""
+        s3_key = item.get('s3_key')
+        key = {'content_hash': item['content_hash']}
+        if 'unreferenced_at' not in item:
+            # 参照がなくなった時刻が不明な古いアイテム: 今回の時刻から猶予期間を数える
+            if args.dry_run:
+                return s3_key, 0, 'dry-run (stamp)'
+            lf.mark_photo_blob_unreferenced(item['content_hash'])
+            return s3_key, 0, 'stamped'
+        if args.dry_run:
+            return s3_key, 0, 'dry-run'
+        try:
+            table.delete_item(
+                Key=key,
+                ConditionExpression=Attr('used_in_reports').not_exists() & Attr('unreferenced_at').lt(cutoff)
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            return s3_key, 0, 're-referenced'
+        try:
+            objects = delete_blob_objects(s3, args.bucket, s3_key) if s3_key else 0
+        except Exception:
+            # S3を削除できなかった: アイテムを戻して次回に再試行（その間に再参照されていれば何もしない）
+            try:
+                table.put_item(Item=item, ConditionExpression='attribute_not_exists(content_hash)')
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+            raise
+        if table.get_item(Key=key, ConsistentRead=True).get('Item'):
+            # 削除中に再参照・再アップロードされた: 次回のレポート保存で再アップロードさせる
+            table.update_item(Key=key, UpdateExpression='SET uploaded = :f', ExpressionAttributeValues={':f': False})
+            print(f"Warning: {s3_key} was re-referenced while being deleted, marked for re-upload")
+            return s3_key, objects, 'raced'
+        return s3_key, objects, 'deleted'
+
+    def report_progress(stats):
+        # dry-run の位置は保存しない（本実行で対象がスキップされるため）
+        if args.checkpoint and not args.dry_run:
+            save_checkpoint(args.checkpoint, checkpoint)
+        if stats['pages'] % 20 == 0:
+            print(f"  pages={stats['pages']}  segments done={stats['segments_done']}/{stats['total_segments']}")
+
+    checkpoint = load_checkpoint(args.checkpoint)
+    candidates = 0
+    deleted = 0
+    deleted_objects = 0
+    skipped = 0
+    stamped = 0
+    scan_kwargs = {
+        'FilterExpression': Attr('used_in_reports').not_exists() & (
+            Attr('unreferenced_at').lt(cutoff) | Attr('unreferenced_at').not_exists()
+        )
+    }
+    for s3_key, objects, result in lf.parallel_scan(table, scan_kwargs, args.segments, on_item=collect,
+                                                      checkpoint=checkpoint, on_progress=report_progress):
+        candidates += 1
+        deleted_objects += objects
+        if result in ('deleted', 'raced'):
+            deleted += 1
+        elif result == 're-referenced':
+            skipped += 1
+        elif result == 'stamped':
+            stamped += 1
+        print(f"{'[dry-run] ' if args.dry_run else ''}unreferenced: {s3_key} ({result})")
+
+    print(f"candidates={candidates}  deleted={deleted}  s3 objects deleted={deleted_objects}  "
+          f"re-referenced={skipped}  stamped={stamped}")
+
+
+if __name__ == '__main__':
+    main()
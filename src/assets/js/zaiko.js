@@ -223,11 +223,11 @@ function escapeHtml(str) {
     return div.innerHTML;
 }
 
-// 最終入出庫情報を取得
+// 最終入出庫情報を取得（商品ごとの累計集計から取得し、履歴は読み込まない）
 async function loadLastTransactions(productId) {
     try {
         const idToken = await getFirebaseIdToken();
-        const response = await fetch(`${REPORT_API}/admin/inventory/transactions?product_id=${productId}&limit=20`, {
+        const response = await fetch(`${REPORT_API}/admin/inventory/rollups?scope=product&id=${encodeURIComponent(productId)}&granularity=total`, {
             method: 'GET',
             headers: {
                 'Authorization': `Bearer ${idToken}`
@@ -235,24 +235,13 @@ async function loadLastTransactions(productId) {
         });
         
         if (!response.ok) {
-            throw new Error('トランザクション取得に失敗');
+            throw new Error('集計の取得に失敗');
         }
         
         const data = await response.json();
-        const transactions = data.transactions || [];
-        
-        // 最新の入庫と出庫を探す
-        let lastIn = null;
-        let lastOut = null;
-        
-        for (const tx of transactions) {
-            if (tx.type === 'in' && !lastIn) {
-                lastIn = tx;
-            } else if (tx.type === 'out' && !lastOut) {
-                lastOut = tx;
-            }
-            if (lastIn && lastOut) break;
-        }
+        const total = (data.rollups || [])[0] || {};
+        const lastIn = total.last_in_at ? { staff_name: total.last_in_staff_name, created_at: total.last_in_at } : null;
+        const lastOut = total.last_out_at ? { staff_name: total.last_out_staff_name, created_at: total.last_out_at } : null;
         
         // 表示を更新
         const lastInEl = document.getElementById('last-in-info');